@@ -24,6 +24,7 @@ from GP.DKL.dknet.optimizers import Adam
 # activations: the activation functions used as nonlinearities in the hidden layers. Need to be supported by DKL
 #        - can be in ['relu', 'lrelu', 'linear', 'sigmoid', 'tanh', 'softplus', 'softmax', 'rbf']
 #        - easy to add more if desired
+# groups: None or a list of lists of the z dimensions for an additive OGP kernel (see OGP)
 # weight_dir: string specifying directory location. if specified, initializes the network and embedding function based
 #                 on the parameters found in the directory
 #        - it is essential that the network structure matches the architecture implied by the parameters in weight_dir
@@ -53,17 +54,20 @@ from GP.DKL.dknet.optimizers import Adam
 # DKL.train_embedding does not vary alpha and noise
 
 class DKLGP(object):
-    def __init__(self, dim, hidden_layers=[], dim_z=None, mask=None, alpha=1.0, noise=0.1, activations='lrelu', weight_dir=None):
+    def __init__(self, dim, hidden_layers=[], dim_z=None, mask=None, alpha=1.0, noise=0.1, activations='lrelu', weight_dir=None, groups=None):
         self.dim = dim
         self.dim_z = dim_z or dim
 
         # initialize the OGP object we use to actually make our predictions
         OGP_params = (np.zeros((self.dim_z,)), np.log(alpha), np.log(noise)) # lengthscales of one (logged)
-        self.ogp = OGP(self.dim_z, OGP_params)
+        self.ogp = OGP(self.dim_z, OGP_params, groups=groups)
 
         # our embedding function, initially the identity
         # if unchanged, the DKLGP should match the functionality of OGP
-        self.embed = lambda x: x
+        # (methods instead of lambdas keep the DKLGP picklable for the worker pool)
+        self.embed = self.embed_identity
+        # the embedding is linear (identity or set_linear) => predict_with_grad is available
+        self.linear_embedding = True
 
         # build the neural network structure of the DKL
         self.layers = []
@@ -92,8 +96,10 @@ class DKLGP(object):
         self.DKLmodel = NNRegressor(self.layers, opt=opt, batch_size=batch_size, maxiter=maxiter, gp=True, verbose=False)
         self.DKLmodel.fit(x,y)
 
-        self.embed = self.DKLmodel.fast_forward # fast_forward gives mapping up to (but not including) gp (x -> z)
+        self.embed = self.DKLmodel.fast_forward
+        self.linear_embedding = False # fast_forward gives mapping up to (but not including) gp (x -> z)
                                                 # (something like) full_forward maps through the whole dkl + gp
+        self.check_groups()
 
     # loads the DKL and embedding from the specified directory. forgets any previous embedding
     # note that network structure and activations, etc. still need to be specified in __init__
@@ -102,6 +108,8 @@ class DKLGP(object):
         self.DKLmodel.first_run(np.zeros((1,self.dim)), None, load_path=dname)
 
         self.embed = self.DKLmodel.fast_forward
+        self.linear_embedding = False
+        self.check_groups()
 
     # saves the neural network parameters to specified directory, allowing the saved embedding to be replicated without re-training it
     def save_embedding(self, dname):
@@ -112,7 +120,15 @@ class DKLGP(object):
     # allows manually setting a linear transform. Make sure you get your tranpose stuff right (x_rows.shape is [npoints,ndim])
     def set_linear(self, matrix):
         self.linear_transform = matrix
-        self.embed = lambda x_rows: np.dot(x_rows, self.linear_transform)
+        self.embed = self.embed_linear
+        self.linear_embedding = True
+        self.check_groups()
+
+    def embed_identity(self, x):
+        return x
+
+    def embed_linear(self, x_rows):
+        return np.dot(x_rows, self.linear_transform)
 
     # sets a linear transformation based on a given correlation matrix which is assumed to fit the data
     # NOTE: this isn't necessarily log-likelihood-optimal
@@ -122,6 +138,54 @@ class DKLGP(object):
 
         self.set_linear(chol)
 
+    # True if the embedding does not mix the groups of the additive kernel: the embedding is the identity or a linear
+    # map which is block diagonal in the groups (e.g. from a correlation matrix without correlations between the groups)
+    def groups_separable(self):
+        groups = self.ogp.groups
+        if groups is None:
+            return True
+        if not self.linear_embedding:
+            return False
+        if 'linear_transform' in dir(self):
+            transform = np.array(self.linear_transform)
+            if transform.shape != (self.dim, self.dim_z):
+                return False
+            block = np.zeros(transform.shape, dtype=bool)
+            for g in groups:
+                block[np.ix_(g, g)] = True
+            if np.any(transform[~block]):
+                return False
+        return True
+
+    # called whenever the embedding changes: an additive kernel over an embedding which mixes its groups is not additive
+    # in x, so it is dropped (full kernel) with a warning
+    def check_groups(self):
+        if not self.groups_separable():
+            print('DKLGP - WARNING: the embedding mixes the additive kernel groups ', self.ogp.groups,
+                  ', using the full kernel')
+            self.ogp.groups = None
+
+    # groups of the additive kernel as groups of the inputs x (None - full kernel)
+    @property
+    def groups(self):
+        return self.ogp.groups
+
+    # mean and variance with their gradients w.r.t. x by central finite differences (one batched prediction)
+    def predict_with_fd_grad(self, x, eps=1.e-6):
+        x = np.array(x, dtype=float, ndmin=2)
+        (n, dim) = x.shape
+        mean, var = self.predict(x)
+        h = eps * np.maximum(1., np.abs(x)) # (n x dim) steps
+        shifts = h[:, :, np.newaxis] * np.eye(dim)[np.newaxis, :, :] # (n x dim x dim), point i, coordinate j
+        xs = np.repeat(x[:, np.newaxis, :], dim, axis=1)
+        xs = np.vstack(((xs + shifts).reshape(n * dim, dim), (xs - shifts).reshape(n * dim, dim)))
+        means, vars = self.predict(xs)
+        means = np.ravel(means).reshape(2, n, dim)
+        vars = np.ravel(vars).reshape(2, n, dim)
+        dmean = (means[0] - means[1]) / (2. * h)
+        dvar = (vars[0] - vars[1]) / (2. * h)
+        return np.reshape(mean, (n, 1)), np.reshape(var, (n, 1)), dmean, dvar
+
     # computes the log-likelihood of the given data set using the current embedding
     # ASSUMES YOU'RE USING RBF KERNEL
     def eval_LL(self, X, Y):
@@ -186,14 +250,29 @@ class DKLGP(object):
     # remaining functions mimic Online GP functionality, just embedding x -> z first
     ##########
 
-    def fit(self, X, y):
+    def fit(self, X, y, sequential=False):
         Z = self.embed(X)
-        self.ogp.fit(Z, y)
+        self.ogp.fit(Z, y, sequential=sequential)
 
     def update(self, x_new, y_new):
         z_new = self.embed(x_new)
         self.ogp.update(z_new, y_new)
 
-    def predict(self, x):
+    def predict(self, x, full_cov=False, cache_key=None):
+        z = np.array(self.embed(x),ndmin=2)
+        return self.ogp.predict(z, full_cov=full_cov, cache_key=cache_key)
+
+    def predict_mean(self, x, cache_key=None):
+        z = np.array(self.embed(x),ndmin=2)
+        return self.ogp.predict_mean(z, cache_key=cache_key)
+
+    # mean and variance with their gradients w.r.t. x (chain rule through the linear embedding z = x * transform)
+    # (a nonlinear embedding has no closed form: central finite differences through the embedding)
+    def predict_with_grad(self, x):
+        if not self.linear_embedding:
+            return self.predict_with_fd_grad(x)
         z = np.array(self.embed(x),ndmin=2)
-        return self.ogp.predict(z)
\ No newline at end of file
+        mean, var, dmean_z, dvar_z = self.ogp.predict_with_grad(z)
+        if 'linear_transform' in dir(self):
+            return mean, var, np.dot(dmean_z, self.linear_transform.T), np.dot(dvar_z, self.linear_transform.T)
+        return mean, var, dmean_z, dvar_z
\ No newline at end of file
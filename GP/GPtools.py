@@ -38,7 +38,7 @@ def BVplot(GP, f, xmin=-2.5, xmax=2.5, fname=None):
     vec = np.reshape(np.array(xx),(100,1))
     vecx = np.reshape(np.array(xxx),(1000,1))
     pred,var = GP.predict(vec)
-    var = np.reshape(np.diag(var),pred.shape)
+    var = np.reshape(var,pred.shape)
     BVs = GP.BV
     fy = f(vecx)
     plt.errorbar(xx,pred,yerr=2*np.sqrt(var))#,c=u'b')
@@ -89,7 +89,7 @@ def GPheatmap(model, base, dim1, dim2, range1, range2, size=50, type='pred', ax=
     pred,var = model.predict(data)
     if(type=='EI'):
         diff = pred - y_best
-        var_vec = np.sqrt(np.reshape(np.diag(var),(size*size,1)))
+        var_vec = np.sqrt(np.reshape(var,(size*size,1)))
         Z = diff / var_vec
         EI = diff * norm.cdf(Z) + var_vec * norm.pdf(Z)
         EI = np.nan_to_num(EI)
@@ -98,7 +98,7 @@ def GPheatmap(model, base, dim1, dim2, range1, range2, size=50, type='pred', ax=
         Mp = np.reshape(pred,(size,size))
         mat = Mp
         if(type=='var'):
-            Mv = np.reshape(np.diag(var),(size,size))
+            Mv = np.reshape(var,(size,size))
             mat = Mv
 
     if(ax is None):
@@ -26,16 +26,31 @@ Initialization parameters:
     proj: I'm not sure exactly. Setting this to false gives a different method
         of computing updates, but I haven't tested it or figured out what the
         difference is.
-    weighted: whether or not to use weighted difference computations. Slower but may
+    weighted: whether or not to use weighted difference computations. May
         yield improved performance. Still testing.
     thresh: some low float value to specify how different a point has to be to
         add it to the model. Keeps matrices well-conditioned.
+    groups: None, or a list of disjoint lists of input dimensions (e.g. from
+        correlationGroups). The kernel is then additive, the mean of RBF
+        kernels over the dimensions of each group:
+            k(x,b) = coeff / ngroups * sum_g exp(-0.5 (x_g-b_g) B_g (x_g-b_g)^T)
+        Dimensions not listed form groups of their own. The kernel matrix B
+        must not couple dimensions of different groups.
 
 Methods:
     update(x_new, y_new): Runs an online GP iteration incorporating the new data.
-    fit(X, Y): Calls update on multiple points for convenience. X is assumed to
-        be a pandas DataFrame.
-    predict(x): Computes GP prediction(s) for input point(s).
+    fit(X, Y, sequential=False): Trains on multiple points (array or pandas
+        DataFrame). An empty model selects the BVs in one pass and computes the
+        posterior in batch; sequential=True (or a model which already has BVs)
+        calls update on each point.
+    predict(x, full_cov=False, cache_key=None): Computes GP prediction(s) for
+        input point(s). Returns the (n x 1) predictive variances, or the full
+        (n x n) predictive covariance if full_cov is True. With a cache_key the
+        kernel columns of a persistent candidate set x are cached between calls.
+    predict_mean(x, cache_key=None): Predictive mean only.
+    predict_with_grad(x): Predictive mean and variance with their gradients
+        with respect to the input point(s).
+    kernelGroup(xs1, xs2, g): One component of the additive kernel.
     scoreBVs(): Returns a vector with the (either weighted or unweighted) KL
         divergence-cost of removing each BV.
     deleteBV(index): Removes the selected BV from the GP and updates to minimize
@@ -62,18 +77,34 @@ Change log:
     2018-11-14 - Last step. Need option to give precision matrix unlogged
     2018-12-05 - Dylan fixed a problem with loading in data for fitting
     2018-12-06 - Joe added __setstate__ and __getstate__ for easy pickling
+
+    BV, alpha, C, KB, KBinv and L (the lower Cholesky factor of KB) are views
+    of the first numBV rows/columns of preallocated buffers with capacity
+    maxBV+1 (grown by doubling if sparsityQ is False). Adding a BV writes the
+    new row/column in place and appends a row to L; deleting a BV moves it to
+    the end (the order of the other BVs is kept) and updates L with a rank-1
+    update of its trailing block.
+
+    Kernel cache: the BVs scaled by the kernel matrix and their squared norms
+    are kept next to the BV buffer and the kernel columns of keyed candidate
+    sets (predict(..., cache_key=...)) are kept per BV, so a new BV costs one
+    column. Setting covar_params or precisionMatrix clears the cache; call
+    invalidateCache() after changing the hyperparameters in place.
 """
 
 import numpy as np
 import numbers
-from numpy.linalg import solve, inv
+from collections import OrderedDict
+from numpy.linalg import inv, cholesky, eigh, LinAlgError
+from scipy.linalg import solve_triangular, cho_solve
 
 
 class OGP(object):
     def __init__(self, dim, hyperparams, covar='RBF_ARD', maxBV=200,
                  prmean=None, prmeanp=None, prvar=None, prvarp=None, proj=True, weighted=False, thresh=1e-6,
-                 sparsityQ=True):
+                 sparsityQ=True, groups=None):
         self.nin = dim
+        self.groups = checkGroups(groups, dim)
         self.maxBV = maxBV
         self.numBV = 0
         self.proj = proj
@@ -81,6 +112,11 @@ class OGP(object):
         self.sparsityQ = sparsityQ
         self.verboseQ = False
         self.nupdates = 0
+        # candidate BVs per BV selected by the batch fit (pruned with scoreBVs)
+        self.batchCandidates = 4
+        # number of candidate sets in the kernel cache
+        self.kernelCacheSize = 8
+        self._nextBVid = 0
 
         if (covar in ['RBF_ARD']):
             self.covar = covar
@@ -103,16 +139,129 @@ class OGP(object):
         self.prvar = prvar;
         self.prvarp = prvarp
 
-        # initialize model state
-        self.BV = np.zeros(shape=(0, self.nin))
-        self.alpha = np.zeros(shape=(0, 1))
-        self.C = np.zeros(shape=(0, 0))
-
-        self.KB = np.zeros(shape=(0, 0))
-        self.KBinv = np.zeros(shape=(0, 0))
+        # initialize model state (capacity buffers, numBV active rows/columns)
+        self._allocate(maxBV + 1)
 
         self.thresh = thresh
 
+    def _allocate(self, capacity):
+        # (re)allocates the buffers keeping the numBV active rows/columns
+        n = self.numBV
+        buffers = [np.zeros(shape=(capacity, self.nin)), np.zeros(shape=(capacity, 1)),
+                   np.zeros(shape=(capacity, capacity)), np.zeros(shape=(capacity, capacity)),
+                   np.zeros(shape=(capacity, capacity)), np.zeros(shape=(capacity, capacity)),
+                   np.zeros(shape=(capacity, self.nin)), np.zeros(shape=capacity),
+                   np.zeros(shape=capacity, dtype=int)]
+        if n > 0:
+            buffers[0][:n] = self._BV[:n]
+            buffers[1][:n] = self._alpha[:n]
+            buffers[2][:n, :n] = self._C[:n, :n]
+            buffers[3][:n, :n] = self._KB[:n, :n]
+            buffers[4][:n, :n] = self._KBinv[:n, :n]
+            buffers[5][:n, :n] = self._L[:n, :n]
+            buffers[6][:n] = self._BVs[:n]
+            buffers[7][:n] = self._BVnorm[:n]
+            buffers[8][:n] = self._BVid[:n]
+        (self._BV, self._alpha, self._C, self._KB, self._KBinv, self._L,
+         self._BVs, self._BVnorm, self._BVid) = buffers
+
+    def _reserve(self, n):
+        # makes sure the buffers hold n BVs
+        capacity = self._alpha.shape[0]
+        if n > capacity:
+            self._allocate(max(2 * capacity, n))
+
+    def _setBuffer(self, name, value):
+        value = np.array(value, dtype=float)
+        n = value.shape[0]
+        self._reserve(n)
+        self.numBV = n
+        buf = getattr(self, name)
+        if value.ndim == 2 and name in ('_C', '_KB', '_KBinv'):
+            buf[:n, :n] = value
+        else:
+            buf[:n] = np.reshape(value, buf[:n].shape)
+        if name == '_KB':
+            self._factorize()
+        if name == '_BV':
+            self._BVid[:n] = np.arange(self._nextBVid, self._nextBVid + n)
+            self._nextBVid += n
+            self._scaledValid = False
+
+    def _factorize(self):
+        # recomputes the Cholesky factor of KB from scratch
+        n = self.numBV
+        self._L[:n, :n] = cholesky(self._KB[:n, :n]) if n > 0 else 0
+
+    @property
+    def BV(self):
+        return self._BV[:self.numBV]
+
+    @BV.setter
+    def BV(self, value):
+        self._setBuffer('_BV', value)
+
+    @property
+    def alpha(self):
+        return self._alpha[:self.numBV]
+
+    @alpha.setter
+    def alpha(self, value):
+        self._setBuffer('_alpha', value)
+
+    @property
+    def C(self):
+        return self._C[:self.numBV, :self.numBV]
+
+    @C.setter
+    def C(self, value):
+        self._setBuffer('_C', value)
+
+    @property
+    def KB(self):
+        return self._KB[:self.numBV, :self.numBV]
+
+    @KB.setter
+    def KB(self, value):
+        self._setBuffer('_KB', value)
+
+    @property
+    def KBinv(self):
+        return self._KBinv[:self.numBV, :self.numBV]
+
+    @KBinv.setter
+    def KBinv(self, value):
+        self._setBuffer('_KBinv', value)
+
+    @property
+    def L(self):
+        # lower triangular Cholesky factor of KB (set through KB)
+        return self._L[:self.numBV, :self.numBV]
+
+    @property
+    def covar_params(self):
+        return self._covar_params
+
+    @covar_params.setter
+    def covar_params(self, value):
+        self._covar_params = value
+        self.invalidateCache()
+
+    @property
+    def precisionMatrix(self):
+        return self._precisionMatrix
+
+    @precisionMatrix.setter
+    def precisionMatrix(self, value):
+        self._precisionMatrix = value
+        self.invalidateCache()
+
+    def invalidateCache(self):
+        # drops the cached kernel quantities (scaled BVs, candidate kernel columns)
+        self._scale = None
+        self._scaledValid = False
+        self._kcache = OrderedDict()
+
     def __getstate__(self):
         # Copy the object's state from self.__dict__ which contains
         # all our instance atributes. Always use the dict.copy()
@@ -122,25 +271,102 @@ class OGP(object):
         # Remove unpicklable entries (these would need to be recreated
         # in the __setstate__ function.
         # Example: del state['file'] # since the file handle isn't pickleable
+        state['_kcache'] = OrderedDict()  # candidate kernel columns are not worth pickling
 
         return state
 
     def __setstate__(self, state):
         # Restore instance attributes
+        # (models pickled before the capacity buffers store the plain arrays)
+        legacy = [(name, state.pop(name)) for name in ['BV', 'alpha', 'C', 'KB', 'KBinv'] if name in state]
+        for name in ['covar_params', 'precisionMatrix']:
+            if name in state:
+                state['_' + name] = state.pop(name)
         self.__dict__.update(state)
+        self.invalidateCache()
+        if 'groups' not in self.__dict__:
+            self.groups = None
+        if '_nextBVid' not in self.__dict__:
+            self._nextBVid = 0
+            self.kernelCacheSize = 8
+        if '_BVs' not in self.__dict__ and not legacy:
+            capacity = self._BV.shape[0]
+            self._BVs = np.zeros(shape=self._BV.shape)
+            self._BVnorm = np.zeros(shape=capacity)
+            self._BVid = np.arange(capacity)
+            self._nextBVid = capacity
+        if legacy:
+            self.numBV = 0
+            self._allocate(max(self.maxBV, np.shape(dict(legacy)['BV'])[0]) + 1)
+            for (name, value) in legacy:
+                setattr(self, name, value)
+        if '_L' not in self.__dict__:
+            self._L = np.zeros(shape=self._KB.shape)
+            self._factorize()
 
         # Should also manually recreate unpicklable members.
         # Example: file = load(self.filename)
 
-    def fit(self, X, Y, m=0):
+    def fit(self, X, Y, m=0, sequential=False):
         # just train on all the data in X. m is a dummy parameter
-        for i in range(X.shape[0]):
-            self.update(np.array(X[i], ndmin=2), np.array([Y[i]]))
-            # self.update(x, Y[i])
+        X = np.array(X, dtype=float, ndmin=2)
+        Y = np.reshape(np.array(Y, dtype=float), (X.shape[0], 1))
+        if sequential or self.numBV > 0:
+            for i in range(X.shape[0]):
+                self.update(np.array(X[i], ndmin=2), np.array([Y[i]]))
+                # self.update(x, Y[i])
+            return
+        if X.shape[0] == 0:
+            return
+
+        # batch: candidate BVs by k-center selection, the sparse posterior with all the data
+        #   Sigma = (KB + Kbx Kxb / noise)^-1
+        #   alpha = Sigma Kbx (Y - prior mean) / noise,  C = Sigma - KB^-1
+        #   then the candidates are pruned to maxBV as in update
+        if self.sparsityQ:
+            nmax = min(self.batchCandidates * self.maxBV, X.shape[0])
+        else:
+            nmax = X.shape[0]
+        ind = self.selectBVs(X, nmax)
+        BV = X[ind]
+        Kbx = self.computeCov(BV, X)
+        Kbx[range(len(ind)), ind] += self.noise_var  # as k(x, x) in update
+        pM = self.priorMean(X)
+        if np.size(pM) > 1:
+            pM = np.reshape(pM, Y.shape)
+
+        self.numBV = 0
+        self.BV = BV
+        self.KB = self.computeCov(BV, BV, is_self=True)  # factorizes L
+        eye = np.eye(BV.shape[0])
+        self.KBinv = cho_solve((self.L, True), eye)
+        Sigma = cho_solve((cholesky(self.KB + np.dot(Kbx, Kbx.transpose()) / self.noise_var), True), eye)
+        self.alpha = np.dot(Sigma, np.dot(Kbx, Y - pM)) / self.noise_var
+        self.C = symmetrize(Sigma - self.KBinv)
+
+        if self.sparsityQ:
+            while (self.numBV > self.maxBV):
+                self.deleteBV(self.scoreBVs())
+
+    def selectBVs(self, X, nmax):
+        # greedy k-center selection of up to nmax rows of X in the kernel metric
+        #   (the next BV is the point farthest from the current ones); stops
+        #   when the remaining points are within thresh of a BV
+        Xs = self.scaleInputs(X)  # |xs - bs|^2 = (x - b) B (x - b)^T
+        k0 = np.exp(self.covar_params[1])
+        ind = [0]
+        dist_sq = np.sum((Xs - Xs[0]) ** 2, axis=1)
+        while len(ind) < nmax:
+            j = int(np.argmax(dist_sq))
+            if 2 * k0 * (1 - np.exp(-0.5 * dist_sq[j])) < self.thresh * (k0 + self.noise_var):
+                break
+            ind.append(j)
+            dist_sq = np.minimum(dist_sq, np.sum((Xs - Xs[j]) ** 2, axis=1))
+        return ind
 
     def update(self, x_new, y_new):
         # compute covariance with BVs
-        k_x = self.computeCov(self.BV, x_new)
+        k_x = self.computeCovBV(x_new).transpose()
         k = self.computeCov(x_new, x_new, is_self=True)
 
         # compute mean and variance
@@ -156,9 +382,11 @@ class OGP(object):
         # (logLik, K1, K2) = logLikelihood(self.noise_var, y_new, cM, cV) # joe: i don't think that the GP likelihood should take the prior mean
 
         # compute gamma, a geometric measure of novelty
-        if (self.KB.shape[0] > 0):
-            hatE = solve(self.KB, k_x)
-            gamma = k - np.dot(np.transpose(k_x), hatE)
+        #   (hatE = KB^-1 k_x by two triangular solves with the Cholesky factor)
+        if (self.numBV > 0):
+            v = solve_triangular(self.L, k_x, lower=True, check_finite=False)
+            hatE = solve_triangular(self.L, v, lower=True, trans='T', check_finite=False)
+            gamma = k - np.dot(np.transpose(v), v)
         else:
             hatE = np.array([], ndmin=2).transpose()
             gamma = k
@@ -187,15 +415,21 @@ class OGP(object):
 
         # count number of updates (assuming one update per acquisition, this gives number of acquisitions for optimizer GP-UCB acquisition fcn)
 
-    def predict(self, x_in):
+    def predict(self, x_in, full_cov=False, cache_key=None):
         # reads in a (n x dim) vector and returns the (n x 1) vector
         #   of predictions along with predictive variance for each
+        #   (the full (n x n) predictive covariance if full_cov is True;
+        #   the diagonal costs O(n m^2) instead of O(n^2 m) time and O(n^2) memory)
+        #   cache_key: keeps the kernel columns of the candidate set x_in for the next call
 
         # GP regression
-        k_x = self.computeCov(x_in, self.BV)
-        k = self.computeCov(x_in, x_in, is_self=True)
+        k_x = self.computeCovBV(x_in, cache_key=cache_key)
         gpMean = np.dot(k_x, self.alpha)
-        gpVar = k + np.dot(k_x, np.dot(self.C, k_x.transpose()))
+        if full_cov:
+            k = self.computeCov(x_in, x_in, is_self=True)
+            gpVar = k + np.dot(k_x, np.dot(self.C, k_x.transpose()))
+        else:
+            gpVar = self.computeCovDiag(x_in) + np.einsum('ij,ij->i', np.dot(k_x, self.C), k_x)[:, np.newaxis]
 
         priorMean = 0.
         if (callable(self.prmean)):  # we have a prior
@@ -224,6 +458,76 @@ class OGP(object):
 
         # return gpMean, gpVar
 
+    def predict_mean(self, x_in, cache_key=None):
+        # predictive mean only (n x 1), O(n m) with cached kernel columns
+        gpMean = np.dot(self.computeCovBV(x_in, cache_key=cache_key), self.alpha)
+        if (callable(self.prmean)):  # we have a prior
+            gpMean = gpMean + self.priorMean(x_in)
+        return gpMean
+
+    def predict_with_grad(self, x_in):
+        # reads in a (n x dim) vector and returns the (n x 1) vectors of the
+        #   predictive mean and variance and their (n x dim) gradients
+        #   (closed form for the RBF/CBF kernels: dk(x,b)/dx = -k(x,b) * B (x - b),
+        #   B is the diagonal ARD matrix or the precision matrix)
+
+        x_in = np.array(x_in, ndmin=2)
+        k_x = self.computeCovBV(x_in)
+        B = self.kernelMatrix()
+
+        gpMean = np.dot(k_x, self.alpha)
+        kC = np.dot(k_x, self.C)
+        gpVar = self.computeCovDiag(x_in) + np.sum(kC * k_x, axis=1, keepdims=True)
+
+        # sum_m w_nm * dk(x_n, b_m)/dx = -(x_n * sum_m w_nm - sum_m w_nm b_m) B
+        #   (additive kernel: per group with the kernel component and the block of B of the group)
+        if self.groups is None:
+            parts = [(np.arange(self.nin), k_x)]
+        else:
+            xs = self.scaleInputs(x_in)
+            BVs = self.scaledBV()[0]
+            parts = [(g, self.kernelGroup(xs, BVs, g)) for g in self.groups]
+        dMean = np.zeros(x_in.shape)
+        dVar = np.zeros(x_in.shape)
+        for (g, K) in parts:
+            Bg = B[np.ix_(g, g)]
+            W = K * self.alpha.transpose()
+            dMean[:, g] = -np.dot(x_in[:, g] * np.sum(W, axis=1, keepdims=True) - np.dot(W, self.BV[:, g]), Bg)
+            U = K * kC
+            dVar[:, g] = -2. * np.dot(x_in[:, g] * np.sum(U, axis=1, keepdims=True) - np.dot(U, self.BV[:, g]), Bg)
+
+        if (callable(self.prmean)):  # we have a prior
+            for i in range(x_in.shape[0]):
+                (pm, dpm) = self.priorMeanWithGrad(x_in[i])
+                gpMean[i] += pm
+                dMean[i] += dpm
+
+        return gpMean, gpVar, dMean, dVar
+
+    def kernelMatrix(self):
+        # the (dim x dim) matrix B of the kernel k(x,b) = coeff * exp(-0.5 (x-b) B (x-b)^T)
+        if self.precisionMatrix is not None:
+            return self.precisionMatrix
+        b = np.exp(self.covar_params[0])
+        sk = np.shape(b)
+        if len(sk) == 2 and sk[0] == sk[1]:
+            return b
+        return np.diagflat(b)
+
+    def priorMeanWithGrad(self, x, eps=1.e-6):
+        # prior mean at a single point and its gradient by central finite differences
+        x = np.array(x, dtype=float).flatten()
+        pm = float(np.ravel(self.priorMean(np.array(x, ndmin=2)))[0])
+        dpm = np.zeros(x.size)
+        for j in range(x.size):
+            h = eps * max(1., abs(x[j]))
+            xp = np.array(x, ndmin=2)
+            xm = np.array(x, ndmin=2)
+            xp[0, j] += h
+            xm[0, j] -= h
+            dpm[j] = (np.ravel(self.priorMean(xp))[0] - np.ravel(self.priorMean(xm))[0]) / (2 * h)
+        return pm, dpm
+
     def _sparseParamUpdate(self, k_x, K1, K2, gamma, hatE):
         # computes a sparse update to the model without expanding parameters
 
@@ -232,51 +536,62 @@ class OGP(object):
             eta += K2 * gamma
 
         CplusQk = np.dot(self.C, k_x) + hatE
-        self.alpha = self.alpha + (K1 / eta) * CplusQk
+        alpha = self.alpha
+        alpha += (K1 / eta) * CplusQk
         eta = K2 / eta
-        self.C = self.C + eta * np.dot(CplusQk, CplusQk.transpose())
-        self.C = stabilizeMatrix(self.C)
+        C = self.C
+        C += eta * np.dot(CplusQk, CplusQk.transpose())
+        symmetrize(C)
 
     def _fullParamUpdate(self, x_new, k_x, k, K1, K2, gamma, hatE):
         # expands parameters to incorporate new input
 
-        # add new input to basis vectors
-        oldnumBV = self.BV.shape[0]
+        # add new input to basis vectors (written in place into the buffers)
+        oldnumBV = self.numBV
         numBV = oldnumBV + 1
+        self._reserve(numBV)
+        Ck = extendVector(np.dot(self.C, k_x), val=1)
 
-        if (self.BV.shape == (0,)):  # seems like self.BV and x_new have incompatible shapes for first call
-            self.BV = x_new
-        else:
-            self.BV = np.concatenate((self.BV, x_new), axis=0)
-
+        self._BV[oldnumBV] = x_new
+        self._BVid[oldnumBV] = self._nextBVid
+        self._nextBVid += 1
+        if self._scaledValid:
+            self._BVs[oldnumBV] = self.scaleInputs(np.array(x_new, ndmin=2))[0]
+            self._BVnorm[oldnumBV] = np.sum(self._BVs[oldnumBV] ** 2)
+
+        # clear the new row/column (left over from a deleted BV)
+        for M in (self._C, self._KB, self._KBinv, self._L):
+            M[oldnumBV, :numBV] = 0
+            M[:numBV, oldnumBV] = 0
+        self._alpha[oldnumBV] = 0
+
+        # append to the Cholesky factor: [L 0; v^T sqrt(gamma)] with v = L^T hatE
+        if oldnumBV > 0:
+            self._L[oldnumBV, :oldnumBV] = np.ravel(np.dot(self.L.transpose(), hatE))
+        self._L[oldnumBV, oldnumBV] = np.sqrt(max(np.ravel(gamma)[0], 1.e-12 * np.ravel(k)[0]))
         hatE = extendVector(hatE, val=-1)
+        self.numBV = numBV
 
         # update KBinv
-        self.KBinv = extendMatrix(self.KBinv)
-        self.KBinv = self.KBinv + (1 / gamma) * np.dot(hatE, hatE.transpose())
+        KBinv = self.KBinv
+        KBinv += (1 / gamma) * np.dot(hatE, hatE.transpose())
 
         # update Gram matrix
-        self.KB = extendMatrix(self.KB)
-        if (numBV > 1):
-            self.KB[0:oldnumBV, [oldnumBV]] = k_x
-            self.KB[[oldnumBV], 0:oldnumBV] = k_x.transpose()
-        self.KB[oldnumBV, oldnumBV] = k
+        self._KB[0:oldnumBV, oldnumBV] = np.ravel(k_x)
+        self._KB[oldnumBV, 0:oldnumBV] = np.ravel(k_x)
+        self._KB[oldnumBV, oldnumBV] = np.ravel(k)[0]
 
-        Ck = extendVector(np.dot(self.C, k_x), val=1)
-
-        self.alpha = extendVector(self.alpha)
-        self.C = extendMatrix(self.C)
-        self.alpha = self.alpha + K1 * Ck
-        self.C = self.C + K2 * np.dot(Ck, Ck.transpose())
+        alpha = self.alpha
+        C = self.C
+        alpha += K1 * Ck
+        C += K2 * np.dot(Ck, Ck.transpose())
 
         # stabilize matrices for conditioning/reducing floating point errors?
-        self.C = stabilizeMatrix(self.C)
-        self.KB = stabilizeMatrix(self.KB)
-        self.KBinv = stabilizeMatrix(self.KBinv)
+        symmetrize(C)
+        symmetrize(KBinv)
 
     def scoreBVs(self):
         # measures the importance of each BV for model accuracy
-        # currently quite slow for the weighted GP if numBV is much more than 50
 
         numBV = self.BV.shape[0]
         a = self.alpha
@@ -284,15 +599,44 @@ class OGP(object):
             scores = ((a * a).reshape((numBV)) /
                       (self.C.diagonal() + self.KBinv.diagonal()))
         else:
-            scores = np.zeros(shape=(numBV, 1))
+            scores = self.weightedScores()
 
-            # This is slow, in particular the numBV calls to computeWeightedDiv
-            for removed in range(numBV):
-                (hatalpha, hatC) = self.getUpdatedParams(removed)
+        return scores.argmin()
 
-                scores[removed] = self.computeWeightedDiv(hatalpha, hatC, removed)
+    def weightedScores(self):
+        # weighted divergences of removing each BV, i.e. computeWeightedDiv of
+        #   getUpdatedParams(r) for every r, from one inverse of A = C + KBinv
+        #   instead of one inverse and log-determinant per BV:
+        #   hatA = hatC + KBinv has the same Schur complement as A, so
+        #     logdet(A hatA^-1) = log((q + c) / q)        q = KBinv[r,r], c = C[r,r]
+        #     hatA^-1 = W' A^-1 W + e e' / q              W x = x - (x_r / q) KBinv e
+        #   and the trace and the quadratic form reduce to the diagonals below
 
-        return scores.argmin()
+        a = self.alpha
+        Q = self.KBinv
+        C = self.C
+        numBV = a.shape[0]
+        B = inv(C + Q)
+        P = np.dot(B, Q)
+
+        Gamma = (np.eye(numBV) + np.dot(self.KB, C)).transpose()
+        Gamma = np.eye(numBV) + Gamma / np.dot(a.transpose(), np.dot(self.KB, a))
+        g = np.dot(Gamma, a).reshape(numBV)
+        u = a.reshape(numBV) - g
+
+        q = Q.diagonal()
+        c = C.diagonal()
+        aa = q + np.einsum('ij,ji->i', Q, P)  # q + (KBinv A^-1 KBinv)_rr
+        Pu = np.dot(P.transpose(), u)
+        ratio = (q + c) / q
+
+        quad = (g / q) ** 2 * q - (np.dot(u, np.dot(B, u)) - 2 * Pu * u / q + aa * u ** 2 / q ** 2)
+        trace = aa * ratio / q - 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = quad + trace - np.log(ratio)
+        scores[~(ratio > 0)] = np.inf
+
+        return scores
 
     def priorMean(self, x):
         if (callable(self.prmean)):
@@ -321,25 +665,53 @@ class OGP(object):
     def deleteBV(self, removeInd):
         # removes a BV from the model and modifies parameters to
         #   attempt to minimize the removal's impact
+        #   (the BV is moved to the end, the buffers are updated in place)
 
-        numBV = self.BV.shape[0]
-        keepInd = [i for i in range(numBV) if i != removeInd]
+        last = self.numBV - 1
+        self._deleteFromFactor(removeInd)
+        if removeInd != last:
+            self._moveBVToEnd(removeInd)
 
         # update alpha and C
-        (self.alpha, self.C) = self.getUpdatedParams(removeInd)
-
-        # stabilize C
-        self.C = stabilizeMatrix(self.C)
+        (hatalpha, hatC) = self.getUpdatedParams(last)
 
-        # update KB and KBinv
-        q_star = self.KBinv[removeInd, removeInd]
-        red_q = self.KBinv[keepInd][:, [removeInd]]
-        self.KBinv = (self.KBinv[keepInd][:, keepInd] -
-                      (1 / q_star) * np.dot(red_q, red_q.transpose()))
-        self.KBinv = stabilizeMatrix(self.KBinv)
-
-        self.KB = self.KB[keepInd][:, keepInd]
-        self.BV = self.BV[keepInd]
+        # update KBinv
+        q_star = self._KBinv[last, last]
+        red_q = self._KBinv[:last, last:last + 1]
+        KBinv = self._KBinv[:last, :last]
+        KBinv -= (1 / q_star) * np.dot(red_q, red_q.transpose())
+
+        self.numBV = last
+        self.alpha[:] = hatalpha
+        self.C[:] = hatC
+
+        # stabilize C and KBinv
+        symmetrize(self.C)
+        symmetrize(KBinv)
+
+    def _moveBVToEnd(self, i):
+        # moves BV i behind the others in the buffers in place (L is not touched)
+        n = self.numBV
+        for M in (self._BV, self._alpha, self._C, self._KB, self._KBinv, self._BVs, self._BVnorm, self._BVid):
+            row = M[i].copy()
+            M[i:n - 1] = M[i + 1:n]
+            M[n - 1] = row
+        for M in (self._C, self._KB, self._KBinv):
+            col = M[:n, i].copy()
+            M[:n, i:n - 1] = M[:n, i + 1:n]
+            M[:n, n - 1] = col
+
+    def _deleteFromFactor(self, i):
+        # removes row/column i of KB from the Cholesky factor:
+        #   the trailing block gets the rank-1 update L33' L33'^T = L33 L33^T + l l^T
+        n = self.numBV
+        L = self._L
+        l = L[i + 1:n, i].copy()
+        L[i:n - 1, :i] = L[i + 1:n, :i]
+        L[i:n - 1, i:n - 1] = L[i + 1:n, i + 1:n]
+        L[n - 1, :n] = 0
+        L[:n, n - 1] = 0
+        cholUpdate(L[i:n - 1, i:n - 1], l)
 
     def computeWeightedDiv(self, hatalpha, hatC, removeInd):
         # computes the weighted divergence for removing a specific BV
@@ -369,7 +741,10 @@ class OGP(object):
         # computes updates for alpha and C after removing the given BV
 
         numBV = self.BV.shape[0]
-        keepInd = [i for i in range(numBV) if i != removeInd]
+        if removeInd == numBV - 1:
+            keepInd = slice(0, removeInd)  # views instead of copies
+        else:
+            keepInd = [i for i in range(numBV) if i != removeInd]
         a = self.alpha
 
         if (not self.weighted):
@@ -388,7 +763,7 @@ class OGP(object):
             else:
                 tempQ = red_q / q_star
                 hatalpha = a[keepInd] - a[removeInd] * tempQ
-                red_c = self.C[removeInd, [keepInd]]
+                red_c = self.C[[removeInd]][:, keepInd]
                 hatC = (self.C[keepInd][:, keepInd] +
                         c_star * np.dot(tempQ, tempQ.transpose()))
                 tempQ = np.dot(tempQ, red_c)
@@ -419,16 +794,146 @@ class OGP(object):
     def computeCov(self, x1, x2, is_self=False):
         # computes covariance between inputs x1 and x2
         #   returns a matrix of size (n1 x n2)
+        #   (RBF and CBF kernels in the scaled inputs, see scaleInputs)
 
-        if np.size(np.shape(self.covar_params[0])) == 2:
-            K = self.computeCBF(x1, x2)
-        else:
-            K = self.computeRBF(x1, x2)
+        xs1 = self.scaleInputs(x1)
+        xs2 = xs1 if x2 is x1 else self.scaleInputs(x2)
+        K = self.kernelScaled(xs1, xs2)
         if (is_self):
             K = K + self.noise_var * np.eye(x1.shape[0])
 
         return K
 
+    def computeCovBV(self, x_in, cache_key=None):
+        # covariance between the inputs and the BVs (n x numBV) from the cached scaled BVs
+        #   cache_key: the columns are kept for the candidate set x_in, the next call
+        #   with the same key only computes the columns of new BVs and the rows of
+        #   points appended to the set (e.g. the observed points)
+        (BVs, BVnorm) = self.scaledBV()
+        if cache_key is None:
+            return self.kernelScaled(self.scaleInputs(x_in), BVs, norm2=BVnorm)
+
+        x_in = np.array(x_in, dtype=float, ndmin=2)
+        n = self.numBV
+        ids = self._BVid[:n]
+        entry = self._kcache.pop(cache_key, None)
+        nrow = 0 if entry is None else entry['x'].shape[0]
+        if (entry is None or entry['x'].shape[1:] != x_in.shape[1:] or nrow > x_in.shape[0] or
+                not np.array_equal(entry['x'], x_in[:nrow])):
+            entry = {'x': x_in[:0].copy(), 'xs': np.zeros((0, x_in.shape[1])), 'norm': np.zeros(0),
+                     'ids': ids[:0].copy(), 'K': np.zeros((0, 0))}
+            nrow = 0
+        self._kcache[cache_key] = entry
+        while len(self._kcache) > self.kernelCacheSize:
+            self._kcache.popitem(last=False)
+
+        cached = entry['ids']
+        nc = cached.shape[0]
+        K = entry['K']
+        if nc == n and np.array_equal(cached, ids):
+            new = np.arange(0)
+        elif nc < n <= K.shape[1] and np.array_equal(cached, ids[:nc]):
+            # new BVs appended: only their columns are computed
+            new = np.arange(nc, n)
+        else:
+            # BVs deleted (or the buffers grown): the kept columns are gathered
+            pos = dict((bvid, j) for (j, bvid) in enumerate(cached))
+            cols = np.array([pos.get(bvid, -1) for bvid in ids], dtype=int)
+            have = cols >= 0
+            K = np.empty((nrow, self._alpha.shape[0]))
+            K[:, np.nonzero(have)[0]] = entry['K'][:, cols[have]]
+            new = np.nonzero(~have)[0]
+        if new.size and nrow:
+            K[:, new] = self.kernelScaled(entry['xs'], BVs[new], norm1=entry['norm'], norm2=BVnorm[new])
+        entry['ids'] = ids.copy()
+
+        if nrow < x_in.shape[0]:
+            # points appended to the candidate set: their rows for all BVs
+            xs = self.scaleInputs(x_in[nrow:])
+            norm = np.sum(xs * xs, axis=1)
+            rows = np.zeros((xs.shape[0], K.shape[1]))
+            rows[:, :n] = self.kernelScaled(xs, BVs, norm1=norm, norm2=BVnorm)
+            K = np.concatenate((K, rows), axis=0)
+            entry['x'] = x_in.copy()
+            entry['xs'] = np.concatenate((entry['xs'], xs), axis=0)
+            entry['norm'] = np.concatenate((entry['norm'], norm))
+        entry['K'] = K
+        return K[:, :n]
+
+    def scaleInputs(self, x):
+        # x S with S S^T = B (kernelMatrix), so (x1 - x2) B (x1 - x2)^T = |x1 S - x2 S|^2
+        if self._scale is None:
+            B = self.kernelMatrix()
+            if self.groups is not None:
+                block = np.zeros(B.shape, dtype=bool)
+                for g in self.groups:
+                    block[np.ix_(g, g)] = True
+                if np.any(B[~block]):
+                    raise Exception("The kernel matrix couples dimensions of different groups")
+            if not np.any(B - np.diagflat(np.diagonal(B))):
+                self._scale = np.sqrt(np.diagonal(B))
+            else:
+                try:
+                    self._scale = cholesky(B)
+                except LinAlgError:
+                    (w, V) = eigh(B)
+                    self._scale = V * np.sqrt(np.maximum(w, 0))
+        x = np.array(x, dtype=float, ndmin=2)
+        if self._scale.ndim == 1:
+            return x * self._scale
+        return np.dot(x, self._scale)
+
+    def scaledBV(self):
+        # the scaled BVs and their squared norms (cached)
+        n = self.numBV
+        if not self._scaledValid:
+            if not self._BVs.flags.writeable:
+                # read-only snapshot in shared memory: keep the scaled BVs in private memory
+                self._BVs = np.zeros(shape=self._BVs.shape)
+                self._BVnorm = np.zeros(shape=self._BVnorm.shape)
+            self._BVs[:n] = self.scaleInputs(self._BV[:n])
+            self._BVnorm[:n] = np.sum(self._BVs[:n] ** 2, axis=1)
+            self._scaledValid = True
+        return self._BVs[:n], self._BVnorm[:n]
+
+    def kernelScaled(self, xs1, xs2, norm1=None, norm2=None):
+        # coeff * exp(-0.5 |xs1 - xs2|^2) for scaled inputs (n1 x n2)
+        #   (additive kernel: the sum of the group components, the norms are per group)
+        if self.groups is not None:
+            K = self.kernelGroup(xs1, xs2, self.groups[0])
+            for g in self.groups[1:]:
+                K += self.kernelGroup(xs1, xs2, g)
+            return K
+        if norm1 is None:
+            norm1 = np.sum(xs1 * xs1, axis=1)
+        if norm2 is None:
+            norm2 = np.sum(xs2 * xs2, axis=1)
+        K = -2 * np.dot(xs1, xs2.transpose())
+        K += norm1[:, np.newaxis]
+        K += norm2[np.newaxis, :]
+        K *= -0.5
+        np.exp(K, out=K)
+        K *= np.exp(self.covar_params[1])
+        return K
+
+    def kernelGroup(self, xs1, xs2, g):
+        # component of the additive kernel for the group g (scaled inputs, B does not couple the groups):
+        #   coeff / ngroups * exp(-0.5 |xs1_g - xs2_g|^2) (n1 x n2)
+        xs1 = xs1[:, g]
+        xs2 = xs2[:, g]
+        K = -2 * np.dot(xs1, xs2.transpose())
+        K += np.sum(xs1 * xs1, axis=1)[:, np.newaxis]
+        K += np.sum(xs2 * xs2, axis=1)[np.newaxis, :]
+        K *= -0.5
+        np.exp(K, out=K)
+        K *= np.exp(self.covar_params[1]) / len(self.groups)
+        return K
+
+    def computeCovDiag(self, x):
+        # diagonal of computeCov(x, x, is_self=True) as a (n x 1) vector
+        #   (stationary kernels: k(x,x) = coeff)
+        return np.full((x.shape[0], 1), np.exp(self.covar_params[1]) + self.noise_var)
+
     def computeRBF(self, x1, x2):  # radial basis functions
         (n1, dim) = x1.shape
         n2 = x2.shape[0]
@@ -539,6 +1044,41 @@ class OGP(object):
     # end OGP class
 
 
+def checkGroups(groups, dim):
+    # groups of the additive kernel as a list of index arrays covering all dim inputs (None - full kernel)
+    if groups is None:
+        return None
+    groups = [np.array(g, dtype=int).flatten() for g in groups if len(g)]
+    used = np.concatenate(groups) if len(groups) else np.zeros(0, dtype=int)
+    if len(np.unique(used)) != len(used) or np.any(used < 0) or np.any(used >= dim):
+        raise Exception("Kernel groups must be disjoint lists of input dimensions")
+    groups += [np.array([i]) for i in range(dim) if i not in used]
+    return groups
+
+
+def correlationGroups(corrmat, thresh=0.1):
+    # groups of inputs for the additive kernel: connected components of the graph of the inputs
+    #   with |correlation| > thresh (e.g. the matching quad pairs of matrixmodel.Beamconfig.corrmat)
+    corrmat = np.abs(np.array(corrmat, dtype=float))
+    dim = corrmat.shape[0]
+    label = -np.ones(dim, dtype=int)
+    groups = []
+    for i in range(dim):
+        if label[i] >= 0:
+            continue
+        label[i] = len(groups)
+        group = [i]
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            for k in np.nonzero((corrmat[j] > thresh) & (label < 0))[0]:
+                label[k] = label[i]
+                group.append(int(k))
+                stack.append(k)
+        groups.append(sorted(group))
+    return groups
+
+
 # GP function prediction pdf
 def logLikelihood(noise, y, mu, var):
     sigX2 = noise + var
@@ -554,6 +1094,26 @@ def stabilizeMatrix(M):
     return (M + M.transpose()) / 2
 
 
+def cholUpdate(L, x):
+    # in place rank-1 update of the lower Cholesky factor: L L^T + x x^T
+    x = np.array(x, dtype=float).flatten()
+    for k in range(x.size):
+        r = np.hypot(L[k, k], x[k])
+        c = r / L[k, k]
+        s = x[k] / L[k, k]
+        L[k, k] = r
+        L[k + 1:, k] = (L[k + 1:, k] + s * x[k + 1:]) / c
+        x[k + 1:] = c * x[k + 1:] - s * L[k + 1:, k]
+    return L
+
+
+def symmetrize(M):
+    # in place version of stabilizeMatrix
+    np.add(M, M.transpose(), out=M)
+    M *= 0.5
+    return M
+
+
 def extendMatrix(M, ind=-1):
     if (ind == -1):
         M = np.concatenate((M, np.zeros(shape=(M.shape[0], 1))), axis=1)
@@ -36,6 +36,8 @@ Methods:
         For 'testEI', returns the index of the point instead.
         For normal acquisition, currently uses the bounded L-BFGS optimizer.
             Haven't tested alternatives much.
+        With vectorizedQ, all start points of the grid search descend together
+            in-process (batchminimize, one batched model call per step).
     best_seen(): Uses the model to make predictions at every observed point,
         returning the best-performing (x,y) pair. This is more robust to noise
         than returning the best observation, but could be replaced by other,
@@ -72,11 +74,13 @@ from GP.parallelstuff import *
 
 import time
 #import math
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 import pandas as pd
 import copy
 
 from GP.heatmap import plotheatmap
+from GP.chaospy_sequences import create_hammersley_samples
 
 def normVector(nparray):
     return nparray / np.linalg.norm(nparray)
@@ -101,9 +105,31 @@ class BayesOpt:
         self.alpha = 1
         self.kill = False
         self.ndim = np.array(start_dev_vals).size
-        self.multiprocessingQ = True # speed up acquisition function optimization
-        if os.name in ['nt', 'posix']: # multiprocessing doesn't work on Mac and probably windows
-            self.multiprocessingQ = False
+        # speed up acquisition function optimization with a persistent worker pool (opt-in: the model must be
+        # picklable, e.g. not a DKLGP with a neural network embedding)
+        self.multiprocessingQ = False
+        self.nproc = None # number of pool processes, None - number of CPUs
+        self.pool_timeout = 60. # seconds, the pool is restarted and the acquisition runs serially on timeout
+        self.pool = None
+        # pipeline mode: the acquisition of the next point overlaps with the measurement of the current one
+        self.pipeline = False
+        # number of points per batch in the ask/tell protocol (see search())
+        self.nask = 1
+        # use the analytic gradients of the acquisition function if the model provides predict_with_grad
+        self.use_grad = False
+        self.grad_seed = 0 # seed of the start points of the gradient search (local_start)
+        self.grad_rng = None
+        # vectorized in-process acquisition optimizer (batchminimize): all start points advance together with one
+        # batched model call per step instead of one L-BFGS-B run per start point
+        self.vectorizedQ = False
+        self.vectorized_maxiter = 200
+        # device limit box ((ndim x 2) array, -inf/inf where unbounded): the acquisition only proposes points
+        # inside it. None - no limits
+        self.limits = None
+        self.nrejected = 0 # number of acquired points which had to be moved into the limit box
+        # models with an additive kernel (model.groups): the acquisition is searched group by group
+        self.group_sweeps = 3 # max number of sweeps over the groups
+        self.group_neval = 20 # grid points per group dimension
         print("Bayesian optimizer set to use ", acq_func, " acquisition function")
 
         # DELETE AFTER PUSHING mint.GaussProcess.preprocess stuff into here
@@ -418,44 +444,171 @@ class BayesOpt:
     def minimize(self, error_func, x):
         # weighting for exploration vs exploitation in the GP at the end of scan, alpha array goes from 1 to zero
         #alpha = [1.0 for i in range(40)]+[np.sqrt(50-i)/3.0 for i in range(41,51)]
+        if self.pipeline:
+            inverse_sign = -1
+            self.current_x = np.array(np.array(x).flatten(), ndmin=2)
+            self.X_obs = np.array(self.current_x)
+            self.Y_obs = [np.array([[inverse_sign*error_func(np.array(x))]])]
+            self.minimize_pipeline(error_func)
+            return
+        search = self.search(x)
+        try:
+            points = next(search)
+            while True:
+                points = search.send([error_func(point) for point in points])
+        except StopIteration:
+            pass
+        finally:
+            search.close()
+
+    def get_pool(self):
+        """
+        Worker pool of the acquisition function optimization, it lives until close_pool() (end of the scan).
+
+        :return: AcquisitionPool
+        """
+        if self.pool is None:
+            self.pool = AcquisitionPool(nprocs=self.nproc, timeout=self.pool_timeout)
+        return self.pool
+
+    def close_pool(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def search(self, x):
+        """
+        Bayesian optimization as a generator of the ask/tell protocol: yields the points to measure
+        (m x dim array) and receives the measured values. The batch size follows self.nask,
+        the points of a batch are acquired with acquire_batch().
+
+        :param x: initial point
+        :return: generator
+        """
         inverse_sign = -1
         self.current_x = np.array(np.array(x).flatten(), ndmin=2)
         #self.current_y = [np.array([[inverse_sign*error_func(x)]])]
         self.X_obs = np.array(self.current_x)
-        self.Y_obs = [np.array([[inverse_sign*error_func(np.array(x))]])]
+        y_init = yield self.current_x
+        self.Y_obs = [np.array([[inverse_sign*y_init[0]]])]
         # iterate though the GP method
-        #print("GP minimize",  error_func, x, error_func(x))
-        for i in range(self.max_iter):
-            # get next point to try using acquisition function
-            x_next = self.acquire(self.alpha)
-            #check for problems with the beam
-            if self.check != None: self.check.errorCheck()
-
-            y_new = error_func(x_next.flatten())
-            #if self.kill:
-            if self.opt_ctrl.kill:
-                print ('Killing Bayesian optimizer...')
-                #disable so user does not start another scan while the data is being saved
-                break
-            y_new = np.array([[inverse_sign *y_new]])
+        niter = 0
+        try:
+            while niter < self.max_iter:
+                # get next points to try using acquisition function
+                x_next = self.acquire_batch(max(1, min(self.nask, self.max_iter - niter)))
+                #check for problems with the beam
+                if self.check != None: self.check.errorCheck()
+
+                y_new = yield x_next
+                #if self.kill:
+                if self.opt_ctrl.kill:
+                    print ('Killing Bayesian optimizer...')
+                    #disable so user does not start another scan while the data is being saved
+                    break
+
+                # add new entries to observed data and update the model
+                for i in range(len(x_next)):
+                    self.add_observation(deepcopy(x_next[i:i+1]), np.array([[inverse_sign*y_new[i]]]))
+                niter += len(x_next)
+        finally:
+            self.close_pool()
+
+    def minimize_pipeline(self, error_func):
+        """
+        Pipelined optimization loop. The measurement of the point k (machine settling and objective acquisition)
+        runs in a worker thread. Meanwhile the model is updated with the point k-1 and the point k+1 is acquired
+        on a copy of the model updated with the predicted mean at the point k (kriging believer).
+        The acquisition CPU time is hidden behind the measurement time.
 
-            # advance the optimizer to the next iteration
-            # self.opt.OptIter(alpha=alpha[i])
-            # self.OptIter() # no alpha
+        :param error_func: objective function, the initial point must be already in X_obs/Y_obs
+        :return: None
+        """
+        inverse_sign = -1
+        x_next = self.acquire(self.alpha)
+        pending = None
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            for i in range(self.max_iter):
+                #check for problems with the beam
+                if self.check != None: self.check.errorCheck()
+
+                future = executor.submit(error_func, x_next.flatten())
+
+                # while the machine is settling: update the model with the previous point ...
+                if pending is not None:
+                    self.add_observation(*pending)
+                    pending = None
+
+                # ... and acquire the next point speculatively
+                x_after = None
+                if i < self.max_iter - 1:
+                    x_after = self.acquire_batch(1, pending=[x_next])
+
+                y_new = future.result()
+                if self.opt_ctrl.kill:
+                    print ('Killing Bayesian optimizer...')
+                    break
+                pending = (deepcopy(x_next), np.array([[inverse_sign*y_new]]))
+                x_next = x_after
+        finally:
+            executor.shutdown(wait=True)
+            self.close_pool()
+
+        if pending is not None:
+            self.add_observation(*pending)
+
+    def add_observation(self, x_new, y_new):
+        """
+        Add the measured point to the observed data and update the model.
 
-            # change position of interface and get resulting y-value
+        :param x_new: (1 x dim) point
+        :param y_new: (1 x 1) measured value (sign inverted)
+        :return: None
+        """
+        self.current_x = x_new
+        self.X_obs = np.concatenate((self.X_obs, x_new), axis=0)
+        self.Y_obs.append(y_new)
+        self.model.update(x_new, y_new)
+
+    def add_fantasy(self, x):
+        """
+        Add the point with the value predicted by the model (kriging believer).
 
-            x_new = deepcopy(x_next)
-            # (x_new, y_new) = self.mi.getState()
-            self.current_x = x_new
-            # self.current_y = y_new
+        :param x: (1 x dim) point
+        :return: None
+        """
+        y_fantasy = np.array(self.model.predict(np.array(x, ndmin=2))[0], ndmin=2)[:1, :1]
+        self.add_observation(x, y_fantasy)
 
-            # add new entry to observed data
-            self.X_obs = np.concatenate((self.X_obs, x_new), axis=0)
-            self.Y_obs.append(y_new)
+    def acquire_batch(self, n=1, pending=()):
+        """
+        Acquire n points. The points which are being measured (pending) and the points of the batch acquired
+        so far enter a copy of the model with their predicted values (kriging believer).
+        The model and the observed data are restored afterwards.
 
-            # update the model (may want to add noise if using testEI)
-            self.model.update(x_new, y_new)  # + .5*np.random.randn())
+        :param n: number of points
+        :param pending: (1 x dim) points which are being measured
+        :return: (n x dim) points
+        """
+        if n == 1 and len(pending) == 0:
+            return self.acquire(self.alpha)
+        model, X_obs, Y_obs, current_x = self.model, self.X_obs, self.Y_obs, self.current_x
+        self.model = deepcopy(model)
+        self.Y_obs = list(Y_obs)
+        points = []
+        try:
+            for x_pending in pending:
+                self.add_fantasy(x_pending)
+            while True:
+                x_next = self.acquire(self.alpha)
+                points.append(x_next)
+                if len(points) == n:
+                    break
+                self.add_fantasy(x_next)
+        finally:
+            self.model, self.X_obs, self.Y_obs, self.current_x = model, X_obs, Y_obs, current_x
+        return np.concatenate(points, axis=0)
 
     def OptIter(self, pause=0):
         # runs the optimizer for one iteration
@@ -518,12 +671,19 @@ class BayesOpt:
         done best if this needs to be faster.
 
         Not needed for UCB so do it the fast way (return max obs)
+
+        The posterior mean at all observed points is computed in one call; models with
+        predict_mean keep the kernel rows of the observed points cached between calls.
         """
         if (self.acq_func[0] == 'UCB'):
             mu = self.Y_obs
         else:
-            (mu, var) = self.model.predict(self.X_obs)
-            mu = [self.model.predict(np.array(x, ndmin=2))[0] for x in self.X_obs]
+            X_obs = np.array(self.X_obs, ndmin=2)
+            if hasattr(self.model, 'predict_mean'):
+                mu = self.model.predict_mean(X_obs, cache_key='X_obs')
+            else:
+                mu = predictBatch(self.model, X_obs)[0]
+            mu = [np.array(m, ndmin=2) for m in np.ravel(mu)]
 
         # (mu2, var2) = self.model.predict(self.X_obs)
         # print 'self.X_obs = ', self.X_obs
@@ -536,6 +696,84 @@ class BayesOpt:
         return (self.X_obs[ind_best], mu_best)
         # return (np.array(self.X_obs[ind_best], ndmin=2), mu_best)
 
+    def acquisition_seeds(self, aqfcn_batch, fargs, lengthscales, ndim, limits=None):
+        """
+        Start points of the acquisition function optimization: a vectorized grid search around the best
+        points seen so far and the first points of the scan, projected onto the limit box.
+
+        :return: (nkeep x (ndim+1)) array of the start points and the acquisition function values, best first
+        """
+        neval = 2 * int(10. * 2. ** (ndim / 12.))
+        nkeep = 2 * min(8, neval)
+
+        ## parallelgridsearch generates pseudo-random grid, then performs an ICDF transform
+        ## to map to multinormal distrinbution centered on x_start and with widths given by hyper params
+        # v0s = parallelgridsearch(aqfcn,x_start,0.6*lengthscales,fargs,neval,nkeep)
+
+        nbest = 3  # add the best points seen so far (largest Y_obs)
+        nstart = 2  # make sure some starting points are there to prevent run away searches
+        yobs = np.array([y[0][0] for y in self.Y_obs])
+        isearch = yobs.argsort()[-nbest:]
+        for i in range(min(nstart, len(self.Y_obs))):  #
+            if np.sum(isearch == i) == 0:  # not found in list
+                isearch = np.append(isearch, i)
+        isearch.sort()  # sort to bias searching near earlier steps
+        # vectorized grid search: all candidates around all centers are scored in one pass
+        v0s = gridsearch(aqfcn_batch,self.X_obs[isearch],0.6*lengthscales,fargs,neval,nkeep,limits=limits)
+
+        v0sort = v0s[:, -1].argsort()[:nkeep]  # keep the nlargest
+        return v0s[v0sort]
+
+    def acquire_groups(self, aqfcn_batch, fargs, x_start, iter_bounds, groups):
+        """
+        Acquisition for models with an additive kernel. The devices of one group are searched on a
+        Hammersley grid within the iteration bounds while the other devices stay fixed, group after group,
+        until a sweep over all groups brings no improvement. The cost grows linearly with the number of
+        groups instead of exponentially with the dimension.
+
+        :param groups: list of index arrays of the devices of each group (model.groups)
+        :return: (dim,) point
+        """
+        x = np.array(x_start, dtype=float).flatten()
+        iter_bounds = np.array(iter_bounds, dtype=float)
+        f = np.ravel(aqfcn_batch(x[np.newaxis, :], *fargs))[0]
+        for sweep in range(self.group_sweeps):
+            improved = False
+            for g in groups:
+                neval = self.group_neval * len(g)
+                (lo, hi) = (iter_bounds[g, 0], iter_bounds[g, 1])
+                xs = np.tile(x, (neval, 1))
+                xs[:, g] = lo + (hi - lo) * create_hammersley_samples(order=neval, dim=len(g)).T
+                fs = np.ravel(aqfcn_batch(xs, *fargs))
+                i = int(np.argmin(fs))
+                if fs[i] < f:
+                    (x, f) = (xs[i], fs[i])
+                    improved = True
+            if not improved:
+                break
+        return x
+
+    def local_start(self, aqfcn_batch, fargs, x_start, lengthscales, iter_bounds, ncand=None):
+        """
+        Start point of the single-process L-BFGS-B search with the analytic gradients (use_grad). The acquisition
+        gradient vanishes at the incumbent where the posterior variance has its minimum, so a search started
+        there stops at once and the incumbent is proposed again. The search starts from the best of a random
+        cloud around the incumbent instead (seeded with grad_seed for reproducible scans).
+
+        :param ncand: number of points in the cloud, 10*ndim if None
+        :return: (ndim,) start point within iter_bounds
+        """
+        x_start = np.array(x_start, dtype=float).flatten()
+        iter_bounds = np.array(iter_bounds, dtype=float)
+        if ncand is None:
+            ncand = 10 * x_start.size
+        if self.grad_rng is None:
+            self.grad_rng = np.random.RandomState(self.grad_seed)
+        xs = x_start + 0.5 * np.array(lengthscales).flatten() * self.grad_rng.randn(ncand, x_start.size)
+        xs = np.clip(xs, iter_bounds[:, 0], iter_bounds[:, 1])
+        fs = np.ravel(aqfcn_batch(xs, *fargs))
+        return xs[int(np.argmin(fs))]
+
     def acquire(self, alpha=1.):
 
         # print 'self.model.prmean = ', self.model.prmean
@@ -585,6 +823,12 @@ class BayesOpt:
         else:
             iter_bounds = self.bounds
 
+        # only feasible points: the trust region is intersected with the device limits
+        limits = self.limits
+        if limits is not None:
+            limits = np.array(limits, dtype=float)
+            iter_bounds = intersect_bounds(iter_bounds, limits)
+
         # print "x_start = " + str(x_start)
         # print "BayesOpt.acquire - self.model.covar_params = " + str(self.model.covar_params)
         # print "self.model.covar_params[0] = " + str(self.model.covar_params[0])
@@ -611,18 +855,21 @@ class BayesOpt:
         if (self.acq_func[0] == 'PI'):
 
             aqfcn = negProbImprove
+            aqfcn_batch = negProbImproveBatch
             fargs = (self.model, y_best, self.acq_func[1])
 
         # expected improvement acquisition function
         elif (self.acq_func[0] == 'EI'):
 
             aqfcn = negExpImprove
+            aqfcn_batch = negExpImproveBatch
             fargs = (self.model, y_best, self.acq_func[1], alpha)
 
         # gaussian process upper confidence bound acquisition function
         elif (self.acq_func[0] == 'UCB'):
 
             aqfcn = negUCB
+            aqfcn_batch = negUCBBatch
             fargs = (self.model, ndim, nsteps, self.ucb_params[0], self.ucb_params[1])
 
         # maybe something mitch was using once? (can probably remove)
@@ -631,20 +878,29 @@ class BayesOpt:
             options = np.array(self.acq_func[2].iloc[:, :-1])
             (x_best, y_best) = self.best_seen()
 
-            # find the option with best EI
-            best_option_score = (-1, 1e12)
-            for i in range(options.shape[0]):
-                result = negExpImprove(options[i], self.model, y_best, self.acq_func[1])
-                if (result < best_option_score[1]):
-                    best_option_score = (i, result)
+            # find the option with best EI (all options in one pass)
+            scores = negExpImproveBatch(options, self.model, y_best, self.acq_func[1], cache_key='testEI')
 
             # return the index of the best option
-            return best_option_score[0]
+            return int(np.argmin(scores))
 
         else:
             print('Unknown acquisition function.')
             return 0
 
+        # analytic gradients of the acquisition function for L-BFGS-B (jac=True)
+        aqfcn_min = aqfcn
+        jac = False
+        if self.use_grad and hasattr(self.model, 'predict_with_grad') and getattr(self.model, 'linear_embedding', True):
+            aqfcn_min = {'PI': negProbImproveGrad, 'EI': negExpImproveGrad, 'UCB': negUCBGrad}[self.acq_func[0]]
+            jac = True
+
+        # additive kernel: block coordinate search over the groups of devices
+        groups = getattr(self.model, 'groups', None)
+        if groups is not None:
+            res = self.acquire_groups(aqfcn_batch, fargs, x_start, iter_bounds, groups)
+            return np.array(res, ndmin=2)
+
         try:
             # manual scan for diagnostics
             if False:
@@ -680,48 +936,25 @@ class BayesOpt:
                     print('Could not print acquisition heatmap.')
                     pass
 
-            if (self.multiprocessingQ):
-
-                neval = 2 * int(10. * 2. ** (ndim / 12.))
-                nkeep = 2 * min(8, neval)
-
-
-                ## parallelgridsearch generates pseudo-random grid, then performs an ICDF transform
-                ## to map to multinormal distrinbution centered on x_start and with widths given by hyper params
-                # v0s = parallelgridsearch(aqfcn,x_start,0.6*lengthscales,fargs,neval,nkeep)
-                # x0s = v0s[:,:-1] # for later testing if the minimize results are better than the best starting point
-                # v0best = v0s[0]
-                ##x0s = parallelgridsearch(aqfcn,x_start,lengthscales,fargs,max(1,int(neval/2)),max(1,int(nkeep/2)))
-                ##x0s = np.vstack((x0s,parallelgridsearch(aqfcn,x_start,0.5*lengthscales,fargs,max(1,int(neval/2)),max(1,int(nkeep/2)))))
-
-                # add the 10 best points seen so far (largest Y_obs)
-                nbest = 3  # add the best points seen so far (largest Y_obs)
-                nstart = 2  # make sure some starting points are there to prevent run away searches
-                yobs = np.array([y[0][0] for y in self.Y_obs])
-                isearch = yobs.argsort()[-nbest:]
-                for i in range(min(nstart, len(self.Y_obs))):  #
-                    if np.sum(isearch == i) == 0:  # not found in list
-                        isearch = np.append(isearch, i)
-                isearch.sort()  # sort to bias searching near earlier steps
-                # isearch = isearch[::-1]
-                # print 'isearch = ', isearch
-                # print 'self.X_obs = ', self.X_obs
-                # print 'self.Y_obs = ', self.Y_obs
-                v0s = None
-                for i in isearch:
-                    vs = parallelgridsearch(aqfcn,self.X_obs[i],0.6*lengthscales,fargs,neval,nkeep)
-                    if type(v0s) == type(None):
-                        v0s = copy.copy(vs)
-                    else:
-                        v0s = np.vstack((v0s, vs))
-
-                #print 'v0s = ', v0s
-
-                v0sort = v0s[:, -1].argsort()[:nkeep]  # keep the nlargest
-                # print 'v0sort = ', v0sort
-                # print 'v0s[v0sort] = ', v0s[v0sort]
-                v0s = v0s[v0sort]
+            if (self.vectorizedQ):
+
+                # seeds from the grid search, then all of them descend together in this process
+                v0s = self.acquisition_seeds(aqfcn_batch, fargs, lengthscales, ndim, limits)
+                x0s = v0s[:, :-1]
+                if jac:
+                    aqfcn_vec = {'PI': negProbImproveBatchGrad, 'EI': negExpImproveBatchGrad,
+                                 'UCB': negUCBBatchGrad}[self.acq_func[0]]
+                else:
+                    aqfcn_vec = aqfcn_batch
+                bounds = x0s[:, :, np.newaxis] + relative_bounds[np.newaxis, :, :]
+                if limits is not None:
+                    bounds = intersect_bounds(bounds, limits)
+                res = batchminimize(aqfcn_vec, x0s, bounds, fargs, jac=jac, maxiter=self.vectorized_maxiter)
+                res = res[0, :-1] # the start points only move on improvement
 
+            elif (self.multiprocessingQ):
+
+                v0s = self.acquisition_seeds(aqfcn_batch, fargs, lengthscales, ndim, limits)
                 x0s = v0s[:, :-1]  # for later testing if the minimize results are better than the best starting point
                 v0best = v0s[0]
 
@@ -748,29 +981,42 @@ class BayesOpt:
 
                 if basinhoppingQ:
                     # use basinhopping
-                    bkwargs = dict(niter=niter,niter_success=niter_success, minimizer_kwargs={'method':optmethod,'args':fargs,'tol':tolerance,'bounds':iter_bounds,'options':{'maxiter':maxiter}}) # keyword args for basinhopping
-                    res = parallelbasinhopping(aqfcn,x0s,bkwargs)
+                    bkwargs = dict(niter=niter,niter_success=niter_success, minimizer_kwargs={'method':optmethod,'args':fargs,'jac':jac,'tol':tolerance,'bounds':iter_bounds,'options':{'maxiter':maxiter}}) # keyword args for basinhopping
+                    res = parallelbasinhopping(aqfcn_min,x0s,bkwargs)
 
                 else:
                     # use minimize
-                    mkwargs = dict(bounds=iter_bounds, method=optmethod, options={'maxiter':maxiter}, tol=tolerance) # keyword args for scipy.optimize.minimize
-                    res = parallelminimize(aqfcn,x0s,fargs,mkwargs,v0best,relative_bounds=relative_bounds)
+                    mkwargs = dict(bounds=iter_bounds, method=optmethod, jac=jac, options={'maxiter':maxiter}, tol=tolerance) # keyword args for scipy.optimize.minimize
+                    pool = self.get_pool()
+                    pool.publish(self.model) # the model is sent to the workers once per acquisition
+                    res = parallelminimize(aqfcn_min,x0s,fargs,mkwargs,v0best,relative_bounds=relative_bounds,pool=pool,limits=limits)
                 print ('mkwargs = ', mkwargs)
                 print ('res = ', res)
 
             else: # single-processing
                 if basinhoppingQ:
-                    res = basinhopping(aqfcn, x_start,niter=niter,niter_success=niter_success, minimizer_kwargs={'method':optmethod,'args':(self.model, y_best, self.acq_func[1], alpha),'tol':tolerance,'bounds':iter_bounds,'options':{'maxiter':maxiter}})
+                    res = basinhopping(aqfcn_min, x_start,niter=niter,niter_success=niter_success, minimizer_kwargs={'method':optmethod,'args':fargs,'jac':jac,'tol':tolerance,'bounds':iter_bounds,'options':{'maxiter':maxiter}})
 
                 else:
-                    res = minimize(aqfcn, x_start, args=(self.model, y_best, self.acq_func[1], alpha), method=optmethod,tol=tolerance,bounds=iter_bounds,options={'maxiter':maxiter})
+                    x0 = x_start
+                    if jac:
+                        x0 = self.local_start(aqfcn_batch, fargs, x_start, lengthscales, iter_bounds)
+                    res = minimize(aqfcn_min, x0, args=fargs, jac=jac, method=optmethod,tol=tolerance,bounds=iter_bounds,options={'maxiter':maxiter})
 
                 res = res.x
                 # end else
             #print 'res = ',res
         except:
             raise
-        return np.array(res,ndmin=2) # return resulting x value as a (1 x dim) vector
+        res = np.array(res, ndmin=2)
+        if limits is not None:
+            feasible = np.clip(res, limits[:, 0], limits[:, 1])
+            if np.any(feasible != res):
+                self.nrejected += 1
+                print('BayesOpt - WARNING: acquired point outside of the device limits moved into the limits (',
+                      self.nrejected, ' so far)')
+                res = feasible
+        return res # return resulting x value as a (1 x dim) vector
 
 # why is this class declared in BayesOptimization.py???
 class HyperParams:
@@ -1113,6 +1359,171 @@ def negExpImprove(x_new, model, y_best, xi, alpha=1.0):
     return alpha * (-EI) + (1. - alpha) * (-y_mean)
 
 
+def predictBatch(model, x_new, cache_key=None):
+    """
+    Predictive mean and variance at the (n x dim) points with one model.predict call.
+    Accepts models returning either the full (n x n) covariance or the (n x 1) variances.
+
+    :param cache_key: None, key of a persistent candidate set; the model keeps its kernel columns
+                      between calls (OGP/DKLGP only)
+    :return: (y_mean, y_var), both of shape (n,)
+    """
+    x_new = np.array(x_new, ndmin=2)
+    if cache_key is None:
+        (y_mean, y_var) = model.predict(x_new)
+    else:
+        (y_mean, y_var) = model.predict(x_new, cache_key=cache_key)
+    y_var = np.asarray(y_var)
+    if y_var.ndim == 2 and y_var.shape[1] > 1:
+        y_var = np.diagonal(y_var)
+    n = x_new.shape[0]
+    return np.reshape(y_mean, n), np.reshape(y_var, n)
+
+
+def negProbImproveBatch(x_new, model, y_best, xi, cache_key=None):
+    """
+    Vectorized negProbImprove for (n x dim) points.
+
+    :return: (n,) array, 0 where the predictive variance is zero
+    """
+    (y_mean, y_var) = predictBatch(model, x_new, cache_key)
+    diff = y_mean - np.squeeze(y_best) - xi
+    pos = y_var > 0
+    PI = np.zeros_like(y_mean)
+    PI[pos] = norm.cdf(diff[pos] / np.sqrt(y_var[pos]))
+    return -PI
+
+
+def negExpImproveBatch(x_new, model, y_best, xi, alpha=1.0, cache_key=None):
+    """
+    Vectorized negExpImprove for (n x dim) points.
+
+    :return: (n,) array, 0 where the predictive variance is zero
+    """
+    (y_mean, y_var) = predictBatch(model, x_new, cache_key)
+    diff = y_mean - np.squeeze(y_best) - xi
+    pos = y_var > 0
+    std = np.sqrt(y_var[pos])
+    Z = diff[pos] / std
+    EI = diff[pos] * norm.cdf(Z) + std * norm.pdf(Z)
+    res = np.zeros_like(y_mean)
+    res[pos] = alpha * (-EI) + (1. - alpha) * (-y_mean[pos])
+    return res
+
+
+def negUCBBatch(x_new, model, ndim, nsteps, nu=1., delta=1., cache_key=None):
+    """
+    Vectorized negUCB for (n x dim) points.
+
+    :return: (n,) array
+    """
+    if nsteps == 0: nsteps += 1
+    (y_mean, y_var) = predictBatch(model, x_new, cache_key)
+    tau = 2. * np.log(nsteps ** (0.5 * ndim + 2.) * (np.pi ** 2.) / 3. / delta)
+    return -(y_mean + np.sqrt(nu * tau * np.maximum(y_var, 0.)))
+
+
+def negProbImproveGrad(x_new, model, y_best, xi):
+    """
+    negProbImprove and its gradient (for scipy.optimize.minimize with jac=True).
+    Requires model.predict_with_grad.
+    """
+    (y_mean, y_var, d_mean, d_var) = model.predict_with_grad(np.array(x_new, ndmin=2))
+    y_mean, y_var = float(np.ravel(y_mean)[0]), float(np.ravel(y_var)[0])
+    if (y_var <= 0):
+        return 0., np.zeros(np.size(x_new))
+    std = np.sqrt(y_var)
+    Z = (y_mean - np.squeeze(y_best) - xi) / std
+    d_std = d_var[0] / (2. * std)
+    d_Z = (d_mean[0] - Z * d_std) / std
+    return -norm.cdf(Z), -norm.pdf(Z) * d_Z
+
+
+def negExpImproveGrad(x_new, model, y_best, xi, alpha=1.0):
+    """
+    negExpImprove and its gradient (for scipy.optimize.minimize with jac=True).
+    Requires model.predict_with_grad. dEI/dx = cdf(Z) dmean/dx + pdf(Z) dstd/dx
+    """
+    (y_mean, y_var, d_mean, d_var) = model.predict_with_grad(np.array(x_new, ndmin=2))
+    y_mean, y_var = float(np.ravel(y_mean)[0]), float(np.ravel(y_var)[0])
+    if (y_var <= 0):
+        return 0., np.zeros(np.size(x_new))
+    std = np.sqrt(y_var)
+    diff = y_mean - np.squeeze(y_best) - xi
+    Z = diff / std
+    EI = diff * norm.cdf(Z) + std * norm.pdf(Z)
+    d_EI = norm.cdf(Z) * d_mean[0] + norm.pdf(Z) * d_var[0] / (2. * std)
+    return alpha * (-EI) + (1. - alpha) * (-y_mean), alpha * (-d_EI) + (1. - alpha) * (-d_mean[0])
+
+
+def negUCBGrad(x_new, model, ndim, nsteps, nu=1., delta=1.):
+    """
+    negUCB and its gradient (for scipy.optimize.minimize with jac=True).
+    Requires model.predict_with_grad.
+    """
+    if nsteps == 0: nsteps += 1
+    (y_mean, y_var, d_mean, d_var) = model.predict_with_grad(np.array(x_new, ndmin=2))
+    y_mean, y_var = float(np.ravel(y_mean)[0]), float(np.ravel(y_var)[0])
+    tau = 2. * np.log(nsteps ** (0.5 * ndim + 2.) * (np.pi ** 2.) / 3. / delta)
+    if (y_var <= 0):
+        return -y_mean, -d_mean[0]
+    width = np.sqrt(nu * tau * y_var)
+    return -(y_mean + width), -(d_mean[0] + nu * tau * d_var[0] / (2. * width))
+
+
+
+def negProbImproveBatchGrad(x_new, model, y_best, xi):
+    """
+    Vectorized negProbImproveGrad for (n x dim) points (one model.predict_with_grad call).
+
+    :return: ((n,) values, (n x dim) gradients), 0 where the predictive variance is zero
+    """
+    (y_mean, y_var, d_mean, d_var) = model.predict_with_grad(np.array(x_new, ndmin=2))
+    y_mean, y_var = np.ravel(y_mean), np.ravel(y_var)
+    pos = y_var > 0
+    std = np.sqrt(np.where(pos, y_var, 1.))
+    Z = (y_mean - np.squeeze(y_best) - xi) / std
+    d_std = d_var / (2. * std[:, np.newaxis])
+    d_Z = (d_mean - Z[:, np.newaxis] * d_std) / std[:, np.newaxis]
+    PI = np.where(pos, norm.cdf(Z), 0.)
+    d_PI = np.where(pos[:, np.newaxis], norm.pdf(Z)[:, np.newaxis] * d_Z, 0.)
+    return -PI, -d_PI
+
+
+def negExpImproveBatchGrad(x_new, model, y_best, xi, alpha=1.0):
+    """
+    Vectorized negExpImproveGrad for (n x dim) points (one model.predict_with_grad call).
+
+    :return: ((n,) values, (n x dim) gradients), 0 where the predictive variance is zero
+    """
+    (y_mean, y_var, d_mean, d_var) = model.predict_with_grad(np.array(x_new, ndmin=2))
+    y_mean, y_var = np.ravel(y_mean), np.ravel(y_var)
+    pos = y_var > 0
+    std = np.sqrt(np.where(pos, y_var, 1.))
+    diff = y_mean - np.squeeze(y_best) - xi
+    Z = diff / std
+    EI = diff * norm.cdf(Z) + std * norm.pdf(Z)
+    d_EI = norm.cdf(Z)[:, np.newaxis] * d_mean + (norm.pdf(Z) / (2. * std))[:, np.newaxis] * d_var
+    res = np.where(pos, alpha * (-EI) + (1. - alpha) * (-y_mean), 0.)
+    d_res = np.where(pos[:, np.newaxis], alpha * (-d_EI) + (1. - alpha) * (-d_mean), 0.)
+    return res, d_res
+
+
+def negUCBBatchGrad(x_new, model, ndim, nsteps, nu=1., delta=1.):
+    """
+    Vectorized negUCBGrad for (n x dim) points (one model.predict_with_grad call).
+
+    :return: ((n,) values, (n x dim) gradients)
+    """
+    if nsteps == 0: nsteps += 1
+    (y_mean, y_var, d_mean, d_var) = model.predict_with_grad(np.array(x_new, ndmin=2))
+    y_mean, y_var = np.ravel(y_mean), np.ravel(y_var)
+    tau = 2. * np.log(nsteps ** (0.5 * ndim + 2.) * (np.pi ** 2.) / 3. / delta)
+    pos = y_var > 0
+    width = np.sqrt(nu * tau * np.where(pos, y_var, 0.))
+    d_width = np.where(pos[:, np.newaxis], nu * tau * d_var / (2. * np.where(pos, width, 1.)[:, np.newaxis]), 0.)
+    return -(y_mean + width), -(d_mean + d_width)
+
 # old version
 # def negUCB(x_new, model, mult):
 # """
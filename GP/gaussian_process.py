@@ -6,6 +6,7 @@ from matplotlib import pyplot as plt
 from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn.gaussian_process.kernels import RBF, ConstantKernel
 from scipy import optimize
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 import time
 import math
@@ -33,6 +34,8 @@ class GP:
         self.ytol = 0.001
         self.xtol = 0.001
         self.opt_ctrl = None
+        # pipeline mode: the fit and the acquisition of the next point overlap with the measurement of the current one
+        self.pipeline = False
 
     def append_new_data(self, x_new, y_obs, sigma_y_obs):
         # add new data
@@ -92,15 +95,21 @@ class GP:
         return res #self.x_search[np.argmin(y_pred)]
 
 
-    def acquire(self):
+    def acquire(self, exclude=None):
         # Make the prediction on the meshed x-axis (ask for MSE as well)
         y_pred, sigma = self.gp.predict(self.x_search, return_std=True)
+        if exclude is not None:
+            # the point is being measured (pipeline mode), take the best of the other points
+            pending = np.all(np.abs(self.x_search - exclude) <= self.xtol, axis=1)
+            y_pred = np.where(pending, np.inf, y_pred)
         x = self.x_search[np.argmin(y_pred)]
         #res = optimize.fmin(func, x)
         return x #self.x_search[np.argmin(y_pred)]
 
     def minimize(self, error_func, x):
         # weighting for exploration vs exploitation in the GP at the end of scan, alpha array goes from 1 to zero
+        if self.pipeline:
+            return self.minimize_pipeline(error_func, x)
         self.fit()
         for i in range(self.max_iter):
             # get next point to try using acquisition function
@@ -123,6 +132,41 @@ class GP:
                 break
         return self.x_obs[-1]
 
+    def minimize_pipeline(self, error_func, x):
+        """
+        Pipelined version of minimize(). While the point k is measured in a worker thread, the GP is fitted
+        with the points up to k-1 and the point k+1 is acquired (the point k is excluded from the search).
+        """
+        self.fit()
+        x_next = self.acquire()
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            for i in range(self.max_iter):
+                if self.opt_ctrl != None and self.opt_ctrl.kill == True:
+                    print('GP: Killed from external process')
+                    break
+                future = executor.submit(error_func, x_next.flatten())
+
+                x_after = None
+                if i < self.max_iter - 1:
+                    start = time.time()
+                    if i > 0:
+                        self.fit()
+                    x_after = self.acquire(exclude=x_next)
+                    print("acquire (overlapped) ", time.time() - start, " sec")
+
+                y_new = future.result()
+                self.append_new_data(x_next, y_new, sigma_y_obs=self.sigma_y)
+                if x_after is None:
+                    break
+                x_next = x_after
+                if i>3 and np.linalg.norm((self.x_obs[-3] - self.x_obs[-1])) <= self.xtol:
+                    break
+        finally:
+            executor.shutdown(wait=True)
+        self.fit()
+        return self.x_obs[-1]
+
 
 def f(x):
     """The function to predict."""
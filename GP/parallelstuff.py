@@ -3,6 +3,16 @@ from __future__ import absolute_import, print_function
 import numpy as np
 import multiprocessing as mp
 import time
+import copy
+import pickle
+import gc
+import io
+try:
+    from multiprocessing import shared_memory # python >= 3.8
+except ImportError:
+    shared_memory = None
+
+recovery_sleep_time_seconds = 1. # wait before a failed batch of worker processes is relaunched (parallelmap2)
 
 # handle 'IOError: [Errno 4] Interrupted system call' errors from multiprocessing.Queue.get
 #https://stackoverflow.com/questions/14136195/what-is-the-proper-way-to-handle-in-python-ioerror-errno-4-interrupted-syst
@@ -16,6 +26,326 @@ def my_queue_get(queue, block=True, timeout=None):
                 raise
 # Now replace instances of queue.get() with my_queue_get(queue), with other
 # parameters passed as usual.
+
+
+def intersect_bounds(bounds, limits):
+    """
+    Intersection of the box bounds with the box limits, both (ndim x 2) arrays of [low, high].
+    Where they do not overlap the bounds collapse onto the nearest limit.
+
+    :return: (ndim x 2) array
+    """
+    bounds = np.array(bounds, dtype=float)
+    limits = np.array(limits, dtype=float)
+    lo = np.clip(bounds[..., 0], limits[..., 0], limits[..., 1])
+    hi = np.clip(bounds[..., 1], limits[..., 0], limits[..., 1])
+    return np.stack((lo, np.maximum(lo, hi)), axis=-1)
+
+
+class _Published(object):
+    # placeholder for the published object (model) in the task arguments
+    def __init__(self, generation):
+        self.generation = generation
+
+
+class _SharedArray(object):
+    # reference to an array in the shared memory block of a ModelSnapshot
+    def __init__(self, offset, shape, dtype):
+        self.offset = offset
+        self.shape = shape
+        self.dtype = dtype
+
+
+class ModelSnapshot(object):
+    """
+    Publishes the numeric state of a model (OGP/DKLGP: BV, alpha, C, KB, ..., hyperparameters, linear embedding)
+    in a multiprocessing.shared_memory block. The model is pickled without its large arrays, which are copied
+    once into the block. load() rebuilds a read-only model from zero-copy views of the block (updating it raises
+    an error). The generation counter changes only if the model has changed since the last publish().
+
+    :param min_bytes: 1024, smaller arrays stay in the pickle
+    """
+    def __init__(self, min_bytes=1024):
+        self.min_bytes = min_bytes
+        self.generation = 0
+        self.shm = None
+        self.payload = None
+        self.descriptor = None
+        self.arrays = []
+
+    @staticmethod
+    def available():
+        return shared_memory is not None
+
+    def publish(self, model):
+        """
+        :param model: picklable model
+        :return: (generation, descriptor) - the descriptor is passed to load() in the workers
+        """
+        arrays = []
+
+        def persistent_id(obj):
+            if type(obj) is np.ndarray and not obj.dtype.hasobject and obj.nbytes >= self.min_bytes:
+                arrays.append(obj)
+                return len(arrays) - 1
+            return None
+
+        buf = io.BytesIO()
+        pickler = pickle.Pickler(buf, protocol=pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = persistent_id
+        pickler.dump(model)
+        payload = buf.getvalue()
+
+        if self.shm is not None and payload == self.payload and len(arrays) == len(self.arrays) and \
+                all(a.shape == b.shape and np.array_equal(a, b) for (a, b) in zip(arrays, self.arrays)):
+            return self.generation, self.descriptor # model unchanged
+
+        # copy the arrays into a new block (64 byte aligned)
+        refs = []
+        offset = 0
+        for a in arrays:
+            refs.append(_SharedArray(offset, a.shape, a.dtype.str))
+            offset += -(-a.nbytes // 64) * 64
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        views = []
+        for (a, ref) in zip(arrays, refs):
+            view = np.ndarray(ref.shape, dtype=ref.dtype, buffer=shm.buf, offset=ref.offset)
+            view[...] = a
+            views.append(view)
+
+        self.release()
+        self.shm = shm
+        self.payload = payload
+        self.arrays = views
+        self.generation += 1
+        self.descriptor = (shm.name, refs, payload)
+        return self.generation, self.descriptor
+
+    def release(self):
+        # unlinks the current block, workers which still map it keep their views
+        if self.shm is not None:
+            self.arrays = []
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    close = release
+
+    @staticmethod
+    def attach(name):
+        # attaches to the block without registering it with the resource tracker (the publisher owns the block)
+        try:
+            return shared_memory.SharedMemory(name=name, track=False) # python >= 3.13
+        except TypeError:
+            from multiprocessing import resource_tracker
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args: None
+            try:
+                return shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+
+    @staticmethod
+    def load(descriptor):
+        """
+        Rebuilds the model from the descriptor returned by publish().
+
+        :return: (model, shm) - shm must be kept alive as long as the model is used
+        """
+        (name, refs, payload) = descriptor
+        shm = ModelSnapshot.attach(name)
+
+        def persistent_load(pid):
+            ref = refs[pid]
+            view = np.ndarray(ref.shape, dtype=ref.dtype, buffer=shm.buf, offset=ref.offset)
+            view.flags.writeable = False
+            return view
+
+        unpickler = pickle.Unpickler(io.BytesIO(payload))
+        unpickler.persistent_load = persistent_load
+        return unpickler.load(), shm
+
+
+# worker side cache of the published object: {'generation': int, 'obj': object, 'shm': SharedMemory}
+_worker_state = {'generation': None, 'obj': None, 'shm': None}
+
+
+def _resolve_args(fargs, published):
+    # replaces the placeholder in fargs by the published object (rebuilt once per generation)
+    (generation, payload, shared) = published
+    if generation is not None and _worker_state['generation'] != generation:
+        _worker_state['obj'] = None
+        if _worker_state['shm'] is not None:
+            gc.collect() # drop the views of the previous snapshot
+            try:
+                _worker_state['shm'].close()
+            except BufferError:
+                pass
+            _worker_state['shm'] = None
+        if shared:
+            (_worker_state['obj'], _worker_state['shm']) = ModelSnapshot.load(payload)
+        else:
+            _worker_state['obj'] = pickle.loads(payload)
+        _worker_state['generation'] = generation
+    return tuple(_worker_state['obj'] if isinstance(a, _Published) else a for a in fargs)
+
+
+def _pool_minimize(task):
+    # minimizes f from each start point of the chunk: returns [(x, fun), ...]
+    (f, x0s, bounds, fargs, margs, published) = task
+    fargs = _resolve_args(fargs, published)
+    out = []
+    for (x0, b) in zip(x0s, bounds):
+        kwargs = dict(margs)
+        if b is not None:
+            kwargs['bounds'] = b
+        try:
+            res = minimize(f, x0, args=fargs, **kwargs)
+            out.append((np.array(res.x), float(np.ravel(res.fun)[0])))
+        except Exception as ex:
+            print('parallelstuff - WARNING: minimize failed from ', x0, '. Exception was: ', ex)
+            out.append((np.array(x0), np.inf))
+    return out
+
+
+def _pool_map(task):
+    # evaluates f on each point of the chunk
+    (f, xs, fargs, published) = task
+    fargs = _resolve_args(fargs, published)
+    return [f(x, *fargs) for x in xs]
+
+
+class AcquisitionPool(object):
+    """
+    Long lived process pool for the acquisition function optimization (one per scan).
+
+    The model is published once per iteration (publish()): its arrays are copied into shared memory
+    (ModelSnapshot, python >= 3.8) or it is pickled as a whole, and each worker rebuilds it only when
+    the generation changes, i.e. when the model has changed. Tasks are split into one chunk per process. If the
+    pool fails or a call exceeds the timeout, the pool is restarted and the call is evaluated serially
+    in the calling process. The workers are spawned (python >= 3.4), so the functions and the published object
+    must be importable/picklable by reference.
+
+    :param nprocs: None, number of processes (mp.cpu_count() if None)
+    :param timeout: 60 (seconds), timeout of one minimize/map call
+    :param shared: True, publish the model in shared memory if available
+    """
+    def __init__(self, nprocs=None, timeout=60., shared=True):
+        self.nprocs = nprocs or int(mp.cpu_count())
+        self.timeout = timeout
+        self.pool = None
+        self.generation = 0
+        self.published = None
+        self.payload = None
+        self.snapshot = ModelSnapshot() if shared and ModelSnapshot.available() else None
+        self.snapshot_generation = None
+
+    def start(self):
+        if self.pool is None:
+            # spawn: forking the threaded GUI process can deadlock the workers on locks held by other threads
+            get_context = getattr(mp, 'get_context', None)
+            if get_context is not None:
+                self.pool = get_context('spawn').Pool(self.nprocs)
+            else:
+                self.pool = mp.Pool(self.nprocs)
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.snapshot is not None:
+            self.snapshot.release()
+            self.snapshot_generation = None
+
+    def terminate(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def publish(self, obj):
+        """
+        Broadcast obj (the model) to the workers for the next calls. The arguments of minimize()/map()
+        which are obj itself are replaced by the worker copy.
+
+        :param obj: picklable object
+        :return: generation of the published object
+        """
+        self.published = obj
+        if self.snapshot is not None:
+            try:
+                (generation, self.payload) = self.snapshot.publish(obj)
+                if generation != self.snapshot_generation:
+                    self.snapshot_generation = generation
+                    self.generation += 1
+                return self.generation
+            except Exception as ex:
+                print('AcquisitionPool - WARNING: could not publish the model in shared memory (', ex,
+                      '). Falling back to pickling.')
+                self.snapshot.release()
+                self.snapshot = None
+        self.generation += 1
+        self.payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        return self.generation
+
+    def _prepare(self, fargs):
+        if self.published is None or not any(a is self.published for a in fargs):
+            return tuple(fargs), (None, None, False)
+        marker = _Published(self.generation)
+        published = (self.generation, self.payload, self.snapshot is not None)
+        return tuple(marker if a is self.published else a for a in fargs), published
+
+    def _chunks(self, items):
+        nchunks = max(1, min(self.nprocs, len(items)))
+        return [list(c) for c in np.array_split(np.arange(len(items)), nchunks)]
+
+    def _run(self, func, tasks):
+        try:
+            self.start()
+            return self.pool.map_async(func, tasks, chunksize=1).get(self.timeout)
+        except Exception as ex:
+            print('AcquisitionPool - WARNING: parallel evaluation failed (', type(ex).__name__, ex,
+                  '). Restarting the pool and evaluating serially.')
+            self.terminate()
+            return [func(task) for task in tasks]
+
+    def minimize(self, f, x0s, fargs, margs, relative_bounds=None, limits=None):
+        """
+        scipy.optimize.minimize from each start point.
+
+        :param relative_bounds: None - margs['bounds'] are used for all start points,
+                                (ndim x 2) array - bounds relative to each start point
+        :param limits: None, (ndim x 2) array - the relative bounds are intersected with this box
+        :return: (n x (ndim+1)) array of the minima and the function values
+        """
+        x0s = np.array(x0s, ndmin=2)
+        if relative_bounds is None:
+            bounds = [None] * len(x0s)
+        else:
+            bounds = [(x + np.transpose(relative_bounds)).T for x in x0s]
+            if limits is not None:
+                bounds = [intersect_bounds(b, limits) for b in bounds]
+        (fargs, published) = self._prepare(fargs)
+        tasks = [(f, x0s[c], [bounds[i] for i in c], fargs, margs, published) for c in self._chunks(x0s)]
+        res = [r for chunk in self._run(_pool_minimize, tasks) for r in chunk]
+        return np.array([np.hstack((x, fun)) for (x, fun) in res])
+
+    def map(self, f, xs, fargs=()):
+        """
+        [f(x, *fargs) for x in xs] on the pool, in the order of xs.
+        """
+        xs = list(xs)
+        (fargs, published) = self._prepare(fargs)
+        tasks = [(f, [xs[i] for i in c], fargs, published) for c in self._chunks(xs)]
+        return [r for chunk in self._run(_pool_map, tasks) for r in chunk]
                     
 # see here https://eli.thegreenplace.net/2012/01/16/python-parallelizing-cpu-bound-tasks-with-multiprocessing/
 # and here https://stackoverflow.com/questions/37060091/multiprocessing-inside-function
@@ -23,200 +353,53 @@ try:
     
     from scipy.optimize import minimize
     
-    def mworker(f,x0,fargs,margs,out_q):
-        # worker invoked in a process puts the results in the output queue out_q
-    #    f,x0,fargs,margs = args
-        #print 'worker: fargs = ',fargs
-        #print 'worker: margs = ',margs
-        res = minimize(f, x0, args = fargs, **margs)
-        #return [res.x, res.fun]
-        out_q.put([[res.x, res.fun[0][0]]])
-
     # parallelize minimizations using different starting positions using multiprocessing, scipy.optimize.minimize
-    def parallelminimize(f,x0s,fargs,margs,v0best=None,relative_bounds=None):
+    def parallelminimize(f,x0s,fargs,margs,v0best=None,relative_bounds=None,pool=None,limits=None):
         # f is fcn to minimize
         # x0s are positions to start search from
         # fargs are arguments to pass to f
         # margs are arguments to pass to scipy.optimize.minimize
-        
-        # arguments to loop over
-        if type(relative_bounds) is not type(None): # static bounds
-            args = [(f,x,fargs,margs) for x in x0s]
-        else: # relative bounds
-            args = []
-            for x in x0s:
-                thesemargs = copy.copy(margs)
-                thesemargs['bounds'] = (x + relative_bounds.T).T # it works. deal with it.
-                args += [(f,x,fargs,thesemargs)]
-        #print '\n[arg[3][\'bounds\'] for arg in args] = \n', [arg[3]['bounds'] for arg in args], '\n'
-        
-        ## add relative bounds
-        #if type(relative_bounds) is not type(None):
-            #for i in range(len(args)):
-                #args[i][3]['bounds'] = args[i][1] + relative_bounds
-            #print '\n[arg[3][\'bounds\'] for arg in args] = \n', [arg[3]['bounds'] for arg in args], '\n'
-            ##print '\nargs = ', args, '\n'
-
-        # https://stackoverflow.com/questions/9786102/how-do-i-parallelize-a-simple-python-loop#9786225
-        # also could try concurrent futures
-    #    import multiprocessing
-    #    pool = multiprocessing.Pool()
-    #    res = np.array(pool.map(minimizeone, args))
-    #    res = np.array(pool.map(l, range(10)))
-        
-        # seems like this maybe be needed 
-        # https://stackoverflow.com/questions/37060091/multiprocessing-inside-function
-                
-        worker = mworker
-        nrun = len(x0s)
-        nprocs = int(mp.cpu_count())# len(x0s)
-        nbatch = int(np.floor(nrun / nprocs))
-        if nrun % nprocs:
-            nbatch += 1
-        res = []
-        
-        # Each process will get a queue to put its result in it
-        queues = [mp.Queue() for p in range(nprocs)]
+        # relative_bounds: None - static bounds margs['bounds'], else bounds relative to each start
+        # limits: None, (ndim x 2) box the relative bounds are intersected with (device limits)
+        # pool is an AcquisitionPool (a temporary one is used if None)
 
-        for b in range(nbatch):
+        own = pool is None
+        if own:
+            pool = AcquisitionPool()
+        try:
+            res = pool.minimize(f, x0s, fargs, margs, relative_bounds=relative_bounds, limits=limits)
+        finally:
+            if own:
+                pool.close()
 
-            # try running a batch until it works
-            while True:
-                try:
-                    procs = []
-                    
-                    ilow = b*nprocs
-                    ihigh = min(nrun,(b+1)*nprocs)
-                        
-                    #print 'launching processes'
-
-                    for i in range(ilow, ihigh):
-                        p = mp.Process(
-                                target=worker,
-                                args=args[i]+tuple([queues[i-ilow]]))
-                        procs.append(p)
-                        p.start()
-                        
-                    #print 'collecting results'
-
-                    for i in range(ilow, ihigh):
-                        res += my_queue_get(queues[i-ilow]) # grab from this queue
-                        
-                    #print 'waiting for termination/cleanup'
-
-                    # waits for worker to finish
-                    for p in procs:
-                        p.join()
-                        p.terminate() # send SIGTERM just in case
-                        del p # remove the multiprocessing.Process
-                        
-                    #print 'done with batch ', b+1, ' of ', nbatch
-                    
-                    break # made it this far so break out of the while loop
-                
-                except:
-                    time.sleep(recovery_sleep_time_seconds) # wait a bit for processes to close before trying again
-            
-        res = np.array(res)
-        #print 'res = ', res
-        res = res[res[:,1]==np.min(res[:,-1])][0]
-        #print 'res = ', res
-        #print 'selected min is ',res[-1]
-        #res = np.array(res[0])
-        #print 'res = ',res
-        
-        # check if there's a better point
-        #print 'v0best = ', v0best
-        if v0best is None:
-            res = np.array(res[0])
-        else:
-            if v0best[-1] < res[-1]:
-                res = np.array(v0best[:-1])
-            else:
-                res = np.array(res[0])
-                
-        #print 'res = ',res
+        res = res[np.argmin(res[:, -1])] # best minimum
 
-        return res
+        # check if there's a better point
+        if v0best is not None and v0best[-1] < res[-1]:
+            return np.array(v0best[:-1])
+        return np.array(res[:-1])
 except:
     print ('parallelstuff - WARNING: Could not load parallelminimize.')
     pass
 
-def mapworker(f,x,fargs,out_q):
-    # worker invoked in a process puts the results in the output queue out_q
-    #print 'f = ',f,'\tx = ',x,'\tfargs = ',fargs,'\tf(x, *fargs) = ',f(x, *fargs)
-    #out_q.put([[x,f(x, *fargs)]])
-    out_q.put([[f(x, *fargs)]])
-
 # yuno stock have python?!
-def parallelmap(f,xs,fargs):
+def parallelmap(f,xs,fargs,pool=None):
     # f is fcn to map to
     # xs is list of coords to eval
     # fargs is a tuple of common arguments to pass to f
-    
-    # arguments to loop over
-    
-    args = [(f,x,fargs) for x in xs]
+    # pool is an AcquisitionPool (a temporary one is used if None)
+    # returns [[f(x, *fargs)] for x in xs]
 
-    # https://stackoverflow.com/questions/9786102/how-do-i-parallelize-a-simple-python-loop#9786225
-    
-    # seems like this maybe be needed 
-    # https://stackoverflow.com/questions/37060091/multiprocessing-inside-function
-        
-    worker = mapworker
-    nrun = len(xs)
-    nprocs = int(mp.cpu_count())# len(x0s)
-    nbatch = int(np.floor(nrun / nprocs))
-    if nrun % nprocs:
-        nbatch += 1
-    res = []
-    
-    # Each process will get a queue to put its result in it
-    queues = [mp.Queue() for p in range(nprocs)]
+    own = pool is None
+    if own:
+        pool = AcquisitionPool()
+    try:
+        res = pool.map(f, xs, fargs)
+    finally:
+        if own:
+            pool.close()
 
-    for b in range(nbatch):
-
-        # try running a batch until it works
-        while True:
-            try:
-                procs = []
-                
-                ilow = b*nprocs
-                ihigh = min(nrun,(b+1)*nprocs)
-                    
-                #print 'launching processes'
-
-                for i in range(ilow, ihigh):
-                    p = mp.Process(
-                            target=worker,
-                            args=args[i]+tuple([queues[i-ilow]]))
-                    procs.append(p)
-                    p.start()
-                    
-                #print 'collecting results'
-
-                for i in range(ilow, ihigh):
-                    res += my_queue_get(queues[i-ilow]) # grab from this queue
-                    
-                #print 'waiting for termination/cleanup'
-
-                # waits for worker to finish
-                for p in procs:
-                    p.join()
-                    p.terminate() # send SIGTERM just in case
-                    del p # remove the multiprocessing.Process
-                    
-                #print 'done with batch ', b+1, ' of ', nbatch
-                    
-                break # made it this far so break out of the while loop
-            
-            except:
-                time.sleep(recovery_sleep_time_seconds) # wait a bit for processes to close before trying again
-        
-    # sort by argument order passed (seems presorted but just in case)
-    #res = res[res[:,0].argsort()] # this doesn't work in genreal; must mix back in xs for slicing
-
-    return res 
+    return [[r] for r in res]
 
 # #try testing parallelmap with this
 def testparallelmap(njobs=10, sleepmax=10.e-3): # sleepmax is maximum random sleep time in seconds
@@ -329,121 +512,139 @@ try:
     from scipy.special import erfinv
     #from hammersley import hammersley
     from GP.chaospy_sequences import create_hammersley_samples
-    def eworker(f, x, fargs, out_q):
-        # worker invoked in a process puts the results in the output queue out_q
-        res = f(x, *fargs)
-        out_q.put(np.hstack((x, res[0][0])))
-
     # eval function over a range of initial points neval and return the nkeep lowest function evals
-    def parallelgridsearch(f,x0,lengths,fargs,neval,nkeep):
+    def parallelgridsearch(f,x0,lengths,fargs,neval,nkeep,pool=None):
         # f is fcn to minimize
         # x0 is center of the search
         # lengths is an array of length scales
         # fargs are arguments to pass to f
         # neval is the number of points to evaluate the function on
         # nkeep is the number of the neval points to keep
+        # pool is an AcquisitionPool (a temporary one is used if None)
         
         if nkeep > neval: nkeep = neval
         
         # generate points to search
         ndim = len(lengths)
-        #nevalpp = neval + 1
-        #x0s = np.array([hammersley(i,ndim,nevalpp) for i in range(1,nevalpp)]) # hammersley uniform in all dims
-        #x0s = np.vstack(parallelmap(hammersley, range(1,nevalpp), (ndim,nevalpp)))
         x0s = create_hammersley_samples(order=neval, dim=ndim).T
         x0s = np.sqrt(2)*erfinv(-1+2*x0s) # normal in all dimensions
         x0s = np.transpose(np.array(lengths,ndmin=2).T * x0s.T) # scale each dimension by it's lenghth scale
         x0s = x0s + x0 # shift to recenter
-        
-        # arguments to loop over
-        # Each process will get a queue to put its result in it
-        args = [(f,x,fargs) for x in x0s]
-
-        # https://stackoverflow.com/questions/9786102/how-do-i-parallelize-a-simple-python-loop#9786225
-        # also could try concurrent futures
-    #    import multiprocessing
-    #    pool = multiprocessing.Pool()
-    #    res = np.array(pool.map(minimizeone, args))
-    #    res = np.array(pool.map(l, range(10)))
-        
-        # seems like this maybe be needed 
-        # https://stackoverflow.com/questions/37060091/multiprocessing-inside-function
-            
-        worker = eworker
-        nrun = neval
-        nprocs = int(mp.cpu_count())
-        nbatch = int(np.floor(nrun / nprocs))
-        if nrun % nprocs:
-            nbatch += 1
-        res = []
-        
-        # Each process will get a queue to put its result in it
-        queues = [mp.Queue() for p in range(nprocs)]
 
-        for b in range(nbatch):
+        own = pool is None
+        if own:
+            pool = AcquisitionPool()
+        try:
+            fs = pool.map(f, x0s, fargs)
+        finally:
+            if own:
+                pool.close()
 
-            # try running a batch until it works
-            while True:
-                try:
-                    procs = []
-                    
-                    ilow = b*nprocs
-                    ihigh = min(nrun,(b+1)*nprocs)
-                        
-                    #print 'launching processes'
-                    for i in range(ilow, ihigh):
-                        p = mp.Process(
-                                target=worker,
-                                args=args[i]+tuple([queues[i-ilow]]))
-                        procs.append(p)
-                        p.start()
-
-                    #print 'collecting results'
-                        
-                    if len(res):
-                        for i in range(ilow, ihigh):
-                            res = np.vstack((res,my_queue_get(queues[i-ilow])))
-                    else:
-                        res = np.array(my_queue_get(queues[0]))
-                        for i in range(ilow+1, ihigh):
-                            res = np.vstack((res,my_queue_get(queues[i-ilow])))
-                        
-                    #print 'waiting for termination/cleanup'
-
-                    # waits for worker to finish
-                    for p in procs:
-                        p.join() # wait until close
-                        p.terminate() # send SIGTERM just in case
-                        del p # remove the multiprocessing.Process
-                        
-                    #print 'done with batch ', b+1, ' of ', nbatch
-                    
-                    break # made it this far so break out of the while loop
-                
-                except:
-                    time.sleep(recovery_sleep_time_seconds) # wait a bit for processes to close before trying again
-
-        ## return nkeep smallest values
-        #res = np.array(res)
-        ##print 'res = ',res
-        #resy = np.sort(res[:,-1])
-        #res = res[res[:,-1]<=resy[nkeep-1]] # list of nkeep coords and function evals there
-        
         # return nkeep smallest values
         # sort then cut
-        res = np.array(res)
+        res = np.hstack((x0s, np.array([np.ravel(v)[0] for v in fs], ndmin=2).T))
         res = res[res[:,-1].argsort()] # sort by last column
         res = res[res[:,-1]<=res[nkeep-1,-1]] # list of nkeep coords and function evals there
-        
-        #print 'res smallest = ', res
 
-        #print 'resy = ',resy
-        #print len(res),' sets of coords for smallest function evals: ', res
+        return res # return coords and fcn evals
+
+    # vectorized version of parallelgridsearch for batch functions f(xs, *fargs) -> (n,) array
+    def gridsearch(f,x0s,lengths,fargs,neval,nkeep,limits=None):
+        # f is batch fcn to minimize, evaluated on all points at once (e.g. negExpImproveBatch)
+        # x0s are centers of the search (one row per center), neval points are generated around each center
+        # lengths is an array of length scales
+        # fargs are arguments to pass to f
+        # nkeep is the number of points to keep (over all centers)
+        # limits: None, (ndim x 2) box of feasible points, infeasible grid points are projected onto it
+
+        x0s = np.array(x0s, ndmin=2)
+        ndim = len(lengths)
+        grid = create_hammersley_samples(order=neval, dim=ndim).T
+        grid = np.sqrt(2)*erfinv(-1+2*grid) # normal in all dimensions
+        grid = grid * np.array(lengths, ndmin=2) # scale each dimension by it's lenghth scale
+        xs = (x0s[:, np.newaxis, :] + grid[np.newaxis, :, :]).reshape(-1, ndim) # shift to each center
+        if limits is not None:
+            limits = np.array(limits, dtype=float)
+            xs = np.clip(xs, limits[:, 0], limits[:, 1])
+            xs = np.unique(xs, axis=0) # projected points may coincide
+
+        fs = np.reshape(f(xs, *fargs), -1)
+
+        # return nkeep smallest values
+        # sort then cut
+        nkeep = max(1, min(nkeep, len(fs)))
+        res = np.hstack((xs, fs[:, np.newaxis]))
+        res = res[res[:,-1].argsort()] # sort by last column
+        res = res[res[:,-1]<=res[nkeep-1,-1]] # list of nkeep coords and function evals there
 
         return res # return coords and fcn evals
-        #return res[:,:-1] # return just coords
-        #return res[:,:-1], res[:,-1] # return just coords
-    
+
 except:
     print ('parallelstuff - WARNING: Could not load parallelgridsearch.')
     pass
+
+# vectorized multi-start minimization in the calling process: all start points advance together
+def batchminimize(f,x0s,bounds,fargs=(),jac=True,maxiter=200,step=0.1,tol=1.e-4,npop=8,seed=None):
+    # f is batch fcn to minimize: f(xs, *fargs) -> (n,) values, or ((n,) values, (n x ndim) gradients) if jac
+    # x0s are the start points (n x ndim)
+    # bounds are the box constraints, (ndim x 2) common to all start points or (n x ndim x 2) per start point
+    # jac: True - projected gradient descent, False - (1+npop) evolution strategy (gradient free)
+    # step is the initial step relative to the width of the box, it grows on success and shrinks on failure
+    # tol: a start point has converged once its step falls below tol (relative to the box width)
+    # each iteration makes one batched call of f for the whole population
+    # returns (n x (ndim+1)) array of the minima and the function values, sorted by function value
+
+    x = np.array(x0s, dtype=float, ndmin=2)
+    (n, ndim) = x.shape
+    bounds = np.array(bounds, dtype=float)
+    if bounds.ndim == 2:
+        bounds = np.broadcast_to(bounds, (n, ndim, 2))
+    lo = bounds[:, :, 0]
+    hi = bounds[:, :, 1]
+    width = np.where(hi > lo, hi - lo, 1.)
+    x = np.clip(x, lo, hi)
+    rng = np.random.RandomState(seed)
+
+    def evaluate(xs):
+        if jac:
+            (fs, gs) = f(xs, *fargs)
+            return np.reshape(fs, -1), np.reshape(gs, (len(xs), ndim))
+        return np.reshape(f(xs, *fargs), -1), None
+
+    (fx, gx) = evaluate(x)
+    s = np.full(n, float(step))
+    active = np.ones(n, dtype=bool)
+
+    for i in range(maxiter):
+        ia = np.flatnonzero(active)
+        if ia.size == 0:
+            break
+        if jac:
+            # steepest descent in box units, normalized to the largest component
+            d = -gx[ia] * width[ia]
+            dmax = np.max(np.abs(d), axis=1, keepdims=True)
+            d = d / np.where(dmax > 0, dmax, 1.)
+            xt = np.clip(x[ia] + s[ia, np.newaxis] * d * width[ia], lo[ia], hi[ia])
+            (ft, gt) = evaluate(xt)
+        else:
+            # npop gaussian offspring per start point, the best one competes with its parent
+            z = rng.randn(ia.size, npop, ndim) * (s[ia, np.newaxis, np.newaxis] * width[ia, np.newaxis, :])
+            xt = np.clip(x[ia, np.newaxis, :] + z, lo[ia, np.newaxis, :], hi[ia, np.newaxis, :])
+            (ft, gt) = evaluate(xt.reshape(-1, ndim))
+            ft = ft.reshape(ia.size, npop)
+            ibest = np.argmin(ft, axis=1)
+            xt = xt[np.arange(ia.size), ibest]
+            ft = ft[np.arange(ia.size), ibest]
+
+        better = ft < fx[ia]
+        ib = ia[better]
+        x[ib] = xt[better]
+        fx[ib] = ft[better]
+        if jac:
+            gx[ib] = gt[better]
+        s[ib] = np.minimum(1.5 * s[ib], 1.)
+        s[ia[~better]] *= 0.5
+        active[ia] = s[ia] >= tol
+
+    res = np.hstack((x, fx[:, np.newaxis]))
+    return res[res[:, -1].argsort()]
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Trust-region Bayesian optimization (TuRBO, D. Eriksson et al., https://arxiv.org/abs/1910.01739).
+
+The search runs in the unit cube of the device bounds. Each trust region is a box around its incumbent
+(best point seen in the region) with side length 'length'. The box doubles after success_tol consecutive
+improving batches, halves after failure_tol consecutive failures and is restarted around the global best
+point when it collapses below length_min. The candidates of a region are scored by the expected improvement
+of a local OGP trained on at most nlocal points of that region, so the cost of a step is bounded by the
+local data size and ncand, not by the length of the scan or the dimension of the full search space.
+
+The objective function is minimized (as in the mint minimizers).
+"""
+from __future__ import absolute_import, print_function
+import numpy as np
+from GP.OnlineGP import OGP
+from GP.bayes_optimization import negExpImproveBatch
+from GP.chaospy_sequences import create_hammersley_samples
+
+
+class TrustRegion(object):
+    """
+    One trust region: its observations (unit cube), side length and the success/failure counters.
+
+    :param ndim: dimension
+    :param length: initial side length
+    """
+    def __init__(self, ndim, length):
+        self.length = length
+        self.X = np.zeros((0, ndim))
+        self.Y = np.zeros(0)
+        self.nsuccess = 0
+        self.nfailure = 0
+        self.init = np.zeros((0, ndim)) # initial design points which are still to be measured
+
+    @property
+    def center(self):
+        return self.X[np.argmin(self.Y)]
+
+    def box(self):
+        """
+        :return: (lo, hi) corners of the region clipped to the unit cube
+        """
+        center = self.center
+        return np.clip(center - 0.5 * self.length, 0., 1.), np.clip(center + 0.5 * self.length, 0., 1.)
+
+    def add(self, X, Y):
+        self.X = np.vstack((self.X, X))
+        self.Y = np.append(self.Y, Y)
+
+
+class TuRBO(object):
+    """
+    Trust-region Bayesian optimization with one or more local OGP models.
+
+    :param ntr: 1, number of trust regions
+    """
+    def __init__(self, ntr=1):
+        self.ntr = ntr
+        self.bounds = None # [[min, max], [], []] # n = len(x)
+        self.max_iter = 100
+        self.nask = 1 # number of points per batch
+        self.ninit = None # initial design points per region (including its center), min(ndim + 1, 10) if None
+        self.length_init = 0.8
+        self.length_min = 0.5 ** 7
+        self.length_max = 1.6
+        self.success_tol = 3
+        self.failure_tol = None # ceil(max(4, ndim) / nask) if None
+        self.improvement = 1.e-3 # relative improvement of the region best which counts as a success
+        self.length_scale = 0.2 # kernel length scale in units of the device ranges
+        self.noise = 1.e-2 # noise variance of the normalized objective
+        self.nlocal = 100 # max number of points the local model is trained on
+        self.maxBV = 50
+        self.ncand = None # candidates per region and batch, min(100 * ndim, 5000) if None
+        self.xi = 0.
+        self.seed = None
+        self.regions = []
+        self.X_obs = None
+        self.Y_obs = None
+
+    def to_unit(self, x):
+        return (np.array(x, dtype=float) - self.lo) / self.width
+
+    def from_unit(self, u):
+        return self.lo + np.array(u, dtype=float) * self.width
+
+    def set_bounds(self, x):
+        vrange = np.array(self.bounds, dtype=float).reshape(len(x), 2)
+        for i, xi in enumerate(x):
+            if not np.all(np.isfinite(vrange[i])) or vrange[i, 0] == vrange[i, 1]:
+                delta = np.abs(xi) * 0.1
+                delta = 0.1 if delta == 0 else delta
+                vrange[i] = [xi - delta, xi + delta]
+        self.lo = vrange[:, 0]
+        self.width = vrange[:, 1] - vrange[:, 0]
+
+    def new_region(self, center, y_center=None):
+        """
+        Trust region around the center with an initial design of ninit - 1 Hammersley points in its box.
+
+        :param center: center in the unit cube
+        :param y_center: value at the center, the center is measured as a part of the design if None
+        :return: TrustRegion
+        """
+        ndim = len(center)
+        region = TrustRegion(ndim, self.length_init)
+        ninit = self.ninit or min(ndim + 1, 10)
+        lo = np.clip(center - 0.5 * region.length, 0., 1.)
+        hi = np.clip(center + 0.5 * region.length, 0., 1.)
+        design = np.zeros((0, ndim))
+        if ninit > 1:
+            design = lo + (hi - lo) * create_hammersley_samples(order=ninit - 1, dim=ndim).T
+        if y_center is None:
+            design = np.vstack((center, design))
+        else:
+            region.add(center, y_center)
+        region.init = design
+        return region
+
+    def local_model(self, region, mu, sd):
+        """
+        OGP on the nlocal points of the region nearest to its center, trained on the normalized
+        negated objective (the GP maximizes).
+        """
+        X, Y = region.X, region.Y
+        if len(X) > self.nlocal:
+            ind = np.argsort(np.sum((X - region.center) ** 2, axis=1))[:self.nlocal]
+            X, Y = X[ind], Y[ind]
+        ndim = X.shape[1]
+        hyps = (np.log(np.ones((1, ndim)) / self.length_scale ** 2), 0., np.log(self.noise))
+        model = OGP(ndim, hyps, maxBV=self.maxBV)
+        model.fit(X, -(Y - mu) / sd)
+        return model
+
+    def candidates(self, region, ncand):
+        # TuRBO perturbation sampling: uniform in the box, only ~20 coordinates perturbed per candidate
+        lo, hi = region.box()
+        ndim = len(lo)
+        u = lo + (hi - lo) * self.rng.rand(ncand, ndim)
+        mask = self.rng.rand(ncand, ndim) <= min(20. / ndim, 1.)
+        none = np.flatnonzero(~np.any(mask, axis=1))
+        mask[none, self.rng.randint(ndim, size=none.size)] = True
+        return np.where(mask, u, region.center)
+
+    def propose(self, n):
+        """
+        The n candidates with the best expected improvement over all regions.
+
+        :return: (points in the unit cube, their region indices)
+        """
+        ndim = self.X_obs.shape[1]
+        ncand = self.ncand or min(100 * ndim, 5000)
+        mu = np.mean(self.Y_obs)
+        sd = np.std(self.Y_obs)
+        sd = sd if sd > 0 else 1.
+        y_best = -(np.min(self.Y_obs) - mu) / sd
+        cands, scores, owners = [], [], []
+        for (i, region) in enumerate(self.regions):
+            model = self.local_model(region, mu, sd)
+            c = self.candidates(region, ncand)
+            cands.append(c)
+            scores.append(negExpImproveBatch(c, model, y_best, self.xi))
+            owners.append(np.full(len(c), i))
+        cands, scores, owners = np.vstack(cands), np.concatenate(scores), np.concatenate(owners)
+        order = np.argsort(scores, kind='mergesort')[:n]
+        return cands[order], owners[order]
+
+    def update_region(self, region, Y):
+        """
+        Success/failure counting and resizing after the region got the values Y of a batch.
+        """
+        best = np.min(region.Y)
+        if np.min(Y) < best - self.improvement * np.abs(best):
+            region.nsuccess += 1
+            region.nfailure = 0
+        else:
+            region.nsuccess = 0
+            region.nfailure += 1
+        if region.nsuccess >= self.success_tol:
+            region.length = min(2. * region.length, self.length_max)
+            region.nsuccess = 0
+        elif region.nfailure >= self._failure_tol:
+            region.length /= 2.
+            region.nfailure = 0
+
+    def search(self, x):
+        """
+        Generator of the ask/tell protocol: yields the points to measure (m x ndim array) and receives the
+        measured values. The batch size follows self.nask.
+
+        :param x: initial point
+        :return: generator
+        """
+        x = np.array(x, dtype=float).flatten()
+        ndim = len(x)
+        self.set_bounds(x)
+        self.rng = np.random.RandomState(self.seed)
+        self._failure_tol = self.failure_tol
+        if self._failure_tol is None:
+            self._failure_tol = int(np.ceil(max(4., ndim) / max(1, self.nask)))
+
+        u0 = np.clip(self.to_unit(x), 0., 1.)
+        self.regions = [self.new_region(u0)]
+        for k in range(1, self.ntr):
+            # more regions start inside the first one
+            offset = (create_hammersley_samples(order=self.ntr, dim=ndim).T[k] - 0.5) * self.length_init
+            self.regions.append(self.new_region(np.clip(u0 + offset, 0., 1.)))
+        self.X_obs = np.zeros((0, ndim))
+        self.Y_obs = np.zeros(0)
+
+        neval = 0
+        while neval < self.max_iter:
+            n = max(1, min(self.nask, self.max_iter - neval))
+            # initial designs first
+            points, owners = [], []
+            for (i, region) in enumerate(self.regions):
+                k = min(n - len(points), len(region.init))
+                points += list(region.init[:k])
+                owners += [i] * k
+                region.init = region.init[k:]
+            design = len(points) > 0
+            if design:
+                points, owners = np.array(points), np.array(owners)
+            else:
+                points, owners = self.propose(n)
+
+            values = yield self.from_unit(points)
+            values = np.ravel(values)
+            neval += len(points)
+
+            self.X_obs = np.vstack((self.X_obs, points))
+            self.Y_obs = np.append(self.Y_obs, values)
+            for i in np.unique(owners):
+                region = self.regions[i]
+                mine = owners == i
+                if not design and len(region.Y) > 0:
+                    self.update_region(region, values[mine])
+                region.add(points[mine], values[mine])
+
+                if region.length < self.length_min:
+                    # restart around the global best point (a jump across the whole device range is not safe)
+                    ibest = np.argmin(self.Y_obs)
+                    print('TuRBO: trust region ', i, ' collapsed, restarting around the best point')
+                    self.regions[i] = self.new_region(self.X_obs[ibest], self.Y_obs[ibest])
+
+    def best(self):
+        """
+        :return: (x, y) the best point seen and its value
+        """
+        i = int(np.argmin(self.Y_obs))
+        return self.from_unit(self.X_obs[i]), self.Y_obs[i]
@@ -253,12 +253,12 @@ class RCDS:
             Np = 6
         delta = (ahi-alo)/(Np-1.0)
 
-        alist = np.arange(alo,ahi,(ahi-alo)/(Np-1))
+        alist = np.linspace(alo,ahi,Np)
         flist = alist*float('nan')
         Nlist = np.shape(xflist)[0]
         for ii in range(Nlist):
-            if xflist[ii,1]>=alo and xflist[ii,1]<=ahi:
-                ik = math.floor((xflist[ii,1]-alo)/delta)
+            if xflist[ii,0]>=alo and xflist[ii,0]<=ahi:
+                ik = int(round((xflist[ii,0]-alo)/delta))
                 #print('test', ik, ii, len(alist),len(xflist),xflist[ii,0])
                 alist[ik]=xflist[ii,0]
                 flist[ik]=xflist[ii,1]
@@ -101,6 +101,8 @@ class OcelotInterfaceWindow(QFrame):
         self.name_simplex_norm = "Simplex Norm."
         self.name_es = "Extremum Seeking"
         self.name_powell = "Powell"
+        self.name_rcds = "RCDS"
+        self.name_turbo = "Trust Region BO"
         # self.name4 = "Conjugate Gradient"
         # self.name5 = "Powell's Method"
         # switch of GP and custom Mininimizer
@@ -110,6 +112,8 @@ class OcelotInterfaceWindow(QFrame):
         self.ui.cb_select_alg.addItem(self.name_simplex_norm)
         self.ui.cb_select_alg.addItem(self.name_es)
         self.ui.cb_select_alg.addItem(self.name_powell)
+        self.ui.cb_select_alg.addItem(self.name_rcds)
+        self.ui.cb_select_alg.addItem(self.name_turbo)
         # if sklearn_version >= "0.18":
         #     self.ui.cb_select_alg.addItem(self.name_gauss_sklearn)
 
@@ -367,6 +371,10 @@ class OcelotInterfaceWindow(QFrame):
             minimizer = mint.ESMin()
         elif current_method == self.name_powell:
             minimizer = mint.Powell()
+        elif current_method == self.name_rcds:
+            minimizer = mint.RCDSMin()
+        elif current_method == self.name_turbo:
+            minimizer = mint.TrustRegionGP()
         #simplex Method
         else:
             minimizer = mint.Simplex()
@@ -469,7 +477,7 @@ class OcelotInterfaceWindow(QFrame):
             else:
                 minimizer.dev_steps = None
                 
-        elif minimizer.__class__ in [mint.ESMin]:
+        elif minimizer.__class__ in [mint.ESMin, mint.RCDSMin]:
 
 
             bounds = []
@@ -514,6 +522,8 @@ class OcelotInterfaceWindow(QFrame):
         self.opt_control.clean()
         self.opt.opt_ctrl = self.opt_control
         self.opt.timeout = self.total_delay
+        # per-device settle times learned from the readbacks replace the trim delay when available
+        self.opt.settle_models = mint.SettleModels(os.path.join(self.mi.config_dir, "settle_models.json")).load()
 
         self.opt.minimizer = minimizer
 
@@ -545,6 +555,8 @@ class OcelotInterfaceWindow(QFrame):
             self.opt.minimizer.saveModel()  # need to save GP model first
         except:
             pass
+        if self.opt.settle_models is not None:
+            self.opt.settle_models.save()
 
         if self.mi is not None:
             method_name = self.method_name
@@ -806,6 +818,16 @@ class OcelotInterfaceWindow(QFrame):
             y = np.array(dev.values)
             table_data.append((dev.eid, y[index]))
 
+        # predicted and observed settle times of the step which led to this point
+        for dev in self.devices:
+            if 0 < index <= len(dev.settle_predicted) and index <= len(dev.settle_times):
+                predicted = dev.settle_predicted[index - 1]
+                if predicted is not None:
+                    predicted = round(predicted, 3)
+                table_data.append((dev.eid + " settle pred/obs [s]",
+                                   "{} / {}".format(predicted, round(dev.settle_times[index - 1], 3))))
+        table.setRowCount(len(table_data))
+
         for row, data in enumerate(table_data):
             label, value = data
             table.setItem(row, 0, QtGui.QTableWidgetItem(str(label)))
@@ -0,0 +1,193 @@
+"""
+Ask/tell protocol of the minimizers.
+
+A minimizer which supports the protocol implements search(x): a generator which yields a batch of points
+(m x ndim array) to be evaluated and receives the array of the m objective function values:
+
+    values = yield points
+
+AskTellDriver runs the generator step by step: ask(n) hands out up to n points of the current batch,
+tell(x, y) collects the values, the generator is resumed when the whole batch is told. So the evaluation order
+stays under the control of the caller (Optimizer), which can batch, parallelize or pipeline the evaluations.
+
+Minimizers which own their control loop (scipy based ones, RCDS) are bridged by minimize_steps(): minimize()
+runs in a worker thread and every call of its error_func becomes one ask/tell step. Closing the generator (driver
+close(), Minimizer.reset()/close() or the garbage collection of a dropped driver) stops the worker: error_func
+raises StopAsk from then on.
+"""
+from __future__ import absolute_import, print_function
+from threading import Thread
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import numpy as np
+
+
+class StopAsk(Exception):
+    """
+    Raised inside the bridged minimize() when the ask/tell run is abandoned.
+    """
+    pass
+
+
+_STOP = object()
+# seconds to wait for the bridged minimize() to return after StopAsk
+STOP_TIMEOUT = 1.
+
+
+def minimize_steps(minimize, x):
+    """
+    Generator bridge for minimize(error_func, x) which owns the control loop.
+
+    :param minimize: minimize(error_func, x) method of the minimizer
+    :param x: initial point
+    :return: generator of the ask/tell protocol (one point per batch)
+    """
+    asks = queue.Queue()
+    tells = queue.Queue()
+    stopped = []
+
+    def error_func(x_new):
+        # a minimize() which catches the StopAsk and goes on does not block again
+        if stopped:
+            raise StopAsk()
+        asks.put(("ask", np.array(x_new, dtype=float).flatten()))
+        y = tells.get()
+        if y is _STOP:
+            stopped.append(True)
+            raise StopAsk()
+        return y
+
+    def run():
+        try:
+            res = minimize(error_func, x)
+        except StopAsk:
+            res = None
+        except Exception as ex:
+            asks.put(("error", ex))
+            return
+        asks.put(("done", res))
+
+    thread = Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            kind, value = asks.get()
+            if kind == "done":
+                break
+            if kind == "error":
+                raise value
+            values = yield np.array(value, ndmin=2)
+            tells.put(float(np.ravel(values)[0]))
+    finally:
+        if thread.is_alive():
+            tells.put(_STOP)
+            thread.join(STOP_TIMEOUT)
+
+
+class AskTellDriver(object):
+    """
+    Runs a generator of the ask/tell protocol.
+
+    :param generator: generator which yields batches of points and receives their values
+    :param ndim: dimension of the points
+    """
+    def __init__(self, generator, ndim):
+        self.generator = generator
+        self.ndim = ndim
+        self.batch = None
+        self.nasked = 0
+        self.values = []
+        self.started = False
+        self.finished = False
+
+    def _advance(self):
+        try:
+            if not self.started:
+                self.started = True
+                batch = next(self.generator)
+            else:
+                batch = self.generator.send(np.array(self.values))
+        except StopIteration:
+            self.finished = True
+            self.batch = None
+            return
+        self.batch = np.array(batch, dtype=float, ndmin=2)
+        self.nasked = 0
+        self.values = []
+
+    def ask(self, n=1):
+        """
+        Next points to evaluate.
+
+        :param n: maximum number of points
+        :return: (m x ndim) array, m <= n. m = 0 if the search is finished or all points of the current batch
+                 are asked but not told yet.
+        """
+        if not self.finished and (self.batch is None or len(self.values) == len(self.batch)):
+            self._advance()
+        if self.finished:
+            return np.zeros((0, self.ndim))
+        points = self.batch[self.nasked:self.nasked + n]
+        self.nasked += len(points)
+        return points.copy()
+
+    def tell(self, x, y):
+        """
+        Objective function values of the asked points. The values are expected in the ask order.
+
+        :param x: (m x ndim) array of the points
+        :param y: m values
+        :return: None
+        """
+        x = np.array(x, dtype=float, ndmin=2)
+        y = np.ravel(y)
+        start = len(self.values)
+        if self.batch is None or start + len(y) > self.nasked:
+            raise ValueError("AskTellDriver: tell() of points which were not asked")
+        if not np.allclose(x, self.batch[start:start + len(y)]):
+            raise ValueError("AskTellDriver: tell() must follow the ask() order")
+        self.values.extend(float(v) for v in y)
+
+    def close(self):
+        if self.generator is not None:
+            self.generator.close()
+            self.generator = None
+        self.finished = True
+
+    def __del__(self):
+        # a dropped driver must not leave the minimize_steps() worker waiting for a tell()
+        self.close()
+
+
+def run_ask_tell(minimizer, error_func, x, batch_size=1, opt_ctrl=None):
+    """
+    Run the minimizer through the ask/tell protocol against error_func (e.g. Optimizer.error_func).
+
+    :param minimizer: Minimizer
+    :param error_func: objective function
+    :param x: initial point
+    :param batch_size: 1, number of points asked at once
+    :param opt_ctrl: OptControl, the run is stopped if opt_ctrl.kill
+    :return: the best point
+    """
+    minimizer.reset(x)
+    x_best = np.array(x, dtype=float)
+    y_best = np.inf
+    try:
+        while True:
+            points = minimizer.ask(batch_size)
+            if len(points) == 0:
+                break
+            values = [error_func(point) for point in points]
+            if opt_ctrl is not None and opt_ctrl.kill:
+                break
+            minimizer.tell(points, values)
+            i = int(np.argmin(values))
+            if values[i] < y_best:
+                x_best, y_best = points[i], values[i]
+    finally:
+        minimizer.close()
+    return x_best
@@ -54,6 +54,7 @@ class BESSYMachineInterface(MachineInterface):
 
         self.data = dict()
         self.pvs = dict()
+        self.losspvs = []
 
 
     #@staticmethod
@@ -106,6 +107,50 @@ class BESSYMachineInterface(MachineInterface):
             else:
                 return pv.put(val)
 
+    def get_values(self, device_names):
+        """
+        Getter function for a list of PVs. All PVs are read in one Channel Access round trip.
+
+        :param device_names: (list) PV names used in caget
+        :return: (list) Data from the PVs, None for the PVs which did not connect
+        """
+        if len(device_names) == 0:
+            return []
+        return epics.caget_many(list(device_names))
+
+    def set_values(self, device_names, vals):
+        """
+        Setter function for a list of PVs. All puts are issued before waiting on any of them.
+
+        :param device_names: (list) PV names used in caput
+        :param vals: (list) Values to write to the devices
+        """
+        if len(device_names) == 0:
+            return
+        epics.caput_many(list(device_names), list(vals))
+
+    def add_monitor(self, device_name, callback):
+        """
+        Subscribe to the value updates of a PV with a Channel Access monitor.
+
+        :param device_name: (str) PV name
+        :param callback: function(value) called on every update
+        :return: (int) callback index for remove_monitor()
+        """
+        pv = self.pvs.get(device_name, None)
+        if pv is None:
+            pv = epics.PV(device_name)
+            self.pvs[device_name] = pv
+
+        def on_change(pvname=None, value=None, **kws):
+            callback(value)
+        return pv.add_callback(on_change)
+
+    def remove_monitor(self, device_name, handle):
+        pv = self.pvs.get(device_name, None)
+        if pv is not None:
+            pv.remove_callback(handle)
+
     def get_energy(self):
         """
         Returns the energy.
@@ -134,7 +179,7 @@ class BESSYMachineInterface(MachineInterface):
         return charge, current
 
     def get_losses(self):
-        losses = [self.get_value(pv) for pv in self.losspvs]
+        losses = self.get_values(self.losspvs)
         return losses
 
     def logbook(self, gui):
@@ -2,6 +2,7 @@ import time
 import numpy as np
 
 from mint.opt_objects import Target
+from mint.history import History
 import stats.stats as stats
 
 
@@ -19,11 +20,11 @@ class BESSYTarget(Target):
         self.objective_mean = None
         self.objective_stdev = None
 
-        self.objective_acquisitions = []  # all the points
-        self.objective_means = []
-        self.std_dev = []
-        self.charge = []
-        self.current = []
+        self.objective_acquisitions = self.new_acquisition_store()  # all the points
+        self.objective_means = History()
+        self.std_dev = History()
+        self.charge = History()
+        self.current = History()
         self.losses = []
         self.points = None
 
@@ -86,9 +87,9 @@ class BESSYTarget(Target):
 
     def clean(self):
         Target.clean(self)
-        self.objective_acquisitions = []  # all the points
-        self.objective_means = []
-        self.std_dev = []
-        self.charge = []
-        self.current = []
+        self.objective_acquisitions = self.new_acquisition_store()  # all the points
+        self.objective_means = History()
+        self.std_dev = History()
+        self.charge = History()
+        self.current = History()
         self.losses = []
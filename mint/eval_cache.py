@@ -0,0 +1,165 @@
+"""
+Memoization of the objective function evaluations.
+
+The key is the device settings vector quantized to the device tolerances (Device.tol), so points requested again
+by the minimizer (or points within the tolerance of a measured point) are not measured again on the machine.
+"""
+from __future__ import absolute_import, print_function
+import time
+from collections import OrderedDict, deque
+import numpy as np
+
+
+class CacheEntry(object):
+    """
+    Measurements of one point: the penalties of the last 'window' measurements and their times.
+
+    :param window: number of the last measurements in the cached mean
+    """
+    def __init__(self, window):
+        self.pens = deque(maxlen=window)
+        self.times = deque(maxlen=window)
+        self.cost = 0.
+        self.nreuse = 0
+        self.step = None
+
+    def prune(self, ttl):
+        """
+        Drop the measurements older than ttl (taken before the machine drifted).
+        """
+        now = time.time()
+        while ttl is not None and len(self.times) > 0 and now - self.times[0] > ttl:
+            self.pens.popleft()
+            self.times.popleft()
+
+    def add(self, pen, cost, step):
+        self.pens.append(pen)
+        self.times.append(time.time())
+        self.cost = cost
+        self.step = step
+        self.nreuse = 0
+
+    @property
+    def nmeas(self):
+        return len(self.pens)
+
+    @property
+    def time(self):
+        return self.times[-1]
+
+    @property
+    def pen(self):
+        return sum(self.pens)/len(self.pens)
+
+
+class EvalCache(object):
+    """
+    LRU cache of the penalties with expiration
+
+    :param maxsize: 1000, maximum number of entries (the least recently used entry is evicted)
+    :param ttl: 300 (seconds), measurements older than ttl are stale (machine drift) and leave the cached mean,
+                a point without a fresh measurement is measured again
+    :param max_reuse: 3, after max_reuse hits the point is measured again and the new penalty is averaged
+                      with the fresh cached ones. None - always return the cached mean
+    :param window: 5, the cached mean is taken over the last window measurements which are not older than ttl
+    """
+    def __init__(self, maxsize=1000, ttl=300., max_reuse=3, window=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_reuse = max_reuse
+        self.window = window
+        self.entries = OrderedDict()
+        self.hits = 0 # served from the cache
+        self.misses = 0 # never measured (or evicted)
+        self.expired = 0 # all measurements older than ttl, measured again
+        self.remeasured = 0 # max_reuse reached, measured again
+        self.saved_time = 0.
+
+    @staticmethod
+    def make_key(x, tols):
+        """
+        Quantize the device settings to the device tolerances.
+
+        :param x: device settings
+        :param tols: device tolerances (0 - exact value)
+        :return: tuple, the key of the cache
+        """
+        key = []
+        for val, tol in zip(np.ravel(x), tols):
+            if tol > 0:
+                key.append(int(np.round(val/tol)))
+            else:
+                key.append(float(val))
+        return tuple(key)
+
+    def lookup(self, key):
+        """
+        Return the cached penalty of the point or None if the point has to be measured.
+
+        :param key: key from make_key()
+        :return: penalty or None
+        """
+        entry = self.entries.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        entry.prune(self.ttl)
+        if entry.nmeas == 0:
+            del self.entries[key]
+            self.expired += 1
+            return None
+        if self.max_reuse is not None and entry.nreuse >= self.max_reuse:
+            # measure again, store() averages the new penalty with the cached ones
+            self.remeasured += 1
+            return None
+        self.entries[key] = self.entries.pop(key)
+        entry.nreuse += 1
+        self.hits += 1
+        self.saved_time += entry.cost
+        return entry.pen
+
+    def store(self, key, pen, cost, step=None):
+        """
+        Store the measured penalty.
+
+        :param key: key from make_key()
+        :param pen: penalty
+        :param cost: time of the measurement in seconds (set, settle and acquisition)
+        :param step: index of the measurement in the step histories of the Target and Devices
+        :return: None
+        """
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            entry = CacheEntry(self.window)
+        else:
+            entry.prune(self.ttl)
+        entry.add(pen, cost, step)
+        self.entries[key] = entry
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def measured_step(self, key):
+        """
+        :param key: key from make_key()
+        :return: index of the last measurement of the point in the step histories, None if unknown
+        """
+        entry = self.entries.get(key, None)
+        if entry is None:
+            return None
+        return entry.step
+
+    def clean(self):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.remeasured = 0
+        self.saved_time = 0.
+
+    def report(self):
+        """
+        :return: (str) cache statistics
+        """
+        return "EvalCache: hits = " + str(self.hits) + ", misses = " + str(self.misses) + \
+               ", expired = " + str(self.expired) + ", re-measured = " + str(self.remeasured) + \
+               ", saved time = " + str(round(self.saved_time, 2)) + " s"
@@ -0,0 +1,261 @@
+"""
+Array-backed history buffers of the optimization run.
+
+GrowableArray is an append-only float64 array with amortized doubling of the capacity. Optionally it lives in a
+memory-mapped file, which keeps long scans out of RAM.
+RunLog stores the device settings, penalties and timestamps of every step and tracks the best step incrementally.
+History is the scalar telemetry buffer of Devices and Targets (values, times, penalties, ...).
+AcquisitionStore keeps the waveform acquisitions of a Target and spills the older ones to disk.
+"""
+from __future__ import absolute_import, print_function
+import os
+import time
+import numpy as np
+
+
+class GrowableArray(object):
+    """
+    Append-only float64 array. Rows are appended along the first axis.
+
+    :param ncols: None - 1D array of scalars, int - 2D array with ncols columns. If ncols is None and the first
+                  appended item is a vector, its length is used.
+    :param capacity: 64, initial number of rows
+    :param filename: None, if a filename is given the buffer is a numpy.memmap backed by this file
+    """
+    def __init__(self, ncols=None, capacity=64, filename=None):
+        self.ncols = ncols
+        self.capacity = max(int(capacity), 1)
+        self.filename = filename
+        self.size = 0
+        self.buffer = None
+
+    def _shape(self, nrows):
+        if self.ncols is None:
+            return (nrows,)
+        return (nrows, self.ncols)
+
+    def _allocate(self, nrows):
+        if self.filename is None:
+            buffer = np.empty(self._shape(nrows), dtype=np.float64)
+            if self.buffer is not None:
+                buffer[:self.size] = self.buffer[:self.size]
+            return buffer
+        # grow the file, the data already written stays in place (row major). The map is closed around the resize
+        # (a mapped file cannot be truncated on Windows)
+        grow = self.buffer is not None and os.path.exists(self.filename)
+        self._close_map()
+        nbytes = int(np.prod(self._shape(nrows))) * 8
+        with open(self.filename, 'r+b' if grow else 'w+b') as f:
+            f.truncate(nbytes)
+        return np.memmap(self.filename, dtype=np.float64, mode='r+', shape=self._shape(nrows))
+
+    def _close_map(self):
+        if self.buffer is None:
+            return
+        self.buffer.flush()
+        mm = getattr(self.buffer, '_mmap', None)
+        self.buffer = None
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                pass # views of the old map (data) are still alive, the map is closed when they are released
+
+    def append(self, item):
+        """
+        Append a scalar (1D array) or a row (2D array).
+
+        :param item: scalar or vector
+        :return: None
+        """
+        if self.buffer is None:
+            if self.ncols is None and np.ndim(item) > 0:
+                self.ncols = int(np.size(item))
+            self.buffer = self._allocate(self.capacity)
+        elif self.size == self.buffer.shape[0]:
+            self.buffer = self._allocate(2 * self.buffer.shape[0])
+        self.buffer[self.size] = item
+        self.size += 1
+
+    @property
+    def data(self):
+        """
+        Zero-copy view of the filled part of the buffer.
+        The view is not updated by later appends.
+        """
+        if self.buffer is None:
+            return np.zeros(self._shape(0))
+        return self.buffer[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+    def drop_first(self, n=1):
+        """
+        Drop the first n items in place, the container (and its file) stays the same.
+
+        :param n: number of items
+        :return: None
+        """
+        n = min(n, self.size)
+        if n <= 0:
+            return
+        self.buffer[:self.size - n] = self.buffer[n:self.size]
+        self.size -= n
+
+    def tolist(self):
+        return self.data.tolist()
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, item):
+        return self.data[item]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.data
+        return self.data.astype(dtype)
+
+    def __repr__(self):
+        return repr(self.data)
+
+
+class History(GrowableArray):
+    """
+    Scalar history (device values, times, penalties, ...). None (e.g. a disconnected PV) is stored as NaN.
+    Supports append(), len(), indexing, iteration and numpy.array(history).
+    """
+    def __init__(self, capacity=64):
+        super(History, self).__init__(ncols=None, capacity=capacity)
+
+    def append(self, item):
+        if item is None:
+            item = np.nan
+        super(History, self).append(item)
+
+
+class AcquisitionStore(object):
+    """
+    List-like store of the waveform acquisitions (one array per objective function reading).
+
+    :param max_in_memory: None - keep all acquisitions in memory, int - number of the last acquisitions kept in memory.
+                          The older ones are written to spill_dir (and loaded on access) or dropped (None is returned)
+                          if spill_dir is None.
+    :param spill_dir: directory for the spilled acquisitions (.npy files)
+    """
+    def __init__(self, max_in_memory=None, spill_dir=None):
+        self.max_in_memory = max_in_memory
+        self.spill_dir = spill_dir
+        self.items = []
+        self.in_memory = 0
+        self.nspilled = 0
+        self.prefix = "acq_" + str(int(time.time() * 1e6)) + "_"
+
+    def append(self, acquisition):
+        self.items.append(acquisition)
+        self.in_memory += 1
+        if self.max_in_memory is not None and self.in_memory > self.max_in_memory:
+            self._spill(len(self.items) - self.in_memory)
+
+    def _spill(self, index):
+        data = self.items[index]
+        if data is not None and self.spill_dir is not None:
+            if not os.path.exists(self.spill_dir):
+                os.makedirs(self.spill_dir)
+            # numbered by the spill count, the indices shift after drop_first()
+            filename = os.path.join(self.spill_dir, self.prefix + str(self.nspilled) + ".npy")
+            self.nspilled += 1
+            np.save(filename, np.asarray(data))
+            self.items[index] = filename
+        else:
+            self.items[index] = None
+        self.in_memory -= 1
+
+    def drop_first(self, n=1):
+        """
+        Drop the first n acquisitions, their spill files are removed. The retention policy stays in place.
+
+        :param n: number of acquisitions
+        :return: None
+        """
+        n = min(n, len(self.items))
+        first_in_memory = len(self.items) - self.in_memory
+        for index in range(n):
+            item = self.items[index]
+            if index >= first_in_memory:
+                self.in_memory -= 1
+            elif isinstance(item, str) and os.path.exists(item):
+                os.remove(item)
+        self.items = self.items[n:]
+
+    def _load(self, item):
+        if isinstance(item, str):
+            return np.load(item)
+        return item
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._load(item) for item in self.items[index]]
+        return self._load(self.items[index])
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        for item in self.items:
+            yield self._load(item)
+
+
+class RunLog(object):
+    """
+    Columnar log of the optimization steps: device settings (n x ndevices), penalty and time columns.
+    The best (minimal penalty) step is tracked incrementally.
+
+    :param capacity: 64, initial number of steps
+    :param spill_dir: None, if a directory is given the columns are memory-mapped files in this directory
+    """
+    def __init__(self, capacity=64, spill_dir=None):
+        self.spill_dir = spill_dir
+        files = [None, None, None]
+        if spill_dir is not None:
+            if not os.path.exists(spill_dir):
+                os.makedirs(spill_dir)
+            stamp = str(int(time.time() * 1e6))
+            files = [os.path.join(spill_dir, "runlog_" + stamp + "_" + name + ".dat")
+                     for name in ["x", "penalty", "time"]]
+        self.x = GrowableArray(capacity=capacity, filename=files[0])
+        self.penalty = GrowableArray(capacity=capacity, filename=files[1])
+        self.time = GrowableArray(capacity=capacity, filename=files[2])
+        self.best_index = -1
+        self.best_penalty = np.inf
+
+    def append(self, pen, x):
+        """
+        Add the step to the log.
+
+        :param pen: penalty
+        :param x: device settings
+        :return: None
+        """
+        self.x.append(np.asarray(x, dtype=np.float64))
+        self.penalty.append(pen)
+        self.time.append(time.time())
+        # strict comparison keeps the first minimum as np.argmin does
+        if pen < self.best_penalty:
+            self.best_penalty = pen
+            self.best_index = len(self.penalty) - 1
+
+    def best(self):
+        """
+        :return: (index, penalty, x) of the best step
+        """
+        if self.best_index < 0:
+            raise ValueError("RunLog: no steps in the log")
+        return self.best_index, self.best_penalty, self.x[self.best_index]
+
+    def __len__(self):
+        return len(self.penalty)
@@ -85,20 +85,19 @@ class LCLSQuad(LCLSDevice):
         self.pv_read = "{}{}".format(prefix, "BACT")
         self.pv_low = "{}{}".format(prefix, "BCTRL.DRVL")
         self.pv_high = "{}{}".format(prefix, "BCTRL.DRVH")
+        self.readback_settle = True
         print("Let's get the limits....")
         self.update_limits_from_pv()
 
-    def set_value(self, val):
+    def get_channel(self):
+        return self.pv_read
+
+    def on_write(self, val):
         self.target = val
-        self.mi.set_value(self.eid, val)
 
-    def get_value(self, save=False):
-        if self.mi.read_only:
+    def on_read(self, val, save=False):
+        if self.mi.read_only and self.target is not None:
             val = self.target
-            if val is None:
-                val = self.mi.get_value(self.pv_read)
-        else:
-            val = self.mi.get_value(self.pv_read)
         if save:
             self.values.append(val)
             self.times.append(time.time())
@@ -80,6 +80,7 @@ class LCLSMachineInterface(MachineInterface):
             print("          Runnning LCLS Interface in Read Only Mode.")
             print("****************************************************************")
             epics.caput = no_op
+            epics.caput_many = no_op
             epics.ca.put = no_op
             self.read_only = True
 
@@ -170,6 +171,50 @@ class LCLSMachineInterface(MachineInterface):
             else:
                 return pv.put(val)
 
+    def get_values(self, device_names):
+        """
+        Getter function for a list of PVs. All PVs are read in one Channel Access round trip.
+
+        :param device_names: (list) PV names used in caget
+        :return: (list) Data from the PVs, None for the PVs which did not connect
+        """
+        if len(device_names) == 0:
+            return []
+        return epics.caget_many(list(device_names))
+
+    def set_values(self, device_names, vals):
+        """
+        Setter function for a list of PVs. All puts are issued before waiting on any of them.
+
+        :param device_names: (list) PV names used in caput
+        :param vals: (list) Values to write to the devices
+        """
+        if len(device_names) == 0:
+            return
+        epics.caput_many(list(device_names), list(vals))
+
+    def add_monitor(self, device_name, callback):
+        """
+        Subscribe to the value updates of a PV with a Channel Access monitor.
+
+        :param device_name: (str) PV name
+        :param callback: function(value) called on every update
+        :return: (int) callback index for remove_monitor()
+        """
+        pv = self.pvs.get(device_name, None)
+        if pv is None:
+            pv = epics.get_pv(device_name)
+            self.pvs[device_name] = pv
+
+        def on_change(pvname=None, value=None, **kws):
+            callback(value)
+        return pv.add_callback(on_change)
+
+    def remove_monitor(self, device_name, handle):
+        pv = self.pvs.get(device_name, None)
+        if pv is not None:
+            pv.remove_callback(handle)
+
     def get_energy(self):
         """
         Returns the energy.
@@ -193,8 +238,7 @@ class LCLSMachineInterface(MachineInterface):
 
         :return: (tuple) Charge, Current
         """
-        charge = self.get_charge()
-        current = self.get_value('BLEN:LI24:886:BIMAX')
+        charge, current = self.get_values(['SIOC:SYS0:ML00:CALC252', 'BLEN:LI24:886:BIMAX'])
         return charge, current
 
     def get_beamrate(self):
@@ -202,7 +246,7 @@ class LCLSMachineInterface(MachineInterface):
         return rate
 
     def get_losses(self):
-        losses = [self.get_value(pv) for pv in self.losspvs]
+        losses = self.get_values(self.losspvs)
         return losses
 
     def logbook(self, gui):
@@ -412,20 +456,20 @@ class LCLSMachineInterface(MachineInterface):
             vals = len(dev.values)
             self.data[dev.eid].append(dev.values)
         if vals < len(objective_func.values):  # first point is duplicated for some reason so dropping
-            objective_func.values = objective_func.values[1:]
-            objective_func.objective_means = objective_func.objective_means[1:]
-            objective_func.objective_acquisitions = objective_func.objective_acquisitions[1:]
-            objective_func.times = objective_func.times[1:]
-            objective_func.std_dev = objective_func.std_dev[1:]
-            objective_func.charge = objective_func.charge[1:]
-            objective_func.current = objective_func.current[1:]
+            objective_func.values.drop_first()
+            objective_func.objective_means.drop_first()
+            objective_func.objective_acquisitions.drop_first()
+            objective_func.times.drop_first()
+            objective_func.std_dev.drop_first()
+            objective_func.charge.drop_first()
+            objective_func.current.drop_first()
             try:
                 objective_func.losses = objective_func.losses[1:]
             except:
                 pass
             objective_func.niter -= 1
         self.data[objective_func_pv].append(objective_func.objective_means)  # this is mean for compat
-        self.data['DetectorAll'].append(objective_func.objective_acquisitions)
+        self.data['DetectorAll'].append(list(objective_func.objective_acquisitions))
         self.data['DetectorStat'].append(objective_func.values)
         self.data['DetectorStd'].append(objective_func.std_dev)
         self.data['timestamps'].append(objective_func.times)
@@ -2,6 +2,7 @@ import time
 import numpy as np
 
 from mint.opt_objects import Target
+from mint.history import History
 import stats.stats as stats
 
 
@@ -19,11 +20,11 @@ class SLACTarget(Target):
         self.objective_mean = None
         self.objective_stdev = None
 
-        self.objective_acquisitions = []  # all the points
-        self.objective_means = []
-        self.std_dev = []
-        self.charge = []
-        self.current = []
+        self.objective_acquisitions = self.new_acquisition_store()  # all the points
+        self.objective_means = History()
+        self.std_dev = History()
+        self.charge = History()
+        self.current = History()
         self.losses = []
         self.points = None
 
@@ -72,13 +73,16 @@ class SLACTarget(Target):
             rate = self.mi.get_beamrate()
             nap_time = self.points/(rate*1.0)
         except Exception as ex:
+            rate = None
             nap_time = 1
             print("Something went wrong with the beam rate calculation. Let's sleep 1 second.")
             print("Exception was: ", ex)
 
-        time.sleep(nap_time)
-
-        datain = self.mi.get_value(self.eid)
+        if self.snr_goal > 0 and rate:
+            datain = self.stream_waveform(rate)
+        else:
+            time.sleep(nap_time)
+            datain = self.mi.get_value(self.eid)
 
         if self.stats is None:
             self.stats = stats.StatNone
@@ -103,11 +107,43 @@ class SLACTarget(Target):
         losses = self.mi.get_losses()
         return self.statistic, self.objective_stdev, charge, current, losses
 
+    def stream_waveform(self, rate):
+        """
+        Streaming read of the detector waveform: the shots which arrived at the beam rate since the previous read
+        are taken from the waveform tail until the SNR goal or self.points shots are reached.
+
+        :param rate: beam rate in Hz
+        :return: array of the acquired shots
+        """
+        acquired = []
+        start = time.time()
+        max_shots = int(self.points)
+        # number of shots arrived up to the previous read
+        seen = [0]
+
+        def read_shots():
+            arrived = int((time.time() - start)*rate)
+            new = min(arrived - seen[0], max_shots - sum([len(a) for a in acquired]))
+            if new <= 0:
+                return []
+            seen[0] = arrived
+            waveform = np.atleast_1d(self.mi.get_value(self.eid))
+            # the waveform can be shorter than the shots arrived since the previous read: the older shots are lost
+            # and must not be read again by the next call
+            shots = waveform[len(waveform) - min(new, len(waveform)):]
+            acquired.append(shots)
+            return shots
+
+        self.stream(read_shots, max_shots=max_shots)
+        if len(acquired) == 0:
+            return np.array([])
+        return np.concatenate(acquired)
+
     def clean(self):
         Target.clean(self)
-        self.objective_acquisitions = []  # all the points
-        self.objective_means = []
-        self.std_dev = []
-        self.charge = []
-        self.current = []
+        self.objective_acquisitions = self.new_acquisition_store()  # all the points
+        self.objective_means = History()
+        self.std_dev = History()
+        self.charge = History()
+        self.current = History()
         self.losses = []
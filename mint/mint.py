@@ -15,8 +15,9 @@ import numpy as np
 from mint.opt_objects import *
 from scipy import optimize
 from GP.bayes_optimization import *
-from GP.OnlineGP import OGP
+from GP.OnlineGP import OGP, correlationGroups
 from GP.DKLmodel import DKLGP
+from GP.trust_region import TuRBO
 try:
     from matrixmodel.beamconfig import Beamconfig
 except:
@@ -24,8 +25,14 @@ except:
         print('WARNING: could not import Beamconfig from matrixmodel.beamconfig')
 import pandas as pd
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
 import sklearn
 from op_methods.es import ES_min
+from RCDS.rcdsClass import RCDS
+from mint.settle_model import SettleModels
+from mint.history import RunLog
+from mint.eval_cache import EvalCache
+from mint.ask_tell import AskTellDriver, minimize_steps, run_ask_tell
 
 from mint import normscales
 
@@ -59,10 +66,67 @@ class Minimizer(object):
         self.mi = None
         self.max_iter = 100
         self.maximize = False
+        # pipeline mode (set by Optimizer): the next point is acquired while the current one is measured
+        self.pipeline = False
+        # ask/tell protocol
+        self.nask = 1
+        self.driver = None
 
     def minimize(self, error_func, x):
         pass
 
+    def search(self, x):
+        """
+        Generator of the ask/tell protocol: yields batches of points (m x ndim) and receives their values.
+        The minimizers which own the control loop return None and are bridged by minimize_steps().
+
+        :param x: initial point
+        :return: generator or None
+        """
+        return None
+
+    def reset(self, x):
+        """
+        Start the ask/tell search from the point x.
+
+        :param x: initial point
+        :return: None
+        """
+        if self.driver is not None:
+            self.driver.close()
+        x = np.array(x, dtype=float).flatten()
+        generator = self.search(x)
+        if generator is None:
+            generator = minimize_steps(self.minimize, x)
+        self.driver = AskTellDriver(generator, ndim=len(x))
+
+    def ask(self, n=1):
+        """
+        Candidate settings to evaluate next.
+
+        :param n: maximum number of points
+        :return: (m x ndim) array, m = 0 when the search is finished
+        """
+        self.nask = n
+        return self.driver.ask(n)
+
+    def tell(self, x, y):
+        """
+        Results of the evaluations of the asked points (in the ask order).
+
+        :param x: (m x ndim) array of the points
+        :param y: m objective function values
+        :return: None
+        """
+        self.driver.tell(x, y)
+
+    def close(self):
+        """
+        Stop the ask/tell search.
+        """
+        if self.driver is not None:
+            self.driver.close()
+
 
 class ESMin(Minimizer):
     def __init__(self):
@@ -76,14 +140,21 @@ class ESMin(Minimizer):
         self.ES.minimize(error_func, x)
         return
 
+    def search(self, x):
+        self.ES.bounds = self.bounds
+        self.ES.max_iter = self.max_iter
+        self.ES.norm_coef = self.norm_coef
+        return self.ES.search(x)
+
 
 class Simplex(Minimizer):
     def __init__(self):
         super(Simplex, self).__init__()
         self.xtol = 1e-5
+        self.ftol = 1e-4
         self.dev_steps = None
 
-    def minimize(self,  error_func, x):
+    def initial_simplex(self, x):
         #print("start seed", np.count_nonzero(self.dev_steps))
         if self.dev_steps == None or len(self.dev_steps) != len(x):
             print("initial simplex is None")
@@ -100,15 +171,94 @@ class Simplex(Minimizer):
                 vertex[i] = self.dev_steps[i]
                 isim[i + 1, :] = x + vertex
             print("ISIM = ", isim)
-        #res = optimize.minimize(error_func, x, method='Nelder-Mead',  tol=self.xtol,
-        #                        options = {'disp': False, 'initial_simplex': [0.05, 0.05], 'maxiter': self.max_iter})
-        if scipy.__version__ < "0.18":
-            res = optimize.fmin(error_func, x, maxiter=self.max_iter, maxfun=self.max_iter, xtol=self.xtol)
-        else:
-            res = optimize.fmin(error_func, x, maxiter=self.max_iter, maxfun=self.max_iter, xtol=self.xtol, initial_simplex=isim)
+        return isim
 
-        #print("finish seed")
-        return res
+    def minimize(self,  error_func, x):
+        return run_ask_tell(self, error_func, x)
+
+    def search(self, x):
+        """
+        Nelder-Mead simplex as a generator of the ask/tell protocol. The steps are the same as in
+        scipy.optimize.fmin (maxiter = maxfun = max_iter). The vertices of the initial simplex and the vertices
+        of a shrink step are asked as one batch.
+
+        :param x: initial point
+        :return: generator
+        """
+        rho, chi, psi, sigma = 1., 2., 0.5, 0.5
+        N = len(x)
+        sim = self.initial_simplex(x)
+        if sim is None:
+            # 0.00025 is the fmin step for the zero coordinates (see Optimizer.error_func)
+            sim = np.tile(np.array(x, dtype=float), (N + 1, 1))
+            for k in range(N):
+                if x[k] != 0:
+                    sim[k + 1, k] = (1 + 0.05)*x[k]
+                else:
+                    sim[k + 1, k] = 0.00025
+        maxfun = self.max_iter
+        maxiter = self.max_iter
+        fsim = np.inf*np.ones(N + 1)
+
+        nfev = min(N + 1, maxfun)
+        if nfev > 0:
+            fsim[:nfev] = yield sim[:nfev]
+        ind = np.argsort(fsim)
+        sim, fsim = sim[ind], fsim[ind]
+
+        iterations = 1
+        while nfev < maxfun and iterations < maxiter:
+            if (np.max(np.abs(sim[1:] - sim[0])) <= self.xtol and
+                    np.max(np.abs(fsim[0] - fsim[1:])) <= self.ftol):
+                break
+            xbar = np.sum(sim[:-1], axis=0)/N
+            xr = (1 + rho)*xbar - rho*sim[-1]
+            fxr = (yield xr)[0]
+            nfev += 1
+            if fxr < fsim[0]:
+                if nfev >= maxfun:
+                    break
+                xe = (1 + rho*chi)*xbar - rho*chi*sim[-1]
+                fxe = (yield xe)[0]
+                nfev += 1
+                if fxe < fxr:
+                    sim[-1], fsim[-1] = xe, fxe
+                else:
+                    sim[-1], fsim[-1] = xr, fxr
+            elif fxr < fsim[-2]:
+                sim[-1], fsim[-1] = xr, fxr
+            else:
+                if nfev >= maxfun:
+                    break
+                doshrink = False
+                if fxr < fsim[-1]:
+                    # outside contraction
+                    xc = (1 + psi*rho)*xbar - psi*rho*sim[-1]
+                    fxc = (yield xc)[0]
+                    nfev += 1
+                    if fxc <= fxr:
+                        sim[-1], fsim[-1] = xc, fxc
+                    else:
+                        doshrink = True
+                else:
+                    # inside contraction
+                    xcc = (1 - psi)*xbar + psi*sim[-1]
+                    fxcc = (yield xcc)[0]
+                    nfev += 1
+                    if fxcc < fsim[-1]:
+                        sim[-1], fsim[-1] = xcc, fxcc
+                    else:
+                        doshrink = True
+                if doshrink:
+                    nshrink = min(N, maxfun - nfev)
+                    nmove = min(N, nshrink + 1)
+                    sim[1:nmove + 1] = sim[0] + sigma*(sim[1:nmove + 1] - sim[0])
+                    if nshrink > 0:
+                        fsim[1:nshrink + 1] = yield sim[1:nshrink + 1]
+                        nfev += nshrink
+            iterations += 1
+            ind = np.argsort(fsim)
+            sim, fsim = sim[ind], fsim[ind]
 
 
 class Powell(Minimizer):
@@ -122,6 +272,37 @@ class Powell(Minimizer):
         return res
 
 
+class RCDSMin(Minimizer):
+    """
+    Robust Conjugate Direction Search (X. Huang). The devices are normalized to [0, 1] within the bounds.
+    The ask/tell protocol uses the minimize_steps() bridge.
+    """
+    def __init__(self):
+        super(RCDSMin, self).__init__()
+        self.xtol = 1e-5
+        self.noise = 0.001
+        self.step = 0.01
+        self.bounds = None # [[min, max], [], []] # n = len(x), device limits if None
+        self.devices = []
+
+    def minimize(self, error_func, x):
+        x = np.array(x, dtype=float)
+        bounds = self.bounds
+        if bounds is None:
+            bounds = [dev.get_limits() for dev in self.devices]
+        vrange = np.array(bounds, dtype=float).reshape(len(x), 2)
+        for i, xi in enumerate(x):
+            if vrange[i, 0] == vrange[i, 1]:
+                delta = np.abs(xi)*0.1
+                delta = 0.1 if delta == 0 else delta
+                vrange[i] = [xi - delta, xi + delta]
+        rcds = RCDS(error_func, g_noise=self.noise, Nvar=len(x), g_vrange=vrange)
+        x0 = (x - vrange[:, 0])/(vrange[:, 1] - vrange[:, 0])
+        xm, fm, nf = rcds.powellmain(x0, self.step, np.eye(len(x)), tol=self.xtol, maxIt=self.max_iter,
+                                     maxEval=self.max_iter)
+        return vrange[:, 0] + xm*(vrange[:, 1] - vrange[:, 0])
+
+
 class GaussProcess(Minimizer):
     def __init__(self):
         super(GaussProcess,self).__init__()
@@ -146,6 +327,14 @@ class GaussProcess(Minimizer):
         self.simQ = False
         self.seedScanBool = True
         self.prior_data = None
+        # additive GP kernel over groups of devices: None - full kernel, list of lists of device indices,
+        # 'corrmat' - the groups of correlated devices of the correlation matrix
+        self.groups = None
+        # devices with |correlation| > groups_thresh are in one group (groups = 'corrmat')
+        self.groups_thresh = 0.3
+        # matrixmodel Beamconfig: the correlation matrix of the devices (quads) is computed from the matrix model.
+        # None - identity (no correlations) unless the Machine Interface has one (MultinormalInterface)
+        self.beamconfig = None
 
     def seed_simplex(self):
         opt_smx = Optimizer()
@@ -159,17 +348,42 @@ class GaussProcess(Minimizer):
         seq = [Action(func=opt_smx.max_target_func, args=[self.target, self.devices])]
         opt_smx.eval(seq)
 
-        seed_data = np.append(np.vstack(opt_smx.opt_ctrl.dev_sets), np.transpose(-np.array([opt_smx.opt_ctrl.penalty])), axis=1)
+        seed_data = np.column_stack((opt_smx.opt_ctrl.dev_sets, -opt_smx.opt_ctrl.penalty))
         self.prior_data = pd.DataFrame(seed_data)
         self.seed_y_data = opt_smx.opt_ctrl.penalty
 
 
+    def correlation_groups(self, corrmat, covarmat):
+        """
+        Groups of the additive kernel from the correlation matrix of the devices (see correlationGroups).
+        The correlations between the groups (below groups_thresh) are dropped from the matrices, so the linear
+        embedding built from them does not mix the groups. A grouping which collapses to single devices or to one
+        block carries no additive structure: a warning is printed and the full kernel is used.
+
+        :param corrmat: correlation matrix of the devices
+        :param covarmat: covariance matrix of the devices
+        :return: (groups or None - full kernel, corrmat, covarmat)
+        """
+        corrmat = np.array(corrmat, dtype=float)
+        covarmat = np.array(covarmat, dtype=float)
+        groups = correlationGroups(corrmat, thresh=self.groups_thresh)
+        print('additive kernel groups = ', groups)
+        dim = len(corrmat)
+        if dim > 1 and (len(groups) == dim or len(groups) == 1):
+            print('GaussProcess - WARNING: the correlation matrix gives ', len(groups), ' groups of ', dim,
+                  ' devices (threshold ', self.groups_thresh, '), using the full kernel')
+            return None, corrmat, covarmat
+        same = np.zeros((dim, dim), dtype=bool)
+        for g in groups:
+            same[np.ix_(g, g)] = True
+        return groups, np.where(same, corrmat, 0.), np.where(same, covarmat, 0.)
+
     def preprocess(self):
         self.energy = self.mi.get_energy()
         hyp_params = HyperParams(pvs=self.devices, filename=self.hyper_file, mi=self.mi)
         dev_ids = [dev.eid for dev in self.devices]
         print('devids = ', dev_ids)
-        dev_vals = [dev.get_value() for dev in self.devices]
+        dev_vals = get_devices_values(self.devices)
         print("mintGP: dev_vals = ",dev_vals)
         hyps1 = hyp_params.loadHyperParams(self.hyper_file, self.energy, self.target, dev_ids, dev_vals, self.multiplier)
         dim = len(self.devices)
@@ -190,6 +404,12 @@ class GaussProcess(Minimizer):
                 #corrmat = np.eye(len(dev_ids))
 
             corrmat = np.eye(len(dev_ids))
+            if self.beamconfig is not None:
+                try:
+                    corrmat = np.array(self.beamconfig.corrmat_full(dev_ids), dtype=float)
+                except Exception as ex:
+                    print('WARNING: could not compute the correlation matrix with the matrix model. '
+                          'Using an identity matrix instead. Exception was: ', ex)
 
             # build covariance matrix from correlation matrix and length scales
             diaglens = np.diagflat(np.sqrt(0.5/np.exp(hyps1[0]))) # length scales (or principal widths)
@@ -205,7 +425,12 @@ class GaussProcess(Minimizer):
         #self.model = OGP(dim, hyps1, maxBV=self.numBV, weighted=False)
         amp_param = np.exp(hyps1[1]); print('amp_param = ', amp_param)
         noise_variance = np.exp(hyps1[2]); print('noise_variance = ', noise_variance)
-        self.model = DKLGP(dim, dim_z=dim, alpha=amp_param, noise=noise_variance)
+        groups = self.groups
+        if isinstance(groups, str) and groups == 'corrmat':
+            groups, corrmat, covarmat = self.correlation_groups(corrmat, covarmat)
+            self.corrmat = corrmat
+            self.covarmat = covarmat
+        self.model = DKLGP(dim, dim_z=dim, alpha=amp_param, noise=noise_variance, groups=groups)
         self.model.linear_from_correlation(covarmat)
 
         # initialize model on prior data if available
@@ -227,18 +452,47 @@ class GaussProcess(Minimizer):
         self.scanner = BayesOpt(model=self.model, target_func=self.target, acq_func=self.acq_func, xi=self.xi, alt_param=self.alt_param, m=self.m, bounds=self.bounds, iter_bound=self.iter_bound, prior_data=self.prior_data, start_dev_vals=dev_vals, dev_ids=dev_ids, energy=self.energy, hyper_file=self.hyper_file,corrmat=corrmat,covarmat=covarmat)
         self.scanner.max_iter = self.max_iter
         self.scanner.opt_ctrl = self.opt_ctrl
+        self.scanner.limits = get_devices_limits(self.devices)
+        self.scanner.pipeline = self.pipeline
 
-    def minimize(self,  error_func, x):
+    def start_scanner(self):
+        """
+        Seed scan and the BayesOpt scanner initialization.
+
+        :return: initial point (current device values)
+        """
         self.energy = self.mi.get_energy()
         print('Energy is ', self.energy, ' GeV')
         if self.seedScanBool: self.seed_simplex()
         self.preprocess()
-        x = [dev.get_value() for dev in self.devices]
+        return get_devices_values(self.devices)
+
+    def minimize(self,  error_func, x):
+        x = self.start_scanner()
         print("start GP")
         self.scanner.minimize(error_func, x)
+        print("GP: acquired points moved into the device limits: ", self.scanner.nrejected)
         self.saveModel()
         return
 
+    def search(self, x):
+        """
+        Ask/tell generator. The seed scan (if seedScanBool) still runs its own Simplex Optimizer.
+        """
+        x = self.start_scanner()
+        print("start GP")
+        search = self.scanner.search(x)
+        values = None
+        while True:
+            self.scanner.nask = self.nask
+            try:
+                points = next(search) if values is None else search.send(values)
+            except StopIteration:
+                break
+            values = yield points
+        print("GP: acquired points moved into the device limits: ", self.scanner.nrejected)
+        self.saveModel()
+
     def saveModel(self):
         """
         Add GP model parameters to the save file.
@@ -346,6 +600,40 @@ class GaussProcess(Minimizer):
             pass
 
 
+
+class TrustRegionGP(Minimizer):
+    """
+    Trust-region Bayesian optimization (TuRBO) with local OnlineGP models, for scans of many devices.
+    The search runs in the box of the device limits (bounds if not None).
+    """
+    def __init__(self):
+        super(TrustRegionGP, self).__init__()
+        self.TR = TuRBO()
+        self.bounds = None # [[min, max], [], []] # n = len(x), device limits if None
+        self.devices = []
+        self.ntr = 1 # number of trust regions
+
+    def minimize(self, error_func, x):
+        return run_ask_tell(self, error_func, x)
+
+    def search(self, x):
+        bounds = self.bounds
+        if bounds is None:
+            bounds = get_devices_limits(self.devices)
+        self.TR.bounds = bounds
+        self.TR.ntr = self.ntr
+        self.TR.max_iter = self.max_iter
+        self.TR.nask = self.nask
+        search = self.TR.search(x)
+        values = None
+        while True:
+            self.TR.nask = self.nask
+            try:
+                points = next(search) if values is None else search.send(values)
+            except StopIteration:
+                break
+            values = yield points
+
 class GaussProcessSKLearn(Minimizer):
     def __init__(self):
         super(GaussProcessSKLearn, self).__init__()
@@ -378,8 +666,8 @@ class GaussProcessSKLearn(Minimizer):
         seq = [Action(func=opt_smx.max_target_func, args=[self.target, self.devices])]
         opt_smx.eval(seq)
         print(opt_smx.opt_ctrl.dev_sets)
-        self.x_obs = np.vstack(opt_smx.opt_ctrl.dev_sets)
-        self.y_obs = np.array(opt_smx.opt_ctrl.penalty)
+        self.x_obs = opt_smx.opt_ctrl.dev_sets
+        self.y_obs = opt_smx.opt_ctrl.penalty
         self.y_sigma_obs = np.zeros(len(self.y_obs))
 
     def load_seed(self, x_sets, penalty, sigma_pen=None):
@@ -395,6 +683,7 @@ class GaussProcessSKLearn(Minimizer):
 
         self.scanner = gp_sklearn.GP()
         self.scanner.opt_ctrl = self.opt_ctrl
+        self.scanner.pipeline = self.pipeline
         devs_std = []
         devs_search_area = []
         for dev in self.devices:
@@ -484,20 +773,20 @@ class MachineStatus:
         return True
 
 
-class OptControl:
+class OptControl(object):
     """
     Optimization control
 
     :param m_status: MachineStatus (Device class), indicator of the machine state (beam on/off)
     :param timeot: 0.1, timeout between machine status (m_status) readings
     :param alarm_timeout: timeout between Machine status is again OK and optimization continuation
+    :param spill_dir: None, directory for memory-mapped run log files (long scans), the run log is in RAM if None
 
     """
     def __init__(self):
-        self.penalty = []
-        self.dev_sets = []
+        self.spill_dir = None
+        self.log = RunLog()
         self.devices = []
-        self.nsteps = 0
         self.m_status = MachineStatus()
         self.pause = False
         self.kill = False
@@ -505,6 +794,24 @@ class OptControl:
         self.timeout = 0.1
         self.alarm_timeout = 0.
 
+    @property
+    def penalty(self):
+        """
+        Penalties of the steps, zero-copy view of the run log
+        """
+        return self.log.penalty.data
+
+    @property
+    def dev_sets(self):
+        """
+        Device settings of the steps (nsteps x ndevices), zero-copy view of the run log
+        """
+        return self.log.x.data
+
+    @property
+    def nsteps(self):
+        return len(self.log)
+
     def wait(self):
         """
         check if the machine is OK. If it is not the infinite loop is launched with checking of the machine state
@@ -539,20 +846,14 @@ class OptControl:
         return self.dev_sets[-n]
 
     def save_step(self, pen, x):
-        self.penalty.append(pen)
-        self.dev_sets.append(x)
-        self.nsteps = len(self.penalty)
+        self.log.append(pen, x)
 
     def best_step(self):
-        #if len(self.penalty)== 0:
-        #    print("No ")
-        x = self.dev_sets[np.argmin(self.penalty)]
+        index, pen, x = self.log.best()
         return x
 
     def clean(self):
-        self.penalty = []
-        self.dev_sets = []
-        self.nsteps = 0
+        self.log = RunLog(spill_dir=self.spill_dir)
 
 
 class Optimizer(Thread):
@@ -574,6 +875,22 @@ class Optimizer(Thread):
         self.norm_coef = 0.05
         self.maximization = True
         self.scaling_coef = 1.0
+        # concurrent mode: write/settle/readback of all devices run in a thread pool
+        self.concurrent = False
+        self.max_workers = 8
+        self.pool = None
+        # learned per-device settle times (SettleModels), the trim delay is used if None
+        self.settle_models = None
+        self.x_prev = None
+        # memoization of the evaluations (EvalCache), disabled if None
+        self.eval_cache = None
+        # pipeline mode: the minimizer (GP) acquires the next point while the machine settles at the current one
+        self.pipeline = False
+        # run the minimizer through the ask/tell protocol (run_ask_tell), batch_size points are asked at once
+        self.ask_tell = False
+        self.batch_size = 1
+        # number of points rejected by exceed_limits (evaluated as target.pen_max) in the current run
+        self.nrejected = 0
 
     def eval(self, seq=None, logging=False, log_file=None):
         """
@@ -591,24 +908,143 @@ class Optimizer(Thread):
         return False
 
     def get_values(self):
-        for i in range(len(self.devices)):
-            print('reading ', self.devices[i].id)
-            self.devices[i].get_value(save=True)
+        print('reading ', [dev.id for dev in self.devices])
+        return get_devices_values(self.devices, save=True)
 
     def set_values(self, x):
         for i in range(len(self.devices)):
             print('setting', self.devices[i].id, '->', x[i])
-            self.devices[i].set_value(x[i])
+        set_devices_values(self.devices, x)
 
     def set_triggers(self):
         for i in range(len(self.devices)):
             print('triggering ', self.devices[i].id)
             self.devices[i].trigger()
 
-    def do_wait(self):
+    def settle_timeout(self, dev):
+        """
+        Upper bound of the settle wait of the device: Device.timeout limited by the trim delay (Optimizer.timeout).
+        """
+        if self.timeout > 0:
+            return min(dev.timeout, self.timeout)
+        return dev.timeout
+
+    def do_wait(self, start=None):
+        """
+        Wait until all devices are settled, one after another.
+        The whole wait has one settle budget counted from the write (Optimizer.timeout, or the longest
+        Device.timeout if there is no trim delay): each device only gets the time which is left of it, so
+        the step never blocks for more than the budget however many devices are moved.
+        The settle time of a device is counted from the write (first device) or from the end of the wait of the
+        previous device, so Device.settle_times hold per-device latencies, not the cumulative wait.
+
+        :param start: time of the write. Now if None
+        :return: (list) settled flags of the devices
+        """
+        if start is None:
+            start = time.time()
+        if len(self.devices) == 0:
+            return []
+        budget = self.timeout if self.timeout > 0 else max([dev.timeout for dev in self.devices])
+        deadline = start + budget
+        settled = []
+        wait_start = start
         for i in range(len(self.devices)):
             print('waiting ', self.devices[i].id)
-            self.devices[i].wait()
+            left = max(deadline - time.time(), 0.)
+            settled.append(self.settle(self.devices[i], wait_start, trigger=False, timeout=left))
+            wait_start = time.time()
+        return settled
+
+    def settle(self, dev, start, trigger=True, timeout=None):
+        """
+        Trigger and wait one device. Executed in a worker thread in the concurrent mode.
+        The settle latency (from the write until Device.wait() returned) is appended to Device.settle_times.
+
+        :param dev: Device
+        :param start: time of the write
+        :param trigger: if True Device.trigger() is called before the wait
+        :param timeout: time left of the settle budget of the step, the wait is bounded by settle_timeout() only
+                        if None
+        :return: (bool) True if the device settled
+        """
+        if trigger:
+            dev.trigger()
+        bound = self.settle_timeout(dev)
+        if timeout is not None:
+            bound = min(bound, timeout)
+        settled = dev.wait(timeout=bound)
+        dev.settle_times.append(time.time() - start)
+        return settled
+
+    def concurrent_set_values(self, x):
+        """
+        Write all devices in bulk, then fan out the triggers and settle checks over the thread pool and join them.
+
+        :param x: new device values
+        :return: (list) settled flags of the devices
+        """
+        start = time.time()
+        self.set_values(x)
+        futures = [self.pool.submit(self.settle, dev, start) for dev in self.devices]
+        settled = [f.result() for f in futures]
+        latencies = [dev.settle_times[-1] for dev in self.devices]
+        print('settled in ', max(latencies), 's (serial sum ', sum(latencies), 's)')
+        return settled
+
+    def predict_settle(self, x):
+        """
+        Predict the settle time of every device for the step to x with the settle models.
+        The predictions are appended to Device.settle_predicted on every write (None without a prediction),
+        so they stay aligned with Device.settle_times. Only devices with a true readback have a model.
+
+        :param x: new device values
+        :return: (list) predicted settle times in seconds including the model margin, None for devices without
+                 a model
+        """
+        preds = []
+        for i, dev in enumerate(self.devices):
+            pred = None
+            if self.settle_models is not None and self.x_prev is not None and dev.readback_settle:
+                pred = self.settle_models.predict(dev.eid, x[i] - self.x_prev[i])
+            dev.settle_predicted.append(pred)
+            preds.append(pred)
+        return preds
+
+    def update_settle_models(self, x, settled):
+        """
+        Add the observed settle times of the devices which settled on a true readback to the settle models.
+        A device without a true readback (get_value() echoes the setpoint) "settles" at once, its settle time
+        says nothing about the device and is never fitted.
+
+        :param x: new device values
+        :param settled: settled flags of the devices
+        :return: None
+        """
+        if self.settle_models is not None and self.x_prev is not None:
+            for i, dev in enumerate(self.devices):
+                if settled[i] and dev.readback_settle and len(dev.settle_times) > 0:
+                    self.settle_models.add(dev.eid, x[i] - self.x_prev[i], dev.settle_times[-1])
+        self.x_prev = np.array(x, dtype=float)
+
+    def trim_delay(self, start, settled):
+        """
+        Sleep the rest of the trim delay (Optimizer.timeout) counted from the write.
+        The trim delay is only an upper bound: it is skipped when all devices settled on a true readback.
+        A device which cannot observe its own settling always gets the full delay, a settle prediction
+        never shortens it.
+
+        :param start: time of the write
+        :param settled: settled flags of the devices
+        :return: None
+        """
+        if all(settled) and all([dev.readback_settle for dev in self.devices]):
+            print('all devices settled in ' + str(time.time() - start) + ' s')
+            return
+        remaining = self.timeout - (time.time() - start)
+        if remaining > 0:
+            print('sleeping ' + str(remaining))
+            time.sleep(remaining)
 
     def calc_scales(self):
         """
@@ -633,6 +1069,21 @@ class Optimizer(Thread):
             self.norm_scales *= np.sign(np.random.randn(self.norm_scales.size))
         return self.norm_scales
 
+    def record_cached(self, x, pen, step=None):
+        """
+        Record a step served from the evaluation cache in the Target and Device histories,
+        so they stay aligned with the steps of the run (Target.cached_steps flags it).
+
+        :param x: device settings of the step
+        :param pen: cached penalty (with the sign of error_func)
+        :param step: index of the measurement of the point in the histories (EvalCache.measured_step)
+        :return: None
+        """
+        coef = 1 if self.maximization else -1
+        self.target.on_cached(coef*pen, step)
+        for dev, val in zip(self.devices, x):
+            dev.on_cached(val)
+
     def error_func(self, x):
         # 0.00025 is used for Simplex because of the fmin steps.
         delta_x = np.array(x)*self.scaling_coef
@@ -654,25 +1105,46 @@ class Optimizer(Thread):
 
         # check limits
         if self.exceed_limits(x):
+            self.nrejected += 1
             return self.target.pen_max
+
+        if self.eval_cache is not None:
+            cache_key = self.eval_cache.make_key(x, [dev.tol for dev in self.devices])
+            pen = self.eval_cache.lookup(cache_key)
+            if pen is not None:
+                print('penalty (cached):', pen)
+                self.record_cached(x, pen, self.eval_cache.measured_step(cache_key))
+                self.opt_ctrl.save_step(pen, x)
+                return pen
+
+        self.predict_settle(x)
         # set values
-        self.set_values(x)
-        self.set_triggers()
-        self.do_wait()
+        start = time.time()
+        if self.concurrent and self.pool is not None:
+            settled = self.concurrent_set_values(x)
+        else:
+            self.set_values(x)
+            self.set_triggers()
+            settled = self.do_wait(start)
         self.get_values()
+        self.update_settle_models(x, settled)
 
-        print('sleeping ' + str(self.timeout))
-        time.sleep(self.timeout)
+        self.trim_delay(start, settled)
 
         coef = -1
         if self.maximization:
             coef = 1
 
+        nsteps = len(self.target.penalties)
         pen = coef*self.target.get_penalty()
         print('penalty:', pen)
         if self.debug:
             print('penalty:', pen)
 
+        if self.eval_cache is not None:
+            # the step histories have no entry if the target returned early (e.g. on an alarm)
+            step = nsteps if len(self.target.penalties) > nsteps else None
+            self.eval_cache.store(cache_key, pen, time.time() - start, step=step)
         self.opt_ctrl.save_step(pen, x)
         return pen
 
@@ -690,25 +1162,44 @@ class Optimizer(Thread):
         self.minimizer.maximize = self.maximization
         self.minimizer.target = target
         self.minimizer.opt_ctrl = self.opt_ctrl
+        self.minimizer.pipeline = self.pipeline
         self.target.devices = self.devices
         dev_ids = [dev.eid for dev in self.devices]
         if self.debug: print('starting multiknob optimization, devices = ', dev_ids)
 
         target_ref = self.target.get_penalty()
 
-        x = [dev.get_value(save=True) for dev in self.devices]
+        x = get_devices_values(self.devices, save=True)
         x_init = x
+        self.x_prev = np.array(x_init, dtype=float)
 
         if self.logging:
             self.logger.log_start(dev_ids, method=self.minimizer.__class__.__name__, x_init=x_init, target_ref=target_ref)
 
         self.x_init = x_init
+        self.nrejected = 0
+        if self.eval_cache is not None:
+            self.eval_cache.clean()
         if self.normalization:
             x = np.zeros_like(x)
             self.calc_scales()
 
-        res = self.minimizer.minimize(self.error_func, x)
+        if self.concurrent:
+            self.pool = ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(self.devices), 1)))
+        try:
+            if self.ask_tell:
+                res = run_ask_tell(self.minimizer, self.error_func, x, batch_size=self.batch_size,
+                                   opt_ctrl=self.opt_ctrl)
+            else:
+                res = self.minimizer.minimize(self.error_func, x)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(wait=True)
+                self.pool = None
         print("result", res)
+        print("points rejected by the device limits: ", self.nrejected)
+        if self.eval_cache is not None:
+            print(self.eval_cache.report())
 
         # set best solution
         if self.set_best_solution:
@@ -855,7 +1346,7 @@ def test_GP():
 
     seq = [Action(func=opt_smx.max_target_func, args=[target, devices])]
     opt_smx.eval(seq)
-    s_data = np.append(np.vstack(opt_smx.opt_ctrl.dev_sets), np.transpose(-np.array([opt_smx.opt_ctrl.penalty])), axis=1)
+    s_data = np.column_stack((opt_smx.opt_ctrl.dev_sets, -opt_smx.opt_ctrl.penalty))
     print(s_data)
 
     # -------------- GP config setup -------------- #
@@ -866,8 +1357,8 @@ def test_GP():
 
     pvs = [dev.eid for dev in devices]
     hyp_params = HyperParams(pvs=pvs, filename="../parameters/hyperparameters.npy")
-    ave = np.mean(-np.array(opt_smx.opt_ctrl.penalty))
-    std = np.std(-np.array(opt_smx.opt_ctrl.penalty))
+    ave = np.mean(-opt_smx.opt_ctrl.penalty)
+    std = np.std(-opt_smx.opt_ctrl.penalty)
     noise = hyp_params.calcNoiseHP(ave, std=0.)
     coeff = hyp_params.calcAmpCoeffHP(ave, std=0.)
     len_sc_hyps = []
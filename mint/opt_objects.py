@@ -8,9 +8,14 @@ import numpy as np
 import time
 from datetime import datetime
 import json
+import threading
+from collections import OrderedDict
 
 from PyQt5.QtWidgets import QWidget
 
+from mint.history import History, AcquisitionStore
+from stats.stats import RunningStat
+
 
 class MachineInterface(object):
     def __init__(self, args):
@@ -69,6 +74,51 @@ class MachineInterface(object):
         """
         raise NotImplementedError
 
+    def get_values(self, channels):
+        """
+        Getter function for a list of channels.
+        The default implementation loops over get_value(). Machine Interfaces with a control system that supports
+        multi-channel reads should override it to read all channels in one network round trip.
+
+        :param channels: (list) List of the devices names used
+        :return: (list) Data from the reads on the Control System in the same order as channels
+        """
+        return [self.get_value(channel) for channel in channels]
+
+    def set_values(self, channels, vals):
+        """
+        Method to set values to a list of channels.
+        The default implementation loops over set_value(). Machine Interfaces with a control system that supports
+        multi-channel writes should override it.
+
+        :param channels: (list) List of the devices names used
+        :param vals: (list) values, in the same order as channels
+        :return: None
+        """
+        for channel, val in zip(channels, vals):
+            self.set_value(channel, val)
+
+    def add_monitor(self, channel, callback):
+        """
+        Subscribe to the value updates of a channel (e.g. an EPICS monitor).
+        Machine Interfaces without monitors return None and the caller falls back to polling.
+
+        :param channel: (str) String of the devices name used
+        :param callback: function(value) called on every update
+        :return: handle for remove_monitor() or None if monitors are not supported
+        """
+        return None
+
+    def remove_monitor(self, channel, handle):
+        """
+        Cancel a subscription made with add_monitor().
+
+        :param channel: (str) String of the devices name used
+        :param handle: handle returned by add_monitor()
+        :return: None
+        """
+        pass
+
     def customize_ui(self, gui):
         """
         Method invoked to modify the UI and apply customizations pertinent to the
@@ -228,7 +278,7 @@ class MachineInterface(object):
             d_names.append(dev.eid + "_lim")
             d_start.append(dev.get_limits()[0])
             d_stop.append(dev.get_limits()[1])
-            dump2json[dev.eid] = dev.values
+            dump2json[dev.eid] = list(dev.values)
 
         scan_params["iter"] = len(objective_func.penalties)
 
@@ -273,9 +323,9 @@ class MachineInterface(object):
         except Exception as ex:
             print("Database error. Exception was: " + str(ex))
 
-        dump2json["dev_times"] = devices[0].times
-        dump2json["obj_values"] = objective_func.values
-        dump2json["obj_times"] = objective_func.times
+        dump2json["dev_times"] = list(devices[0].times)
+        dump2json["obj_values"] = list(objective_func.values)
+        dump2json["obj_times"] = list(objective_func.times)
         dump2json["maximization"] = maximization
 
 
@@ -329,22 +379,80 @@ class Device(object):
     def __init__(self, eid=None):
         self.eid = eid
         self.id = eid
-        self.values = []
-        self.times = []
+        self.values = History()
+        self.times = History()
+        self.settle_times = []
+        self.settle_predicted = []
         self.simplex_step = 0
         self.mi = None
         self.tol = 0.001
         self.timeout = 5  # seconds
+        # settle detection: get_value() returns a true readback (not the setpoint)
+        self.readback_settle = False
+        self.settle_rate = None  # max readback rate [units/s] to be settled, tol per second if None
+        self.poll_min = 0.01  # seconds, first polling interval
+        self.poll_max = 0.5  # seconds, polling interval limit of the exponential backoff
         self.target = None
         self.low_limit = 0.
         self.high_limit = 0.
         self._can_edit_limits = True
 
     def set_value(self, val):
+        self.on_write(val)
+        self.mi.set_value(self.set_channel(), val)
+
+    def get_channel(self):
+        """
+        Channel which is read by get_value(). Used for bulk reads with MachineInterface.get_values().
+        A subclass which overrides get_value() must override this method too (return None to disable the bulk read).
+
+        :return: (str) channel name or None
+        """
+        return self.eid
+
+    def set_channel(self):
+        """
+        Channel which is written by set_value(). Used for bulk writes with MachineInterface.set_values().
+        A subclass which overrides set_value() must override this method too (return None to disable the bulk write).
+
+        :return: (str) channel name or None
+        """
+        return self.eid
+
+    def on_read(self, val, save=False):
+        """
+        Process the raw value read from get_channel().
+
+        :param val: value from the Machine Interface
+        :param save: if True the value is appended to the device history
+        :return: device value
+        """
+        return val
+
+    def on_write(self, val):
+        """
+        Bookkeeping before the value is written to set_channel().
+
+        :param val: new value
+        :return: None
+        """
         self.values.append(val)
         self.times.append(time.time())
         self.target = val
-        self.mi.set_value(self.eid, val)
+
+    def on_cached(self, val):
+        """
+        Bookkeeping of a step served from the evaluation cache (mint.eval_cache.EvalCache). The device is not
+        written, but the step is recorded as if it was (no settle time and no prediction), so the device
+        histories stay aligned with the Target histories.
+
+        :param val: device value of the step
+        :return: None
+        """
+        self.values.append(val)
+        self.times.append(time.time())
+        self.settle_times.append(0.)
+        self.settle_predicted.append(None)
 
     def set_low_limit(self, val):
         self.low_limit = val
@@ -353,21 +461,66 @@ class Device(object):
         self.high_limit = val
 
     def get_value(self, save=False):
-        val = self.mi.get_value(self.eid)
-        return val
+        val = self.mi.get_value(self.get_channel())
+        return self.on_read(val, save=save)
 
     def trigger(self):
         pass
 
-    def wait(self):
+    def wait(self, timeout=None):
+        """
+        Wait until the device is settled at the target: the readback is within tol of the target and
+        its rate of change is below settle_rate.
+        The readback updates come from a monitor if the Machine Interface supports it (MachineInterface.add_monitor()),
+        otherwise the readback is polled with exponential backoff (poll_min ... poll_max).
+
+        :param timeout: upper bound of the wait in seconds. Device.timeout if None
+        :return: (bool) True if the device settled, False on timeout
+        """
         if self.target is None:
-            return
+            return True
+        if timeout is None:
+            timeout = self.timeout
+        rate_max = self.settle_rate if self.settle_rate is not None else self.tol
+
+        update = threading.Event()
+        latest = []
+        handle = None
+        channel = self.get_channel() if self.mi is not None else None
+        if channel is not None:
+            def callback(value):
+                latest[:] = [self.on_read(value)]
+                update.set()
+            handle = self.mi.add_monitor(channel, callback)
 
         start_time = time.time()
-        while start_time + self.timeout <= time.time():
-            if np.abs(self.get_value()-self.target) < self.tol:
-                return
-            time.sleep(0.05)
+        delay = self.poll_min
+        prev = None
+        try:
+            while True:
+                if handle is not None and latest:
+                    val = latest[0]
+                else:
+                    val = self.get_value()
+                now = time.time()
+                if val is not None and prev is not None and np.abs(val - self.target) < self.tol:
+                    rate = np.abs(val - prev[0])/max(now - prev[1], 1e-6)
+                    if rate <= rate_max:
+                        return True
+                prev = (val, now) if val is not None else None
+                remaining = start_time + timeout - now
+                if remaining <= 0:
+                    print("Device ", self.id, ": not settled after ", timeout, " s")
+                    return False
+                if handle is not None:
+                    update.wait(min(delay, remaining))
+                    update.clear()
+                else:
+                    time.sleep(min(delay, remaining))
+                delay = min(2*delay, self.poll_max)
+        finally:
+            if handle is not None:
+                self.mi.remove_monitor(channel, handle)
 
     def state(self):
         """
@@ -383,8 +536,10 @@ class Device(object):
         return state
 
     def clean(self):
-        self.values = []
-        self.times = []
+        self.values = History()
+        self.times = History()
+        self.settle_times = []
+        self.settle_predicted = []
 
     def check_limits(self, value):
         limits = self.get_limits()
@@ -409,19 +564,98 @@ class Device(object):
         return hl-ll
 
 
+def _group_by_mi(devices, channel_getter):
+    """
+    Group devices which can be accessed in bulk by their Machine Interface.
+
+    :param devices: list of Devices
+    :param channel_getter: function(dev) -> channel name or None
+    :return: (singles, groups) - indices of devices without a bulk channel and
+             list of (mi, indices, channels) tuples
+    """
+    singles = []
+    groups = OrderedDict()
+    for i, dev in enumerate(devices):
+        channel = channel_getter(dev) if dev.mi is not None else None
+        if channel is None:
+            singles.append(i)
+            continue
+        mi, idx, channels = groups.setdefault(id(dev.mi), (dev.mi, [], []))
+        idx.append(i)
+        channels.append(channel)
+    return singles, list(groups.values())
+
+
+def get_devices_values(devices, save=False):
+    """
+    Read the devices with one MachineInterface.get_values() call per Machine Interface.
+    Devices without a bulk channel are read with Device.get_value().
+
+    :param devices: list of Devices
+    :param save: if True the values are appended to the device histories
+    :return: (list) device values
+    """
+    values = [None] * len(devices)
+    singles, groups = _group_by_mi(devices, lambda dev: dev.get_channel())
+    for mi, idx, channels in groups:
+        for i, val in zip(idx, mi.get_values(channels)):
+            values[i] = devices[i].on_read(val, save=save)
+    for i in singles:
+        values[i] = devices[i].get_value(save=save)
+    return values
+
+
+def set_devices_values(devices, vals):
+    """
+    Write the devices with one MachineInterface.set_values() call per Machine Interface.
+    Devices without a bulk channel are written with Device.set_value().
+
+    :param devices: list of Devices
+    :param vals: new values
+    :return: None
+    """
+    singles, groups = _group_by_mi(devices, lambda dev: dev.set_channel())
+    for mi, idx, channels in groups:
+        for i in idx:
+            devices[i].on_write(vals[i])
+        mi.set_values(channels, [vals[i] for i in idx])
+    for i in singles:
+        devices[i].set_value(vals[i])
+
+
+
+def get_devices_limits(devices):
+    """
+    Limit box of the devices. Disabled limits (both 0, see Device.check_limits) are unbounded.
+
+    :param devices: list of Devices
+    :return: (ndevices x 2) array of [low, high] limits, -inf/inf for disabled limits
+    """
+    limits = np.array([dev.get_limits() for dev in devices], dtype=float).reshape(len(devices), 2)
+    disabled = np.all(np.abs(limits) < 1e-15, axis=1)
+    limits[disabled] = [-np.inf, np.inf]
+    return limits
+
 # for testing
 class TestDevice(Device):
     def __init__(self, eid=None):
         super(TestDevice, self).__init__(eid=eid)
         self.test_value = 0.
-        self.values = []
-        self.times = []
+        self.values = History()
+        self.times = History()
         self.nsets = 0
         self.mi = None
+        self.readback_settle = True
 
     def get_value(self, save=False):
         return self.test_value
 
+    def get_channel(self):
+        return None
+
+    def set_channel(self):
+        return None
+
     def set_value(self, value):
         self.values.append(value)
         self.nsets += 1
@@ -448,19 +682,70 @@ class Target(object):
         self.id = eid
         self.pen_max = 100
 
-        self.penalties = []
-        self.values = []
-        self.alarms = []
-        self.times = []
+        self.penalties = History()
+        self.values = History()
+        self.alarms = History()
+        self.times = History()
+        self.cached_steps = []  # indices of the steps served from the evaluation cache
         self.nreadings = 1
         self.interval = 0.0
         self.stats = None
         self.points = None
         self.mi = None
+        # retention of the waveform acquisitions: number of the last acquisitions kept in memory (None - all),
+        # the older ones are spilled to acquisition_spill_dir (dropped if None)
+        self.acquisition_memory = None
+        self.acquisition_spill_dir = None
+        # streaming acquisition: shots are consumed until the SNR of the mean reaches snr_goal
+        # or max_shots is reached. snr_goal = 0 disables it (fixed number of readings)
+        self.snr_goal = 0
+        self.min_shots = 3
+        self.max_shots = 100
+        self.stream_interval = 0.1  # seconds between the reads of new shots
+        self.stream_timeout = 30  # seconds, upper bound of one streaming acquisition
+        self.last_stream = None  # RunningStat of the last streaming acquisition
+
+    def new_acquisition_store(self):
+        """
+        Create the container for the waveform acquisitions with the retention policy of the Target.
+
+        :return: AcquisitionStore
+        """
+        return AcquisitionStore(max_in_memory=self.acquisition_memory, spill_dir=self.acquisition_spill_dir)
 
     def get_value(self):
         return 0
 
+    def stream(self, read_shots, interval=None, max_shots=None):
+        """
+        Streaming acquisition with sequential stopping. New shots are consumed as they arrive and the running mean
+        and its standard error are updated. The acquisition stops when the SNR of the mean (abs(mean)/sem)
+        reaches snr_goal (after min_shots), when max_shots are consumed or after stream_timeout.
+
+        :param read_shots: function() returning the new shots (scalar or array) since its previous call
+        :param interval: seconds between the calls of read_shots(), Target.stream_interval if None
+        :param max_shots: cap of the number of shots, Target.max_shots if None
+        :return: RunningStat of the acquisition
+        """
+        if interval is None:
+            interval = self.stream_interval
+        if max_shots is None:
+            max_shots = self.max_shots
+        stat = RunningStat()
+        start = time.time()
+        while True:
+            stat.update(read_shots())
+            if stat.n >= max_shots:
+                break
+            if self.snr_goal > 0 and stat.n >= self.min_shots and stat.snr() >= self.snr_goal:
+                break
+            if time.time() - start > self.stream_timeout:
+                print("Target: streaming acquisition timeout. ", stat.n, " shots")
+                break
+            time.sleep(interval)
+        self.last_stream = stat
+        return stat
+
     def get_penalty(self):
         """
         Method to calculate the penalty on the basis of the value and alarm level.
@@ -468,11 +753,14 @@ class Target(object):
 
         :return: penalty
         """
-        sase = self.get_value()
-        for i in range(self.nreadings):
-            sase += self.get_value()
-            time.sleep(self.interval)
-        sase = sase/self.nreadings
+        if self.snr_goal > 0:
+            sase = self.stream(self.get_value, interval=self.interval).mean
+        else:
+            sase = self.get_value()
+            for i in range(self.nreadings):
+                sase += self.get_value()
+                time.sleep(self.interval)
+            sase = sase/self.nreadings
         print("SASE", sase)
         alarm = self.get_alarm()
         pen = 0.0
@@ -495,10 +783,34 @@ class Target(object):
 
     def clean(self):
         self.niter = 0
-        self.penalties = []
-        self.times = []
-        self.alarms = []
-        self.values = []
+        self.penalties = History()
+        self.times = History()
+        self.alarms = History()
+        self.values = History()
+        self.cached_steps = []
+
+    def on_cached(self, pen, step=None):
+        """
+        Bookkeeping of a step served from the evaluation cache (mint.eval_cache.EvalCache).
+        The cached penalty is appended to the penalties, every other step history (History and AcquisitionStore
+        attributes: values, alarms and the histories of subclasses) repeats its entry of the measured step,
+        so all histories stay aligned.
+        The index of the step is added to cached_steps.
+
+        :param pen: cached penalty
+        :param step: index of the measurement of the point in the histories. NaN (None) entries if None
+        :return: None
+        """
+        nsteps = len(self.penalties)
+        for name, hist in list(vars(self).items()):
+            if name in ("penalties", "times"):
+                continue
+            if not isinstance(hist, (History, AcquisitionStore)) or len(hist) != nsteps:
+                continue
+            hist.append(None if step is None else hist[step])
+        self.penalties.append(pen)
+        self.times.append(time.time())
+        self.cached_steps.append(nsteps)
 
 
 class Target_test(Target):
@@ -513,10 +825,10 @@ class Target_test(Target):
         self.kill = False
         self.pen_max = 100
         self.niter = 0
-        self.penalties = []
-        self.times = []
-        self.alarms = []
-        self.values = []
+        self.penalties = History()
+        self.times = History()
+        self.alarms = History()
+        self.values = History()
 
     def get_penalty(self):
         sase = self.get_value()
@@ -541,7 +853,7 @@ class Target_test(Target):
         return pen
 
     def get_value(self):
-        values = np.array([dev.get_value() for dev in self.devices])
+        values = np.array(get_devices_values(self.devices))
         return np.sum(np.exp(-np.power((values - np.ones_like(values)), 2) / 5.))
 
     def get_spectrum(self):
@@ -0,0 +1,148 @@
+"""
+Per-device settle time model.
+
+The settle time of a device (from the write until the readback is settled) is fitted as a linear function
+of the step magnitude:  t_settle = t0 + k*|step|
+The observations are collected by the Optimizer (Device.settle_times) and stored per device ID in a json file.
+"""
+from __future__ import absolute_import, print_function
+import os
+import json
+import numpy as np
+
+
+class SettleModel(object):
+    """
+    Settle time model of one device
+
+    :param eid: device ID
+    :param max_points: 200, number of the last observations used for the fit
+    :param min_points: 3, minimum number of observations to make a prediction
+    :param margin: 1.2, safety factor applied to the predicted settle time
+    """
+    def __init__(self, eid=None, max_points=200, min_points=3, margin=1.2):
+        self.eid = eid
+        self.max_points = max_points
+        self.min_points = min_points
+        self.margin = margin
+        self.steps = []
+        self.settle_times = []
+        self.t0 = None
+        self.k = 0.
+
+    def add(self, step, settle_time):
+        """
+        Add an observation and refit the model.
+
+        :param step: step of the device
+        :param settle_time: observed settle time in seconds
+        :return: None
+        """
+        self.steps.append(float(np.abs(step)))
+        self.settle_times.append(float(settle_time))
+        self.steps = self.steps[-self.max_points:]
+        self.settle_times = self.settle_times[-self.max_points:]
+        self.fit()
+
+    def fit(self):
+        """
+        Least squares fit of t0 and k (both are kept non-negative).
+
+        :return: None
+        """
+        if len(self.steps) < self.min_points:
+            self.t0 = None
+            self.k = 0.
+            return
+        steps = np.array(self.steps)
+        times = np.array(self.settle_times)
+        if np.ptp(steps) > 0:
+            k, t0 = np.polyfit(steps, times, 1)
+        else:
+            k, t0 = 0., np.mean(times)
+        if k < 0:
+            k, t0 = 0., np.mean(times)
+        self.k = float(k)
+        self.t0 = float(max(t0, 0.))
+
+    def predict(self, step):
+        """
+        Predicted settle time for the step.
+
+        :param step: step of the device
+        :return: settle time in seconds including the margin, None if the model has not enough data
+        """
+        if self.t0 is None:
+            return None
+        return float(self.margin*(self.t0 + self.k*np.abs(step)))
+
+    def to_dict(self):
+        return {"steps": self.steps, "settle_times": self.settle_times}
+
+    def from_dict(self, data):
+        self.steps = [float(s) for s in data.get("steps", [])]
+        self.settle_times = [float(t) for t in data.get("settle_times", [])]
+        self.fit()
+
+
+class SettleModels(object):
+    """
+    Collection of the settle time models keyed by the device ID with json persistence.
+
+    :param filename: json file, None to keep the models in memory only
+    """
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.models = {}
+
+    def get(self, eid):
+        if eid not in self.models:
+            self.models[eid] = SettleModel(eid=eid)
+        return self.models[eid]
+
+    def predict(self, eid, step):
+        if eid not in self.models:
+            return None
+        return self.models[eid].predict(step)
+
+    def add(self, eid, step, settle_time):
+        self.get(eid).add(step, settle_time)
+
+    def load(self, filename=None):
+        """
+        Load the models from the json file. A missing file is not an error.
+
+        :param filename: json file, self.filename if None
+        :return: self
+        """
+        if filename is not None:
+            self.filename = filename
+        if self.filename is None or not os.path.exists(self.filename):
+            return self
+        try:
+            with open(self.filename, 'r') as f:
+                data = json.load(f)
+        except Exception as ex:
+            print("SettleModels: could not read ", self.filename, ". Exception was: ", ex)
+            return self
+        for eid in data:
+            self.get(eid).from_dict(data[eid])
+        return self
+
+    def save(self, filename=None):
+        """
+        Save the models to the json file.
+
+        :param filename: json file, self.filename if None
+        :return: None
+        """
+        if filename is not None:
+            self.filename = filename
+        if self.filename is None:
+            return
+        data = dict((eid, model.to_dict()) for eid, model in self.models.items())
+        try:
+            with open(self.filename, 'w') as f:
+                json.dump(data, f)
+        except Exception as ex:
+            print("SettleModels: could not write ", self.filename, ". Exception was: ", ex)
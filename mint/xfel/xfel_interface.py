@@ -62,6 +62,44 @@ class XFELMachineInterface(MachineInterface):
         pydoocs.write(channel, float(val))
         return
 
+    def get_values(self, channels):
+        """
+        Getter function for a list of channels.
+        Channels of the same FACILITY/DEVICE/*/PROPERTY group are read with one wildcard pydoocs.read(),
+        the other channels are read one by one.
+
+        :param channels: (list) list of the devices names used in doocs
+        :return: (list) Data from the reads in the same order as channels
+        """
+        values = [None] * len(channels)
+        groups = OrderedDict()
+        for i, ch in enumerate(channels):
+            parts = ch.split("/")
+            if len(parts) == 4:
+                key = "/".join([parts[0], parts[1], "*", parts[3]])
+                groups.setdefault(key, []).append(i)
+            else:
+                values[i] = self.get_value(ch)
+
+        for key, idx in groups.items():
+            if len(idx) == 1:
+                values[idx[0]] = self.get_value(channels[idx[0]])
+                continue
+            try:
+                # wildcard read returns a list of [.., value, .., location name] entries
+                data = pydoocs.read(key)["data"]
+                read = dict((str(entry[-1]), entry[1]) for entry in data)
+            except Exception as ex:
+                print("XFELMachineInterface: wildcard read of", key, "failed. Exception was: ", ex)
+                read = {}
+            for i in idx:
+                location = channels[i].split("/")[2]
+                if location in read:
+                    values[i] = read[location]
+                else:
+                    values[i] = self.get_value(channels[i])
+        return values
+
 
     def get_charge(self):
         return self.get_value("XFEL.DIAG/CHARGE.ML/TORA.25.I1/CHARGE.SA1")
@@ -220,6 +258,9 @@ class TestMachineInterface(XFELMachineInterface):
         #    return 0
         return np.random.rand(1)[0]-0.5 #self.data
 
+    def get_values(self, channels):
+        return MachineInterface.get_values(self, channels)
+
     def set_value(self, device_name, val):
         """
         Testing Method to set value to a channel
@@ -6,6 +6,7 @@ S.Tomin, 2017
 from __future__ import absolute_import, print_function
 
 from mint.opt_objects import Target
+from mint.history import History
 import numpy as np
 import time
 
@@ -45,8 +46,7 @@ class XFELTarget(Target):
     def read_bpms(self, bpms, nreadings):
         orbits = np.zeros((nreadings, len(bpms)))
         for i in range(nreadings):
-            for j, bpm in enumerate(bpms):
-                orbits[i, j] = self.mi.get_value(bpm)
+            orbits[i, :] = self.mi.get_values(bpms)
             time.sleep(0.1)
         return np.mean(orbits, axis=0)
 
@@ -110,11 +110,14 @@ class XFELTarget(Target):
 
         :return: penalty
         """
-        sase = 0.
-        for i in range(self.nreadings):
-            sase += self.get_value()
-            time.sleep(self.interval)
-        sase = sase/self.nreadings
+        if self.snr_goal > 0:
+            sase = self.stream(self.get_value, interval=self.interval).mean
+        else:
+            sase = 0.
+            for i in range(self.nreadings):
+                sase += self.get_value()
+                time.sleep(self.interval)
+            sase = sase/self.nreadings
         print("SASE", sase)
         alarm = self.get_alarm()
         if self.debug: print('alarm:', alarm)
@@ -151,7 +154,7 @@ class XFELTarget(Target):
 
     def clean(self):
         self.niter = 0
-        self.penalties = []
-        self.times = []
-        self.alarms = []
-        self.values = []
+        self.penalties = History()
+        self.times = History()
+        self.alarms = History()
+        self.values = History()
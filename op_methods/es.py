@@ -35,8 +35,24 @@ class ES_min:
         or simulation output, then computes the cost and then returns
         -1 * power for minimization
         """
-        x = np.array(x)
         self.error_func = error_func
+        cost_val = None
+        search = self.search(x)
+        try:
+            points = next(search)
+            while True:
+                cost_val = error_func(points[0])
+                points = search.send([cost_val])
+        except StopIteration:
+            pass
+        return cost_val
+
+    def search(self, x):
+        """
+        ES iterations as a generator of the ask/tell protocol: yields the next parameters (1 x n array)
+        and receives the cost.
+        """
+        x = np.array(x)
         
         # length of x
         self.nparams = len(x)
@@ -67,7 +83,7 @@ class ES_min:
         self.alphaES = (self.norm_coef * 2)**2*self.wES/4
         
 
-        cost_val = error_func(x)
+        cost_val = (yield np.array([x]))[0]
 
         pnew = x
 
@@ -91,14 +107,12 @@ class ES_min:
             pnew = self.ES_UNnormalize(pnorm)
 
                 
-            cost_val = error_func(pnew)
+            cost_val = (yield np.array([pnew]))[0]
             
             time.sleep(0.01)
             
             print("Current cost = ", cost_val)
 
-            
-        return cost_val
         
     
         
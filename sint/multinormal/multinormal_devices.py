@@ -9,6 +9,7 @@ class MultinormalDevice(Device):
         self.default_limits = [-5, 5]
         self.low_limit = -5
         self.high_limit = 5
+        self.readback_settle = True
 
     def get_delta(self):
         """
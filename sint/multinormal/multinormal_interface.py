@@ -325,20 +325,20 @@ class MultinormalInterface(MachineInterface):
             vals = len(dev.values)
             self.data[dev.eid].append(dev.values)
         if vals < len(objective_func.values):  # first point is duplicated for some reason so dropping
-            objective_func.values = objective_func.values[1:]
-            objective_func.objective_means = objective_func.objective_means[1:]
-            objective_func.objective_acquisitions = objective_func.objective_acquisitions[1:]
-            objective_func.times = objective_func.times[1:]
-            objective_func.std_dev = objective_func.std_dev[1:]
-            objective_func.charge = objective_func.charge[1:]
-            objective_func.current = objective_func.current[1:]
+            objective_func.values.drop_first()
+            objective_func.objective_means.drop_first()
+            objective_func.objective_acquisitions.drop_first()
+            objective_func.times.drop_first()
+            objective_func.std_dev.drop_first()
+            objective_func.charge.drop_first()
+            objective_func.current.drop_first()
             try:
                 objective_func.losses = objective_func.losses[1:]
             except:
                 pass
             objective_func.niter -= 1
         self.data[objective_func_pv].append(objective_func.objective_means)  # this is mean for compat
-        self.data['DetectorAll'].append(objective_func.objective_acquisitions)
+        self.data['DetectorAll'].append(list(objective_func.objective_acquisitions))
         self.data['DetectorStat'].append(objective_func.values)
         self.data['DetectorStd'].append(objective_func.std_dev)
         self.data['timestamps'].append(objective_func.times)
@@ -4,6 +4,7 @@ from scipy.special import gamma
 from scipy.special import erfinv
 
 from mint.opt_objects import Target
+from mint.history import History
 import stats.stats as stats
 
 
@@ -21,14 +22,15 @@ class MultinormalTarget(Target):
         self.objective_mean = None
         self.objective_stdev = None
 
-        self.objective_acquisitions = []  # all the points
-        self.objective_means = []
-        self.std_dev = []
-        self.charge = []
-        self.current = []
+        self.objective_acquisitions = self.new_acquisition_store()  # all the points
+        self.objective_means = History()
+        self.std_dev = History()
+        self.charge = History()
+        self.current = History()
         self.losses = []
         self.points = None
         self.initialize = True
+        self.shot_batch = 10  # shots per batch of the streaming acquisition
 
 
     def get_penalty(self):
@@ -67,10 +69,23 @@ class MultinormalTarget(Target):
         """
         if self.points is None:
             self.points = 120
-        self.mi.points = self.points
         # print("Get Value of : ", self.points, " points.")
 
-        data = self.mi.f(self.mi.x)
+        if self.snr_goal > 0:
+            # streaming acquisition in batches of shot_batch shots, self.points is the shot cap
+            acquired = []
+
+            def read_shots():
+                self.mi.points = self.shot_batch
+                shots = np.ravel(self.mi.f(self.mi.x))
+                acquired.append(shots)
+                return shots
+
+            self.stream(read_shots, interval=0., max_shots=self.points)
+            data = np.array(np.concatenate(acquired), ndmin=2)
+        else:
+            self.mi.points = self.points
+            data = self.mi.f(self.mi.x)
         # print("Data (", data.shape, ") : ", data)
 
         if self.stats is None:
@@ -92,11 +107,11 @@ class MultinormalTarget(Target):
 
     def clean(self):
         Target.clean(self)
-        self.objective_acquisitions = []  # all the points
-        self.objective_means = []
-        self.std_dev = []
-        self.charge = []
-        self.current = []
+        self.objective_acquisitions = self.new_acquisition_store()  # all the points
+        self.objective_means = History()
+        self.std_dev = History()
+        self.charge = History()
+        self.current = History()
         self.losses = []
 
     def get_energy(self):
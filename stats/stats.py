@@ -107,5 +107,57 @@ class StatMean(Statistics):
         return np.mean(data)
 
 
+class RunningStat(object):
+    """
+    Running mean and standard error of a stream of shots
+    (Welford's algorithm, batches are merged with the pairwise update of Chan et al.).
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.
+        self.m2 = 0.
+
+    def update(self, shots):
+        """
+        Add new shots.
+
+        :param shots: scalar or array of shots
+        """
+        x = np.ravel(np.asarray(shots, dtype=float))
+        x = x[np.isfinite(x)]
+        n_b = x.size
+        if n_b == 0:
+            return
+        mean_b = np.mean(x)
+        m2_b = np.sum((x - mean_b) ** 2)
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.n * n_b / n
+        self.n = n
+
+    def std(self):
+        if self.n < 2:
+            return np.inf
+        return np.sqrt(self.m2 / (self.n - 1))
+
+    def sem(self):
+        """
+        Standard error of the mean.
+        """
+        if self.n < 2:
+            return np.inf
+        return self.std() / np.sqrt(self.n)
+
+    def snr(self):
+        """
+        Signal to noise ratio of the mean: abs(mean)/sem.
+        """
+        sem = self.sem()
+        if sem == 0:
+            return np.inf
+        return np.abs(self.mean) / sem
+
+
 all_stats = [StatNone, StatMedian, StatStdDeviation, StatMedianDeviation, StatMax, StatMin, Stat80Percent,
              StatAvgMean, Stat20Percent, StatMean]
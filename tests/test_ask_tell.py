@@ -0,0 +1,116 @@
+import gc
+import threading
+
+import numpy as np
+import pytest
+
+from mint.ask_tell import AskTellDriver, StopAsk, minimize_steps, run_ask_tell
+from mint.mint import Powell, Simplex
+
+
+def quad(x):
+    return float(np.sum((np.ravel(x) - np.array([1., -2.]))**2))
+
+
+def batches():
+    values = yield np.array([[0., 0.], [1., 1.]])
+    assert list(values) == [0., 2.]
+    values = yield np.array([[2., 2.]])
+    assert list(values) == [8.]
+
+
+def test_driver_hands_out_batches_in_order():
+    driver = AskTellDriver(batches(), ndim=2)
+    first = driver.ask(1)
+    assert np.array_equal(first, [[0., 0.]])
+    second = driver.ask(5)
+    assert np.array_equal(second, [[1., 1.]])
+    # the batch is asked but not told yet
+    assert len(driver.ask(1)) == 0
+    driver.tell(first, [0.])
+    driver.tell(second, [2.])
+    last = driver.ask(2)
+    assert np.array_equal(last, [[2., 2.]])
+    driver.tell(last, [8.])
+    assert len(driver.ask(1)) == 0
+    assert driver.finished
+
+
+def test_driver_rejects_unasked_and_reordered_tells():
+    driver = AskTellDriver(batches(), ndim=2)
+    points = driver.ask(2)
+    with pytest.raises(ValueError):
+        driver.tell(points[1:], [2.])
+    with pytest.raises(ValueError):
+        driver.tell(np.vstack((points, points)), [0., 2., 0., 2.])
+
+
+def test_minimize_steps_bridges_the_control_loop():
+    def minimize(error_func, x):
+        return min(error_func(x + dx) for dx in [0., 1., 2.])
+
+    gen = minimize_steps(minimize, np.zeros(2))
+    driver = AskTellDriver(gen, ndim=2)
+    asked = []
+    while True:
+        points = driver.ask(1)
+        if len(points) == 0:
+            break
+        asked.append(points[0])
+        driver.tell(points, [quad(points[0])])
+    assert np.allclose(asked, [[0., 0.], [1., 1.], [2., 2.]])
+
+
+def test_closing_stops_the_bridged_minimize():
+    def minimize(error_func, x):
+        while True:
+            error_func(x)
+
+    driver = AskTellDriver(minimize_steps(minimize, np.zeros(2)), ndim=2)
+    driver.tell(driver.ask(1), [0.])
+    driver.ask(1)
+    driver.close()
+    assert driver.finished
+
+
+def test_dropped_driver_stops_the_bridged_minimize():
+    workers = []
+
+    def minimize(error_func, x):
+        workers.append(threading.current_thread())
+        while True:
+            error_func(x)
+
+    driver = AskTellDriver(minimize_steps(minimize, np.zeros(2)), ndim=2)
+    driver.ask(1)
+    del driver
+    gc.collect()
+    workers[0].join(1.)
+    assert not workers[0].is_alive()
+
+
+def test_minimize_which_catches_stop_does_not_block():
+    workers = []
+    stops = []
+
+    def minimize(error_func, x):
+        workers.append(threading.current_thread())
+        for i in range(3):
+            try:
+                error_func(x)
+            except StopAsk:
+                stops.append(i)
+
+    driver = AskTellDriver(minimize_steps(minimize, np.zeros(2)), ndim=2)
+    driver.ask(1)
+    driver.close()
+    assert not workers[0].is_alive()
+    assert stops == [0, 1, 2]
+
+
+@pytest.mark.parametrize("minimizer", [Simplex, Powell])
+def test_run_ask_tell_finds_the_minimum(minimizer):
+    opt = minimizer()
+    opt.max_iter = 400
+    x = run_ask_tell(opt, quad, np.array([0.5, 0.5]))
+    assert quad(x) < 1.e-3
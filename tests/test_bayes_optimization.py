@@ -0,0 +1,69 @@
+import numpy as np
+from GP.OnlineGP import OGP
+from GP.bayes_optimization import BayesOpt, negExpImproveBatch
+
+
+class QuadInterface(object):
+    """machine interface stub: maximum of a 2d quadratic at (1, -1)"""
+    name = "QuadInterface"
+
+    def __init__(self, x0):
+        self.x = np.array(x0, dtype=float, ndmin=2)
+
+    def setX(self, x):
+        self.x = np.array(x, dtype=float, ndmin=2)
+
+    def getState(self):
+        y = -np.sum((self.x - np.array([1., -1.]))**2)
+        return self.x, np.array(y, ndmin=2)
+
+
+def make_bo(use_grad):
+    np.random.seed(1)
+    x0 = np.zeros((1, 2))
+    mi = QuadInterface(x0)
+    hyps = (np.log(np.ones((1, 2))/0.5**2), np.log(1.), np.log(1.e-4))
+    model = OGP(2, hyps, maxBV=50, weighted=False)
+    model.fit(x0, mi.getState()[1])
+    bo = BayesOpt(model, target_func=mi, acq_func='EI', xi=0.01, start_dev_vals=x0.flatten(), dev_ids=["a", "b"])
+    bo.use_grad = use_grad
+    return bo
+
+
+def test_use_grad_is_opt_in():
+    assert not make_bo(False).use_grad
+
+
+def test_grad_search_moves_away_from_start():
+    bo = make_bo(True)
+    for i in range(3):
+        bo.OptIter()
+    X = np.array(bo.X_obs)
+    assert len(X) == 4
+    assert np.all(np.linalg.norm(X[1:] - X[0], axis=1) > 1.e-3)
+
+
+def test_grad_start_is_reproducible():
+    starts = []
+    for i in range(2):
+        bo = make_bo(True)
+        (x_best, y_best) = bo.best_seen()
+        fargs = (bo.model, y_best, 0.01, 1.)
+        bounds = np.array([[-1., 1.], [-1., 1.]])
+        starts.append(bo.local_start(negExpImproveBatch, fargs, x_best, np.array([0.5, 0.5]), bounds))
+    assert np.array_equal(starts[0], starts[1])
+
+
+def test_acquisition_runs_on_the_spawned_pool(capsys):
+    bo = make_bo(False)
+    bo.vectorizedQ = False
+    bo.multiprocessingQ = True
+    bo.nproc = 2
+    try:
+        for i in range(2):
+            bo.OptIter()
+        assert bo.pool.pool._ctx.get_start_method() == 'spawn'
+    finally:
+        bo.close_pool()
+    assert len(bo.X_obs) == 3
+    assert 'AcquisitionPool - WARNING' not in capsys.readouterr().out
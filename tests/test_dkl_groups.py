@@ -0,0 +1,68 @@
+import numpy as np
+
+from GP.DKLmodel import DKLGP
+
+
+def test_separable_linear_keeps_additive_kernel():
+    dkl = DKLGP(3, groups=[[0, 2]])
+    transform = np.array([[1., 0., 0.5], [0., 2., 0.], [0.5, 0., 1.]])
+    dkl.set_linear(transform)
+    assert [list(g) for g in dkl.groups] == [[0, 2], [1]]
+
+
+def test_mixing_linear_drops_additive_kernel(capsys):
+    dkl = DKLGP(3, groups=[[0, 2]])
+    transform = np.eye(3)
+    transform[0, 1] = 0.3
+    dkl.set_linear(transform)
+    assert "WARNING" in capsys.readouterr().out
+    assert dkl.groups is None
+    assert dkl.ogp.groups is None
+    # the model predicts with the full kernel
+    x = np.array([[0.1, 0.2, 0.3]])
+    dkl.ogp.fit(dkl.embed(x), np.array([[1.]]))
+    mean, var = dkl.predict(x)
+    assert np.all(np.isfinite(mean))
+
+
+def test_gauss_process_groups_from_weakly_correlated_matrix(capsys):
+    from mint.mint import GaussProcess
+    gp = GaussProcess()
+    corrmat = np.full((4, 4), 0.05)
+    corrmat[0, 1] = corrmat[1, 0] = 0.8
+    corrmat[2, 3] = corrmat[3, 2] = -0.6
+    np.fill_diagonal(corrmat, 1.)
+    sigmas = np.diag([0.5, 1., 2., 1.])
+    covarmat = sigmas.dot(corrmat).dot(sigmas)
+    groups, corrmat, covarmat = gp.correlation_groups(corrmat, covarmat)
+    assert groups == [[0, 1], [2, 3]]
+    assert corrmat[0, 2] == 0. and covarmat[1, 3] == 0.
+    # the embedding of the masked matrix keeps the groups
+    dkl = DKLGP(4, groups=groups)
+    dkl.linear_from_correlation(covarmat)
+    assert dkl.groups is not None
+    assert "WARNING" not in capsys.readouterr().out
+
+
+def test_gauss_process_degenerate_groups_use_full_kernel(capsys):
+    from mint.mint import GaussProcess
+    gp = GaussProcess()
+    groups = gp.correlation_groups(np.eye(3), np.eye(3))[0]
+    assert groups is None
+    assert "WARNING" in capsys.readouterr().out
+    corrmat = np.full((3, 3), 0.5)
+    np.fill_diagonal(corrmat, 1.)
+    assert gp.correlation_groups(corrmat, corrmat)[0] is None
+
+
+def test_finite_difference_gradient_matches_analytic():
+    dkl = DKLGP(2)
+    dkl.set_linear(np.array([[1., 0.3], [0., 0.8]]))
+    X = np.array([[0., 0.], [0.5, -0.2], [1., 0.4]])
+    dkl.ogp.fit(dkl.embed(X), np.array([[1.], [0.5], [-0.2]]))
+    x = np.array([[0.2, 0.1], [0.7, 0.3]])
+    mean, var, dmean, dvar = dkl.predict_with_grad(x)
+    fd = dkl.predict_with_fd_grad(x)
+    assert np.allclose(fd[0], mean) and np.allclose(fd[1], var)
+    assert np.allclose(fd[2], dmean, atol=1.e-5)
+    assert np.allclose(fd[3], dvar, atol=1.e-5)
@@ -0,0 +1,122 @@
+import time
+
+import numpy as np
+
+from mint.eval_cache import EvalCache
+from mint.mint import Optimizer
+from mint.opt_objects import Target, TestDevice
+
+
+def test_key_is_quantized_to_tolerance():
+    assert EvalCache.make_key([1.0004, 2.], [0.001, 0.]) == EvalCache.make_key([1.0, 2.], [0.001, 0.])
+    assert EvalCache.make_key([1.002, 2.], [0.001, 0.]) != EvalCache.make_key([1.0, 2.], [0.001, 0.])
+
+
+def test_hit_and_miss():
+    cache = EvalCache(max_reuse=None)
+    key = cache.make_key([1.], [0.1])
+    assert cache.lookup(key) is None
+    cache.store(key, -2., 0.5, step=0)
+    assert cache.lookup(key) == -2.
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.saved_time == 0.5
+    assert cache.measured_step(key) == 0
+
+
+def test_stale_entry_is_measured_again():
+    cache = EvalCache(ttl=0.01)
+    key = cache.make_key([1.], [0.1])
+    cache.store(key, -2., 0.5)
+    time.sleep(0.02)
+    assert cache.lookup(key) is None
+    assert key not in cache.entries
+    assert (cache.expired, cache.misses) == (1, 0)
+
+
+def test_stale_measurements_leave_the_mean():
+    cache = EvalCache(ttl=0.05, max_reuse=1)
+    key = cache.make_key([1.], [0.1])
+    cache.store(key, -2., 0.5)
+    time.sleep(0.06)
+    # the point is hit and re-measured, the measurement from before the drift is not averaged in
+    cache.store(key, -4., 0.5)
+    assert cache.lookup(key) == -4.
+    assert cache.entries[key].nmeas == 1
+
+
+def test_mean_over_a_bounded_window():
+    cache = EvalCache(max_reuse=0, window=2)
+    key = cache.make_key([1.], [0.1])
+    for pen in [1., 2., 3.]:
+        cache.store(key, pen, 0.)
+    assert cache.entries[key].pen == 2.5
+
+
+def test_every_lookup_is_counted_once():
+    cache = EvalCache(max_reuse=1, ttl=None)
+    keys = [cache.make_key([i], [0.1]) for i in range(2)]
+    nlookup = 0
+    for i in range(6):
+        key = keys[i % 2]
+        nlookup += 1
+        if cache.lookup(key) is None:
+            cache.store(key, float(i), 0.)
+    assert cache.hits + cache.misses + cache.expired + cache.remeasured == nlookup
+    assert (cache.hits, cache.misses, cache.remeasured) == (2, 2, 2)
+
+
+def test_remeasure_after_max_reuse_averages():
+    cache = EvalCache(max_reuse=1)
+    key = cache.make_key([1.], [0.1])
+    cache.store(key, -2., 0.5, step=0)
+    assert cache.lookup(key) == -2.
+    assert cache.lookup(key) is None
+    assert cache.remeasured == 1
+    cache.store(key, -4., 0.5, step=3)
+    assert cache.lookup(key) == -3.
+    assert cache.measured_step(key) == 3
+
+
+def test_lru_eviction():
+    cache = EvalCache(maxsize=2)
+    keys = [cache.make_key([i], [0.1]) for i in range(3)]
+    cache.store(keys[0], 0., 0.)
+    cache.store(keys[1], 1., 0.)
+    cache.lookup(keys[0])
+    cache.store(keys[2], 2., 0.)
+    assert list(cache.entries) == [keys[0], keys[2]]
+
+
+class QuadTarget(Target):
+    def get_penalty(self):
+        value = -float(np.sum(np.array([dev.get_value() for dev in self.devices])**2))
+        self.penalties.append(-value)
+        self.times.append(time.time())
+        self.values.append(value)
+        self.alarms.append(0.)
+        return -value
+
+
+def test_cache_hits_keep_histories_aligned():
+    devices = [TestDevice("d%d" % i) for i in range(2)]
+    for dev in devices:
+        dev.low_limit, dev.high_limit = -10., 10.
+    opt = Optimizer()
+    opt.normalization = False
+    opt.timeout = 0.
+    opt.eval_cache = EvalCache(max_reuse=None)
+    opt.devices = devices
+    opt.target = QuadTarget()
+    opt.target.devices = devices
+    steps = [[1., 2.], [0.5, 0.5], [1., 2.], [1., 2.]]
+    pens = [opt.error_func(np.array(x)) for x in steps]
+    assert pens[2] == pens[3] == pens[0]
+    target = opt.target
+    assert target.cached_steps == [2, 3]
+    assert len(target.penalties) == len(target.times) == len(target.values) == len(target.alarms) == len(steps)
+    assert np.array(target.values)[3] == np.array(target.values)[0]
+    assert np.array(target.penalties)[3] == np.array(target.penalties)[0]
+    assert len(opt.opt_ctrl.log) == len(steps)
+    for i, dev in enumerate(devices):
+        assert len(dev.values) == len(dev.times) == len(dev.settle_times) == len(dev.settle_predicted) == len(steps)
+        assert np.allclose(np.array(dev.values), [step[i] for step in steps])
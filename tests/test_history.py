@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+
+from mint.history import AcquisitionStore, GrowableArray, History, RunLog
+
+
+def test_growable_array_grows_and_keeps_data():
+    arr = GrowableArray(ncols=2, capacity=2)
+    for i in range(5):
+        arr.append([i, 2*i])
+    assert len(arr) == 5
+    assert arr.buffer.shape[0] == 8
+    assert np.array_equal(arr.data, [[i, 2*i] for i in range(5)])
+
+
+def test_growable_array_memmap(tmp_path):
+    filename = str(tmp_path / "x.dat")
+    arr = GrowableArray(capacity=1, filename=filename)
+    for i in range(10):
+        arr.append(float(i))
+    assert isinstance(arr.buffer, np.memmap)
+    assert np.array_equal(arr.data, np.arange(10.))
+    assert os.path.getsize(filename) >= 10*8
+
+
+def test_history_stores_none_as_nan():
+    hist = History()
+    hist.append(1.)
+    hist.append(None)
+    assert len(hist) == 2
+    assert np.isnan(np.array(hist)[1])
+    assert hist[0] == 1.
+
+
+def test_run_log_tracks_first_best_step():
+    log = RunLog(capacity=1)
+    pens = [3., 1., 2., 1.]
+    for i, pen in enumerate(pens):
+        log.append(pen, [i, -i])
+    index, pen, x = log.best()
+    assert index == int(np.argmin(pens)) == 1
+    assert pen == 1.
+    assert np.array_equal(x, [1, -1])
+    assert len(log) == len(log.x) == len(log.time) == len(pens)
+
+
+def test_acquisition_store_spills_to_disk(tmp_path):
+    store = AcquisitionStore(max_in_memory=2, spill_dir=str(tmp_path))
+    for i in range(4):
+        store.append(np.full(3, i))
+    assert store.in_memory == 2
+    assert len(store) == 4
+    assert np.array_equal(store[0], np.full(3, 0))
+    assert [a[0] for a in store] == [0, 1, 2, 3]
+
+
+def test_acquisition_store_drops_without_spill_dir():
+    store = AcquisitionStore(max_in_memory=1)
+    store.append(np.ones(2))
+    store.append(np.zeros(2))
+    assert store[0] is None
+    assert np.array_equal(store[1], np.zeros(2))
+
+
+def test_drop_first_keeps_the_container(tmp_path):
+    hist = History()
+    for i in range(3):
+        hist.append(float(i))
+    hist.drop_first()
+    assert isinstance(hist, History)
+    hist.append(None)
+    assert np.array_equal(np.array(hist)[:2], [1., 2.]) and np.isnan(hist[2])
+
+    arr = GrowableArray(capacity=2, filename=str(tmp_path / "x.dat"))
+    for i in range(3):
+        arr.append(float(i))
+    arr.drop_first(2)
+    arr.append(5.)
+    assert np.array_equal(arr.data, [2., 5.])
+
+
+def test_memmap_grows_while_a_view_is_held(tmp_path):
+    arr = GrowableArray(capacity=1, filename=str(tmp_path / "x.dat"))
+    arr.append(1.)
+    view = arr.data
+    for i in range(4):
+        arr.append(float(i))
+    assert view[0] == 1.
+    assert len(arr) == 5
+
+
+def test_acquisition_store_drop_first_keeps_retention(tmp_path):
+    store = AcquisitionStore(max_in_memory=2, spill_dir=str(tmp_path))
+    for i in range(4):
+        store.append(np.full(2, i))
+    store.drop_first()
+    assert isinstance(store, AcquisitionStore)
+    assert len(os.listdir(str(tmp_path))) == 1
+    for i in range(4, 6):
+        store.append(np.full(2, i))
+    assert store.in_memory == 2
+    assert [a[0] for a in store] == [1, 2, 3, 4, 5]
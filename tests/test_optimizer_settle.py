@@ -0,0 +1,120 @@
+import time
+
+import numpy as np
+
+from mint.mint import Optimizer
+from mint.opt_objects import Target, TestDevice
+from mint.settle_model import SettleModels
+
+
+class SlowDevice(TestDevice):
+    def __init__(self, eid, settle_time):
+        super(SlowDevice, self).__init__(eid=eid)
+        self.settle_time = settle_time
+
+    def wait(self, timeout=None):
+        time.sleep(self.settle_time)
+        return True
+
+
+def test_serial_wait_records_per_device_latency():
+    opt = Optimizer()
+    opt.devices = [SlowDevice("d%d" % i, 0.05) for i in range(3)]
+    settled = opt.do_wait()
+    assert settled == [True, True, True]
+    times = [dev.settle_times[-1] for dev in opt.devices]
+    assert np.allclose(times, 0.05, atol=0.03)
+
+
+class StuckDevice(TestDevice):
+    """never settles, the wait runs into its timeout"""
+    def wait(self, timeout=None):
+        time.sleep(timeout)
+        return False
+
+
+def test_serial_wait_has_one_budget():
+    opt = Optimizer()
+    opt.timeout = 0.1
+    opt.devices = [StuckDevice("d%d" % i) for i in range(4)]
+    start = time.time()
+    settled = opt.do_wait(start)
+    assert settled == [False]*4
+    assert time.time() - start < 0.2
+
+
+class SetpointDevice(TestDevice):
+    """get_value() returns the setpoint, the trim delay is always needed"""
+    def __init__(self, eid):
+        super(SetpointDevice, self).__init__(eid=eid)
+        self.readback_settle = False
+        self.wait_timeouts = []
+
+    def wait(self, timeout=None):
+        self.wait_timeouts.append(timeout)
+        return True
+
+
+class QuadTarget(Target):
+    def get_penalty(self):
+        return float(np.sum(np.array([dev.get_value() for dev in self.devices])**2))
+
+
+def make_optimizer(devices, timeout=0.5):
+    opt = Optimizer()
+    opt.normalization = False
+    opt.timeout = timeout
+    opt.devices = devices
+    opt.target = QuadTarget()
+    opt.target.devices = devices
+    for dev in devices:
+        dev.low_limit, dev.high_limit = -10., 10.
+    return opt
+
+
+def test_setpoint_device_keeps_blind_delay():
+    dev = SetpointDevice("d0")
+    opt = make_optimizer([dev], timeout=0.1)
+    opt.settle_models = SettleModels()
+    for x in [0.1, 0.2, 0.3, 0.4, 0.5]:
+        start = time.time()
+        opt.error_func(np.array([x]))
+        assert time.time() - start >= 0.1
+    # the setpoint echo "settles" at once, it is never fitted nor predicted
+    assert "d0" not in opt.settle_models.models
+    assert dev.settle_predicted == [None]*5
+    assert all(0 < t <= opt.settle_timeout(dev) for t in dev.wait_timeouts)
+
+
+def test_readback_device_skips_trim_delay_and_is_learned():
+    dev = SlowDevice("d0", 0.01)
+    opt = make_optimizer([dev], timeout=0.5)
+    opt.settle_models = SettleModels()
+    for x in [0.1, 0.2, 0.3, 0.4, 0.5]:
+        start = time.time()
+        opt.error_func(np.array([x]))
+        assert time.time() - start < 0.3
+    assert len(opt.settle_models.get("d0").steps) == 4
+    assert dev.settle_predicted[-1] is not None
+
+
+def test_learns_only_from_readback_settling():
+    opt = make_optimizer([SetpointDevice("d0"), TestDevice("d1"), TestDevice("d2")], timeout=0.)
+    opt.settle_models = SettleModels()
+    opt.x_prev = np.zeros(3)
+    for dev in opt.devices:
+        dev.settle_times.append(0.05)
+    opt.update_settle_models(np.array([0.1, 0.1, 0.1]), [True, True, False])
+    assert "d0" not in opt.settle_models.models
+    assert "d1" in opt.settle_models.models
+    assert "d2" not in opt.settle_models.models
+
+
+def test_settle_lists_stay_aligned():
+    devices = [SetpointDevice("d%d" % i) for i in range(2)]
+    opt = make_optimizer(devices, timeout=0.)
+    opt.settle_models = SettleModels()
+    for x in [[0.1, 0.1], [0.2, 0.1], [20., 0.], [0.3, 0.3]]:
+        opt.error_func(np.array(x))
+    for dev in devices:
+        assert len(dev.settle_predicted) == len(dev.settle_times) == 3
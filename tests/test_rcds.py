@@ -0,0 +1,20 @@
+import numpy as np
+
+from RCDS.rcdsClass import RCDS
+
+
+def test_linescan_places_bracket_points_by_alpha():
+    evaluated = []
+
+    def func(x):
+        evaluated.append(float(x[0]))
+        return float((x[0] - 0.5)**2)
+
+    rcds = RCDS(func, g_noise=0.001, Nvar=1, g_vrange=np.array([[0., 1.]]))
+    # bracket points (alpha, value) of the line x = 0.5 + alpha
+    xflist = np.array([[-0.2, 0.04], [0., 0.], [0.2, 0.04]])
+    x1, f1, nf = rcds.linescan(np.array([0.5]), 0., np.array([1.]), -0.2, 0.2, 6, xflist)
+    # the 3 known points are reused, the other 3 of the 6 grid points are evaluated
+    assert nf == 3
+    assert np.allclose(sorted(evaluated), [0.38, 0.54, 0.62])
+    assert np.allclose(x1, [0.5], atol=0.05)
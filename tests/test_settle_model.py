@@ -0,0 +1,38 @@
+import numpy as np
+
+from mint.settle_model import SettleModel, SettleModels
+
+
+def test_no_prediction_below_min_points():
+    model = SettleModel(min_points=3)
+    model.add(0.1, 0.2)
+    model.add(0.2, 0.3)
+    assert model.predict(0.1) is None
+
+
+def test_linear_fit_with_margin():
+    model = SettleModel(margin=1.5)
+    for step in [0.1, 0.2, 0.3, 0.4]:
+        model.add(step, 0.5 + 2.*step)
+    assert np.isclose(model.t0, 0.5)
+    assert np.isclose(model.k, 2.)
+    assert np.isclose(model.predict(-0.25), 1.5*(0.5 + 2.*0.25))
+
+
+def test_negative_slope_falls_back_to_mean():
+    model = SettleModel(margin=1.)
+    for step, t in [(0.1, 0.3), (0.2, 0.2), (0.3, 0.1)]:
+        model.add(step, t)
+    assert model.k == 0.
+    assert np.isclose(model.predict(1.), 0.2)
+
+
+def test_models_roundtrip(tmp_path):
+    filename = str(tmp_path / "settle_models.json")
+    models = SettleModels(filename)
+    for step in [0.1, 0.2, 0.3]:
+        models.add("dev", step, 0.1)
+    models.save()
+    loaded = SettleModels().load(filename)
+    assert np.isclose(loaded.predict("dev", 0.2), models.predict("dev", 0.2))
+    assert loaded.predict("unknown", 0.2) is None
@@ -0,0 +1,49 @@
+import numpy as np
+
+import mint.lcls.lcls_obj_function as lcls_obj_function
+import mint.opt_objects as opt_objects
+from mint.lcls.lcls_obj_function import SLACTarget
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def time(self):
+        return self.now
+
+    def sleep(self, dt):
+        self.now += dt
+
+
+class WaveformMI(object):
+    """
+    Detector waveform of the last nbuf shot ids at the beam rate. The first read sees a partly filled buffer.
+    """
+    def __init__(self, clock, rate, nbuf, first_len):
+        self.clock = clock
+        self.rate = rate
+        self.nbuf = nbuf
+        self.first_len = first_len
+        self.nreads = 0
+
+    def get_value(self, eid):
+        count = int(round(self.clock.now*self.rate))
+        nbuf = self.first_len if self.nreads == 0 else self.nbuf
+        self.nreads += 1
+        return np.arange(max(count - nbuf, 0), count, dtype=float)
+
+
+def test_short_waveform_does_not_repeat_shots(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(lcls_obj_function, "time", clock)
+    monkeypatch.setattr(opt_objects, "time", clock)
+    target = SLACTarget(mi=WaveformMI(clock, rate=100., nbuf=15, first_len=5))
+    target.points = 25
+    target.stream_interval = 0.1
+
+    shots = target.stream_waveform(rate=100.)
+    # 10 shots arrive between the reads, only the last 5 are in the waveform at the first read
+    assert len(shots) == 25
+    assert len(np.unique(shots)) == len(shots)
+    assert np.array_equal(shots[:5], np.arange(5, 10))
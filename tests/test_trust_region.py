@@ -0,0 +1,61 @@
+import numpy as np
+
+from GP.trust_region import TrustRegion, TuRBO
+
+
+def quad(X):
+    return np.sum((np.array(X, ndmin=2) - np.array([0.3, -0.2]))**2, axis=1)
+
+
+def run(turbo, x0):
+    gen = turbo.search(x0)
+    batches = []
+    try:
+        points = next(gen)
+        while True:
+            batches.append(points)
+            points = gen.send(quad(points))
+    except StopIteration:
+        pass
+    return batches
+
+
+def test_region_box_is_clipped_to_unit_cube():
+    region = TrustRegion(2, 0.8)
+    region.add(np.array([[0.1, 0.5]]), [1.])
+    lo, hi = region.box()
+    assert np.allclose(lo, [0., 0.1])
+    assert np.allclose(hi, [0.5, 0.9])
+
+
+def test_update_region_resizes():
+    turbo = TuRBO()
+    turbo._failure_tol = 2
+    region = TrustRegion(2, 0.4)
+    region.add(np.zeros((1, 2)), [1.])
+    for i in range(turbo.success_tol):
+        turbo.update_region(region, [region.Y.min() - 0.5])
+        region.add(np.zeros((1, 2)), [region.Y.min() - 0.5])
+    assert np.isclose(region.length, 0.8)
+    for i in range(2):
+        turbo.update_region(region, [10.])
+    assert np.isclose(region.length, 0.4)
+
+
+def test_search_moves_away_from_start_and_improves():
+    turbo = TuRBO()
+    turbo.bounds = [[-1., 1.], [-1., 1.]]
+    turbo.max_iter = 30
+    turbo.nask = 2
+    turbo.seed = 0
+    x0 = np.array([-0.8, 0.8])
+    batches = run(turbo, x0)
+    X = np.vstack(batches)
+    assert len(X) == turbo.max_iter
+    assert all(len(b) <= turbo.nask for b in batches)
+    assert np.all(X >= -1.) and np.all(X <= 1.)
+    # every model-based proposal is a new point, not the incumbent
+    assert len(np.unique(np.round(X, 12), axis=0)) == len(X)
+    x_best, y_best = turbo.best()
+    assert y_best < quad(x0)[0] / 10.
+    assert np.isclose(y_best, quad(x_best)[0])